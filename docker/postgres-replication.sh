@@ -0,0 +1,4 @@
+#!/bin/bash
+# Разрешает реплике (сервис db-replica) подключаться для потоковой репликации.
+# Выполняется только при первой инициализации тома основной БД
+echo "host replication all all scram-sha-256" >> "$PGDATA/pg_hba.conf"
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'tables.apps.TablesConfig',
     'django_tables2',
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 CORS_ORIGIN_ALLOW_ALL = True
 
 MIDDLEWARE = [
+    'tables.middleware.MetricsMiddleware',
+    'tables.middleware.CompressionMiddleware',
+    'tables.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -106,6 +110,77 @@ DATABASES = {
     }
 }
 
+# Реплика только для чтения (потоковая репликация основной БД). Без DB_REPLICA_HOST все запросы идут
+# в default; остальные параметры подключения - как у основной БД
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS'], 'connect_timeout': 2},
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.environ.get('DB_REPLICA_PORT', DB_PORT),
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['tables.replica.ReplicaRouter']
+
+# Представления, которые читают данные таблиц с реплики (tables.middleware.ReplicaMiddleware)
+REPLICA_READ_VIEWS = [
+    'table_detail', 'shared_table_view', 'export_table', 'table_rows_api', 'table_report', 'table_report_api',
+]
+# После изменения данных браузер столько секунд читает с основной БД, чтобы видеть свои изменения
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 10))
+REPLICA_PIN_COOKIE = 'db_primary'
+# Реплика с большим отставанием, сек, не используется; отставание проверяется раз в REPLICA_LAG_TTL секунд
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', 5))
+REPLICA_LAG_TTL = 5
+
+
+# Блокировка строки на редактирование считается устаревшей через столько минут
+ROW_LOCK_TIMEOUT_MINUTES = 5
+
+# Сколько ждать блокировку tables_cell при удалении секции ячеек удаленной таблицы, мс (см. tables.partitions)
+CELL_PARTITION_LOCK_TIMEOUT_MS = 2000
+
+# Метрики (/metrics): токен доступа (пусто - без проверки) и время кэширования показателей из БД, сек
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_DB_TTL = int(os.environ.get('METRICS_DB_TTL', 30))
+
+# Кэш. По умолчанию - память процесса; при нескольких воркерах нужен общий кэш,
+# иначе сброс кэша после изменения прав не дойдёт до других процессов
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Список общих таблиц: время жизни кэша на пользователя, сек, и размер страницы
+SHARED_TABLES_CACHE_TTL = 300
+SHARED_TABLES_PER_PAGE = 50
+
+# Итоги по колонкам: время жизни кэша, сек (ключ включает версию таблицы, устаревшие записи не читаются)
+AGGREGATES_CACHE_TTL = 3600
+
+# Сводные отчеты: время жизни кэша, сек (ключ включает версию таблицы)
+REPORT_CACHE_TTL = 3600
+
+# Сохраненные представления: время жизни кэша списка строк, сек (ключ включает версию таблицы)
+SAVED_VIEW_CACHE_TTL = 3600
+
+# Поиск строк (api/tables/<id>/search/): время жизни кэша результатов недавних запросов, сек
+SEARCH_CACHE_TTL = 300
+
+# Окно строк для виртуальной прокрутки (api/tables/<id>/rows/): наибольшее число строк в ответе
+ROW_WINDOW_MAX_ROWS = 500
+
+# Журнал изменений (api/tables/<id>/changes/?since=): наибольшее число записей в ответе
+CHANGES_BATCH_SIZE = 1000
+
+# Сжатие ответов (CompressionMiddleware): типы содержимого, наименьший размер, байт, и уровень brotli (0-11)
+COMPRESSION_CONTENT_TYPES = ['text/html', 'application/json', 'text/csv', 'application/vnd.ms-excel']
+COMPRESSION_MIN_BYTES = 1024
+COMPRESSION_BROTLI_QUALITY = 5
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -0,0 +1,62 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum, Avg, Min, Max, Q
+
+from .conversion import CELL_FIELDS
+from .metrics import record_cache
+from .models import Column, Cell
+
+AGGREGATES_KEY = 'aggregates:{table_id}:{version}:{filter_hash}'
+
+# Итоги, которые имеют смысл для типа колонки
+AGGREGATE_FUNCTIONS = {
+    Column.ColumnType.INTEGER: {'count': Count, 'sum': Sum, 'avg': Avg, 'min': Min, 'max': Max},
+    Column.ColumnType.FLOAT: {'count': Count, 'sum': Sum, 'avg': Avg, 'min': Min, 'max': Max},
+    Column.ColumnType.DATE: {'count': Count, 'min': Min, 'max': Max},
+}
+
+
+def compute_aggregates(table, columns, rows):
+    """Итоги по всем колонкам одним агрегирующим запросом по типизированным полям Cell"""
+    expressions = {}
+    for column in columns:
+        field = CELL_FIELDS[column.data_type]
+        for name, function in AGGREGATE_FUNCTIONS[column.data_type].items():
+            expressions[f'{name}_{column.id}'] = function(field, filter=Q(column_id=column.id))
+
+    result = Cell.objects.filter(
+        table=table,
+        column_id__in=[column.id for column in columns],
+        row_id__in=rows,
+    ).aggregate(**expressions)
+    return {
+        column.id: {name: result[f'{name}_{column.id}'] for name in AGGREGATE_FUNCTIONS[column.data_type]}
+        for column in columns
+    }
+
+
+def get_column_aggregates(table, columns, queryset):
+    """Итоги по колонкам с show_aggregates для отфильтрованных строк queryset.
+
+    Кэшируются по версии таблицы и SQL фильтра: любое изменение данных меняет версию,
+    поэтому повторные просмотры не обращаются к базе.
+    """
+    columns = [column for column in columns if column.show_aggregates and column.data_type in AGGREGATE_FUNCTIONS]
+    if not columns:
+        return {}
+
+    rows = queryset.order_by().values('pk')
+    signature = f'{[(column.id, column.data_type) for column in columns]}:{rows.query}'
+    key = AGGREGATES_KEY.format(
+        table_id=table.pk,
+        version=table.version,
+        filter_hash=hashlib.md5(signature.encode('utf-8')).hexdigest(),
+    )
+    aggregates = cache.get(key)
+    record_cache('aggregates', aggregates is not None)
+    if aggregates is None:
+        aggregates = compute_aggregates(table, columns, rows)
+        cache.set(key, aggregates, settings.AGGREGATES_CACHE_TTL)
+    return aggregates
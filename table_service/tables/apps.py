@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TablesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tables'
+
+    def ready(self):
+        # Регистрация обработчиков фоновых задач
+        from . import conversion, ordering, purge  # noqa: F401
+        # Обработчики изменений профилей и сотрудников
+        from . import signals  # noqa: F401
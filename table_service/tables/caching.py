@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .metrics import record_cache
+
+SHARED_TABLES_KEY = 'shared_tables:{user_id}'
+
+
+def cached_shared_tables(user, build):
+    """Возвращает список доступных пользователю таблиц из кэша, строя его через build() при промахе"""
+    key = SHARED_TABLES_KEY.format(user_id=user.pk)
+    tables = cache.get(key)
+    record_cache('shared_tables', tables is not None)
+    if tables is None:
+        tables = build()
+        cache.set(key, tables, settings.SHARED_TABLES_CACHE_TTL)
+    return tables
+
+
+def invalidate_shared_tables(user_ids):
+    """Сбрасывает кэш списка общих таблиц у пользователей, чьи права изменились"""
+    keys = [SHARED_TABLES_KEY.format(user_id=user_id) for user_id in set(user_ids)]
+    # После фиксации транзакции, чтобы параллельный запрос не закэшировал старые права
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,82 @@
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import TableChange
+
+# Поля записи журнала в ответе changes: каждая запись - массив значений в этом порядке
+CHANGE_FIELDS = ['seq', 'kind', 'row_id', 'column_id', 'value']
+
+
+def record_changes(table_id, changes):
+    """Дописывает изменения в журнал таблицы под очередными номерами.
+
+    Номера выдаются обновлением Table.change_seq: строка таблицы блокируется до конца транзакции,
+    поэтому записи фиксируются в порядке номеров и читатель changes?since= не пропустит
+    изменение, зафиксированное позже изменения с большим номером.
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE tables_table SET change_seq = change_seq + %s WHERE id = %s RETURNING change_seq',
+            [len(changes), table_id]
+        )
+        last_seq, = cursor.fetchone()
+        for seq, change in enumerate(changes, last_seq - len(changes) + 1):
+            change.table_id = table_id
+            change.seq = seq
+        TableChange.objects.bulk_create(changes)
+
+
+def row_inserted(row, values):
+    """Добавление строки со значениями ячеек {id колонки: значение}"""
+    record_changes(row.table_id, [
+        TableChange(kind=TableChange.Kind.ROW_INSERT, row_id=row.pk, value=values),
+    ])
+
+
+def row_deleted(row):
+    record_changes(row.table_id, [TableChange(kind=TableChange.Kind.ROW_DELETE, row_id=row.pk)])
+
+
+def cells_updated(row, old_values, new_values):
+    """Изменения ячеек строки: в журнал попадают только значения, которые действительно изменились"""
+    record_changes(row.table_id, [
+        TableChange(kind=TableChange.Kind.CELL_UPDATE, row_id=row.pk, column_id=column_id, value=value)
+        for column_id, value in new_values.items()
+        if old_values.get(column_id) != value
+    ])
+
+
+def column_deleted(column):
+    record_changes(column.table_id, [TableChange(kind=TableChange.Kind.COLUMN_DELETE, column_id=column.pk)])
+
+
+def column_converted(column, data_type):
+    record_changes(column.table_id, [
+        TableChange(kind=TableChange.Kind.COLUMN_CONVERT, column_id=column.pk, value=data_type),
+    ])
+
+
+def get_changes(table, since, limit, visible_row_ids=None):
+    """Пакет изменений таблицы с номерами больше since.
+
+    visible_row_ids - подзапрос id строк, которые видит пользователь (None - все строки):
+    изменения остальных строк не возвращаются, кроме удалений - по ним передается только id.
+    Возвращает (записи в виде массивов CHANGE_FIELDS, номер последней записи, есть ли еще записи).
+    """
+    changes = table.changes.filter(seq__gt=since).order_by('seq')
+    if visible_row_ids is not None:
+        changes = changes.filter(
+            ~Q(kind__in=[TableChange.Kind.ROW_INSERT, TableChange.Kind.CELL_UPDATE]) | Q(row_id__in=visible_row_ids)
+        )
+    batch = list(changes.values_list(*CHANGE_FIELDS)[:limit + 1])
+    has_more = len(batch) > limit
+    batch = batch[:limit]
+    last_seq = batch[-1][0] if batch else since
+    if not has_more:
+        # table прочитана до журнала: все записи до её change_seq уже зафиксированы,
+        # а пропущенные фильтром видимости не нужно запрашивать снова
+        last_seq = max(last_seq, table.change_seq)
+    return batch, last_seq, has_more
@@ -0,0 +1,112 @@
+from django.db import connection, transaction
+
+from .visibility import rebuild_row_visibility
+
+# Соответствие старых и новых id: новые id берутся из последовательности заранее,
+# чтобы связать скопированные записи без обхода в Python (%(source_filter)s - какие записи копируются)
+ID_MAP_SQL = '''
+    DROP TABLE IF EXISTS %(map)s;
+    CREATE TEMP TABLE %(map)s ON COMMIT DROP AS
+    SELECT id AS old_id, nextval(pg_get_serial_sequence('%(db_table)s', 'id')) AS new_id
+    FROM %(db_table)s
+    WHERE %(source_filter)s;
+'''
+
+CLONE_COLUMNS_SQL = '''
+    INSERT INTO tables_column (id, table_id, name, "order", data_type, show_aggregates)
+    SELECT m.new_id, %(target)s, c.name, c."order", c.data_type, c.show_aggregates
+    FROM clone_column_map m
+    JOIN tables_column c ON c.id = m.old_id
+'''
+
+CLONE_ROWS_SQL = '''
+    INSERT INTO tables_row (id, table_id, "order", created_by_id, creator_name, creator_filial_id, filial_name)
+    SELECT m.new_id, %(target)s, r."order", r.created_by_id, r.creator_name, r.creator_filial_id, r.filial_name
+    FROM clone_row_map m
+    JOIN tables_row r ON r.id = m.old_id
+'''
+
+CLONE_CELLS_SQL = '''
+    INSERT INTO tables_cell (
+        table_id, row_id, column_id, text_value, integer_value, float_value, boolean_value, date_value
+    )
+    SELECT %(target)s, rm.new_id, cm.new_id, c.text_value, c.integer_value, c.float_value, c.boolean_value, c.date_value
+    FROM tables_cell c
+    JOIN clone_row_map rm ON rm.old_id = c.row_id
+    JOIN clone_column_map cm ON cm.old_id = c.column_id
+    WHERE c.table_id = %(source)s
+'''
+
+CLONE_TABLE_PERMISSIONS_SQL = [
+    '''
+    INSERT INTO tables_tablepermission (table_id, user_id, can_view)
+    SELECT %(target)s, user_id, can_view FROM tables_tablepermission WHERE table_id = %(source)s
+    ON CONFLICT (table_id, user_id) DO NOTHING
+    ''',
+    '''
+    INSERT INTO tables_tablefilialpermission (table_id, filial_id, can_view)
+    SELECT %(target)s, filial_id, can_view FROM tables_tablefilialpermission WHERE table_id = %(source)s
+    ''',
+    '''
+    INSERT INTO tables_tabledepartmentpermission (table_id, department_id, can_view)
+    SELECT %(target)s, department_id, can_view FROM tables_tabledepartmentpermission WHERE table_id = %(source)s
+    ''',
+    '''
+    INSERT INTO tables_tablefiliallock (table_id, filial_id, locked_by_id, locked_at)
+    SELECT %(target)s, filial_id, locked_by_id, locked_at FROM tables_tablefiliallock WHERE table_id = %(source)s
+    ''',
+]
+
+CLONE_ROW_PERMISSIONS_SQL = [
+    '''
+    INSERT INTO tables_rowpermission (row_id, user_id, can_edit, can_delete)
+    SELECT m.new_id, p.user_id, p.can_edit, p.can_delete
+    FROM tables_rowpermission p
+    JOIN clone_row_map m ON m.old_id = p.row_id
+    ''',
+    '''
+    INSERT INTO tables_rowfilialpermission (row_id, filial_id, can_edit, can_delete)
+    SELECT m.new_id, p.filial_id, p.can_edit, p.can_delete
+    FROM tables_rowfilialpermission p
+    JOIN clone_row_map m ON m.old_id = p.row_id
+    ''',
+]
+
+
+def clone_table(source, target, rows=False, permissions=False):
+    """Копирует в пустую таблицу target колонки source, при rows - строки с ячейками,
+    при permissions - права на таблицу (и на строки, если копируются строки).
+
+    Все копируется запросами INSERT ... SELECT в одной транзакции, число запросов не зависит
+    от размера таблицы. Возвращает число скопированных строк.
+    """
+    params = {'source': source.pk, 'target': target.pk}
+    copied_rows = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(ID_MAP_SQL % {
+            'map': 'clone_column_map',
+            'db_table': 'tables_column',
+            'source_filter': 'table_id = %(source)s AND deleted_at IS NULL',
+        }, params)
+        cursor.execute(CLONE_COLUMNS_SQL, params)
+
+        if rows:
+            cursor.execute(ID_MAP_SQL % {
+                'map': 'clone_row_map',
+                'db_table': 'tables_row',
+                'source_filter': 'table_id = %(source)s',
+            }, params)
+            cursor.execute(CLONE_ROWS_SQL, params)
+            copied_rows = cursor.rowcount
+            cursor.execute(CLONE_CELLS_SQL, params)
+
+        if permissions:
+            for sql in CLONE_TABLE_PERMISSIONS_SQL:
+                cursor.execute(sql, params)
+            if rows:
+                for sql in CLONE_ROW_PERMISSIONS_SQL:
+                    cursor.execute(sql, params)
+
+        if rows:
+            rebuild_row_visibility(target.pk)
+    return copied_rows
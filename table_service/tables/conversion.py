@@ -0,0 +1,205 @@
+from django.db import connection, transaction
+
+from .changes import column_converted
+from .jobs import register_job, enqueue_job, save_checkpoint
+from .models import Table, Column, BackgroundJob
+
+CONVERT_COLUMN = 'convert_column'
+
+CELL_FIELDS = {
+    Column.ColumnType.TEXT: 'text_value',
+    Column.ColumnType.INTEGER: 'integer_value',
+    Column.ColumnType.FLOAT: 'float_value',
+    Column.ColumnType.BOOLEAN: 'boolean_value',
+    Column.ColumnType.DATE: 'date_value',
+}
+
+# Значение ячейки в виде текста (s) - из него разбирается новый тип и он же попадает в отчет об ошибках
+TEXT_EXPRESSIONS = {
+    Column.ColumnType.TEXT: "NULLIF(btrim(text_value), '')",
+    Column.ColumnType.INTEGER: 'integer_value::text',
+    Column.ColumnType.FLOAT: 'float_value::text',
+    Column.ColumnType.BOOLEAN: "CASE WHEN boolean_value THEN 'true' WHEN NOT boolean_value THEN 'false' END",
+    Column.ColumnType.DATE: "to_char(date_value, 'YYYY-MM-DD')",
+}
+
+# Дата из ГГГГ-ММ-ДД или ДД.ММ.ГГГГ в виде ГГГГ-ММ-ДД
+ISO_DATE = (
+    "CASE WHEN s ~ '^[0-9]{4}-[0-9]{2}-[0-9]{2}$' THEN s "
+    "WHEN s ~ '^[0-9]{2}[.][0-9]{2}[.][0-9]{4}$' THEN substr(s, 7, 4) || '-' || substr(s, 4, 2) || '-' || substr(s, 1, 2) END"
+)
+
+# Разбор текста в новый тип. Приведения типов вложены в CASE после проверки формата,
+# поэтому неподходящее значение дает NULL, а не ошибку всего запроса
+PARSE_EXPRESSIONS = {
+    Column.ColumnType.TEXT: 's',
+    Column.ColumnType.INTEGER: (
+        "CASE WHEN s ~ '^[+-]?[0-9]{1,18}$' THEN "
+        "CASE WHEN s::bigint BETWEEN -2147483648 AND 2147483647 THEN s::integer END END"
+    ),
+    Column.ColumnType.FLOAT: (
+        "CASE WHEN replace(s, ',', '.') ~ '^[+-]?([0-9]{1,30}([.][0-9]*)?|[.][0-9]+)([eE][+-]?[0-9]{1,2})?$' "
+        "THEN replace(s, ',', '.')::float8 END"
+    ),
+    Column.ColumnType.BOOLEAN: (
+        "CASE WHEN lower(s) IN ('true', 't', '1', 'yes', 'y', 'да', 'истина') THEN true "
+        "WHEN lower(s) IN ('false', 'f', '0', 'no', 'n', 'нет', 'ложь') THEN false END"
+    ),
+    Column.ColumnType.DATE: (
+        f"CASE WHEN ({ISO_DATE}) ~ '^[1-9][0-9]{{3}}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$' THEN "
+        # Проверка существования дня (31 февраля и т.п.) без исключения при приведении
+        f"CASE WHEN to_char((substr(({ISO_DATE}), 1, 8) || '01')::date + (substr(({ISO_DATE}), 9, 2)::integer - 1), "
+        f"'YYYY-MM-DD') = ({ISO_DATE}) THEN ({ISO_DATE})::date END END"
+    ),
+}
+
+# Приведения между числовыми и логическим типом без промежуточного текста
+DIRECT_EXPRESSIONS = {
+    (Column.ColumnType.INTEGER, Column.ColumnType.FLOAT): 'integer_value::float8',
+    (Column.ColumnType.FLOAT, Column.ColumnType.INTEGER): (
+        'CASE WHEN float_value = trunc(float_value) '
+        'AND float_value BETWEEN -2147483648 AND 2147483647 THEN float_value::integer END'
+    ),
+    (Column.ColumnType.INTEGER, Column.ColumnType.BOOLEAN): 'integer_value <> 0',
+    (Column.ColumnType.BOOLEAN, Column.ColumnType.INTEGER): (
+        'CASE WHEN boolean_value THEN 1 WHEN NOT boolean_value THEN 0 END'
+    ),
+    (Column.ColumnType.BOOLEAN, Column.ColumnType.FLOAT): (
+        'CASE WHEN boolean_value THEN 1.0 WHEN NOT boolean_value THEN 0.0 END'
+    ),
+}
+
+# Пакет ячеек колонки (по возрастанию id): приводит значения, пишет ошибки и новое поле одним запросом
+CONVERT_BATCH_SQL = '''
+    WITH parsed AS (
+        SELECT id, row_id, s, %(convert)s AS converted
+        FROM (
+            SELECT c.*, %(source_text)s AS s
+            FROM tables_cell c
+            WHERE c.table_id = %%(table_id)s AND c.column_id = %%(column_id)s AND c.id > %%(last_id)s
+            ORDER BY c.id
+            LIMIT %%(batch_size)s
+        ) batch
+    ), failures AS (
+        INSERT INTO tables_columnconversionfailure (job_id, row_id, value)
+        SELECT %%(job_id)s, row_id, s FROM parsed
+        WHERE s IS NOT NULL AND converted IS NULL
+        RETURNING 1
+    ), updated AS (
+        UPDATE tables_cell c SET %(target)s = parsed.converted
+        FROM parsed
+        WHERE c.table_id = %%(table_id)s AND c.id = parsed.id
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM parsed), (SELECT count(*) FROM updated), (SELECT count(*) FROM failures)
+'''
+
+# Очистка старого поля после переключения типа
+CLEAR_BATCH_SQL = '''
+    WITH batch AS (
+        SELECT id FROM tables_cell
+        WHERE table_id = %%(table_id)s AND column_id = %%(column_id)s AND id > %%(last_id)s
+        ORDER BY id
+        LIMIT %%(batch_size)s
+    ), cleared AS (
+        UPDATE tables_cell c SET %(source)s = NULL
+        FROM batch
+        WHERE c.table_id = %%(table_id)s AND c.id = batch.id
+        RETURNING 1
+    )
+    SELECT (SELECT max(id) FROM batch), (SELECT count(*) FROM cleared)
+'''
+
+
+def get_convert_sql(source_type, target_type):
+    """SQL пакетного приведения значений колонки из source_type в target_type"""
+    convert = DIRECT_EXPRESSIONS.get((source_type, target_type), PARSE_EXPRESSIONS[target_type])
+    return CONVERT_BATCH_SQL % {
+        'convert': convert,
+        'source_text': TEXT_EXPRESSIONS[source_type],
+        'target': CELL_FIELDS[target_type],
+    }
+
+
+def start_column_conversion(column, data_type, user=None, batch_size=5000):
+    """Ставит в очередь приведение колонки к типу data_type"""
+    return enqueue_job(
+        CONVERT_COLUMN,
+        table=column.table,
+        user=user,
+        column_id=column.pk,
+        source_type=column.data_type,
+        target_type=data_type,
+        batch_size=batch_size,
+        stage='fill',
+        last_id=0,
+    )
+
+
+def active_conversions(table):
+    """Незавершенные приведения колонок таблицы: пока они идут, строки таблицы не редактируются"""
+    return table.jobs.filter(
+        kind=CONVERT_COLUMN,
+        status__in=[BackgroundJob.Status.PENDING, BackgroundJob.Status.RUNNING],
+    )
+
+
+def convert_batches(cursor, job, sql, column_id, batch_size):
+    """Приводит ячейки пакетами начиная с job.params['last_id'], каждый пакет фиксируется отдельно"""
+    while True:
+        with transaction.atomic():
+            cursor.execute(sql, {
+                'table_id': job.table_id,
+                'column_id': column_id,
+                'last_id': job.params['last_id'],
+                'batch_size': batch_size,
+                'job_id': job.pk,
+            })
+            last_id, converted, failed = cursor.fetchone()
+            if last_id is None:
+                return
+            save_checkpoint(job, converted, failed, last_id=last_id)
+
+
+@register_job(CONVERT_COLUMN)
+def convert_column(job):
+    """Приводит значения колонки к новому типу без долгих блокировок.
+
+    1. fill - значения пакетами пишутся в поле нового типа, колонка пока работает в старом;
+    2. switch - в короткой транзакции дописываются новые ячейки и меняется data_type;
+    3. clear - старое поле очищается пакетами.
+    """
+    params = job.params
+    column_id, batch_size = params['column_id'], params['batch_size']
+    source_type, target_type = params['source_type'], params['target_type']
+    sql = get_convert_sql(source_type, target_type)
+
+    with connection.cursor() as cursor:
+        if params['stage'] == 'fill':
+            convert_batches(cursor, job, sql, column_id, batch_size)
+            save_checkpoint(job, stage='switch')
+
+        if params['stage'] == 'switch':
+            with transaction.atomic():
+                column = Column.objects.select_for_update().get(pk=column_id)
+                # Ячейки, добавленные во время заполнения, имеют большие id
+                convert_batches(cursor, job, sql, column_id, batch_size)
+                column.data_type = target_type
+                column.save(update_fields=['data_type'])
+                column_converted(column, target_type)
+                Table.bump_version(column.table_id)
+                save_checkpoint(job, stage='clear', last_id=0)
+
+        if params['stage'] == 'clear':
+            clear_sql = CLEAR_BATCH_SQL % {'source': CELL_FIELDS[source_type]}
+            while True:
+                with transaction.atomic():
+                    cursor.execute(clear_sql, {
+                        'table_id': job.table_id, 'column_id': column_id, 'last_id': params['last_id'],
+                        'batch_size': batch_size,
+                    })
+                    last_id, cleared = cursor.fetchone()
+                    if last_id is None:
+                        break
+                    save_checkpoint(job, last_id=last_id)
+            save_checkpoint(job, stage='done')
@@ -0,0 +1,247 @@
+import csv
+import datetime
+import hashlib
+import json
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.db import connection, models, transaction
+
+from .models import FilialMembership, Table
+
+# Пересчет членства в филиалах по профилям и справочнику сотрудников (%(user_filter)s - все или часть пользователей)
+UPSERT_MEMBERSHIP_SQL = '''
+    INSERT INTO tables_filialmembership (filial_id, user_id, set_date, end_date)
+    SELECT e.id_filial, p.user_id, e.set_date, e.end_date
+    FROM tables_profile p
+    JOIN tables_employee e ON e.id = p.employee_id
+    WHERE e.id_filial IS NOT NULL AND %(user_filter)s
+    ON CONFLICT (filial_id, user_id) DO UPDATE
+    SET set_date = EXCLUDED.set_date, end_date = EXCLUDED.end_date
+    WHERE (tables_filialmembership.set_date, tables_filialmembership.end_date)
+        IS DISTINCT FROM (EXCLUDED.set_date, EXCLUDED.end_date)
+'''
+
+DELETE_STALE_MEMBERSHIP_SQL = '''
+    DELETE FROM tables_filialmembership m
+    WHERE %(user_filter)s AND NOT EXISTS (
+        SELECT 1
+        FROM tables_profile p
+        JOIN tables_employee e ON e.id = p.employee_id
+        WHERE p.user_id = m.user_id AND e.id_filial = m.filial_id
+    )
+'''
+
+
+def filial_member_ids(filial_id):
+    """Подзапрос id действующих пользователей филиала (поиск по индексу filial_id, user_id)"""
+    return FilialMembership.objects.active().filter(filial_id=filial_id).values('user_id')
+
+
+def filial_members(filial_id):
+    """Действующие пользователи филиала"""
+    return User.objects.filter(id__in=filial_member_ids(filial_id))
+
+
+def refresh_filial_memberships(user_ids=None):
+    """Приводит членство в филиалах в соответствие со справочником сотрудников.
+
+    Возвращает пару (добавлено или изменено, удалено).
+    """
+    if user_ids is None:
+        params = []
+        upsert_sql = UPSERT_MEMBERSHIP_SQL % {'user_filter': 'TRUE'}
+        delete_sql = DELETE_STALE_MEMBERSHIP_SQL % {'user_filter': 'TRUE'}
+    else:
+        params = [list(user_ids)]
+        upsert_sql = UPSERT_MEMBERSHIP_SQL % {'user_filter': 'p.user_id = ANY(%s)'}
+        delete_sql = DELETE_STALE_MEMBERSHIP_SQL % {'user_filter': 'm.user_id = ANY(%s)'}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(upsert_sql, params)
+        upserted = cursor.rowcount
+        cursor.execute(delete_sql, params)
+        return upserted, cursor.rowcount
+
+# Создатель и филиал в строках таблиц по справочникам (%(user_filter)s - все или часть создателей);
+# обновляются только строки, у которых значения изменились
+REFRESH_ROW_CREATORS_SQL = '''
+    UPDATE tables_row r
+    SET creator_name = c.creator_name, creator_filial_id = c.filial_id, filial_name = c.filial_name
+    FROM (
+        SELECT u.id AS user_id,
+               COALESCE(e.secondname || ' ' || e.firstname || ' ' || e.lastname, '') AS creator_name,
+               e.id_filial AS filial_id,
+               f.name AS filial_name
+        FROM auth_user u
+        LEFT JOIN tables_profile p ON p.user_id = u.id
+        LEFT JOIN tables_employee e ON e.id = p.employee_id
+        LEFT JOIN tables_filial f ON f.id = e.id_filial
+        WHERE %(user_filter)s
+    ) c
+    WHERE r.created_by_id = c.user_id
+        AND (r.creator_name, r.creator_filial_id, r.filial_name)
+            IS DISTINCT FROM (c.creator_name, c.filial_id, c.filial_name)
+    RETURNING r.table_id
+'''
+
+
+def refresh_row_creators(user_ids=None):
+    """Обновляет создателя и филиал в строках таблиц после синхронизации справочников.
+
+    Версии затронутых таблиц увеличиваются. Возвращает число обновленных строк.
+    """
+    if user_ids is None:
+        params = []
+        sql = REFRESH_ROW_CREATORS_SQL % {'user_filter': 'TRUE'}
+    else:
+        params = [list(user_ids)]
+        sql = REFRESH_ROW_CREATORS_SQL % {'user_filter': 'u.id = ANY(%s)'}
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        table_ids = [table_id for table_id, in cursor.fetchall()]
+        for table_id in set(table_ids):
+            Table.bump_version(table_id)
+        return len(table_ids)
+
+# Пути от каждого узла из списка вверх по дереву; depth ограничивает обход при циклах в данных
+CLOSURE_SQL = '''
+    WITH RECURSIVE up (descendant_id, ancestor_id, depth) AS (
+        SELECT d.id, d.id, 0
+        FROM tables_department d
+        WHERE %(node_filter)s
+        UNION ALL
+        SELECT up.descendant_id, d.id_parent, up.depth + 1
+        FROM up
+        JOIN tables_department d ON d.id = up.ancestor_id
+        WHERE d.id_parent IS NOT NULL AND up.depth < 100
+    )
+    INSERT INTO tables_departmentclosure (ancestor_id, descendant_id, depth)
+    SELECT ancestor_id, descendant_id, MIN(depth)
+    FROM up
+    GROUP BY ancestor_id, descendant_id
+'''
+
+
+def rebuild_department_closure(department_ids=None):
+    """Перестраивает замыкание дерева подразделений.
+
+    Если переданы department_ids, пересчитываются только поддеревья этих подразделений:
+    только у их узлов мог измениться набор предков.
+    Возвращает число записанных пар.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        if department_ids is None:
+            cursor.execute('DELETE FROM tables_departmentclosure')
+            cursor.execute(CLOSURE_SQL % {'node_filter': 'TRUE'})
+            return cursor.rowcount
+
+        # Поддеревья по старому замыканию плюс сами изменившиеся узлы
+        cursor.execute('''
+            SELECT descendant_id FROM tables_departmentclosure WHERE ancestor_id = ANY(%s)
+            UNION
+            SELECT unnest(%s::integer[])
+        ''', [list(department_ids), list(department_ids)])
+        affected = [node_id for node_id, in cursor.fetchall()]
+        cursor.execute('DELETE FROM tables_departmentclosure WHERE descendant_id = ANY(%s)', [affected])
+        cursor.execute(CLOSURE_SQL % {'node_filter': 'd.id = ANY(%s)'}, [affected])
+        return cursor.rowcount
+
+
+def read_records(path):
+    """Построчно читает выгрузку справочника из CSV или JSONL"""
+    path = Path(path)
+    with path.open(encoding='utf-8', newline='') as file:
+        if path.suffix == '.jsonl':
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(file)
+
+
+def get_sync_fields(model):
+    """Поля справочника, которые приходят из выгрузки"""
+    return [field for field in model._meta.concrete_fields if field.name != 'fingerprint']
+
+
+def normalize_record(fields, record):
+    """Приводит значения записи выгрузки к типам полей модели"""
+    values = {}
+    for field in fields:
+        value = record.get(field.attname, record.get(field.name))
+        if value in (None, ''):
+            value = None
+        elif isinstance(field, models.IntegerField):
+            value = int(value)
+        elif isinstance(field, models.DateField):
+            value = value if isinstance(value, datetime.date) else datetime.date.fromisoformat(value)
+        else:
+            value = str(value)
+        values[field.attname] = value
+    return values
+
+
+def get_fingerprint(fields, values):
+    """Хэш записи: по нему определяется, изменилась ли запись"""
+    payload = json.dumps([values[field.attname] for field in fields], default=str, ensure_ascii=False)
+    return hashlib.md5(payload.encode('utf-8')).hexdigest()
+
+
+def sync_model(model, records, batch_size=5000, dry_run=False):
+    """Синхронизирует справочник model с потоком записей выгрузки.
+
+    Вставляет новые и обновляет изменившиеся записи пакетами по batch_size,
+    записям, пропавшим из выгрузки, проставляет end_date. Каждый пакет - отдельная
+    короткая транзакция, таблица целиком не блокируется.
+    Возвращает отчет: число вставленных, обновленных, закрытых и пропущенных записей
+    и id вставленных или обновленных записей (changed_ids).
+    """
+    fields = get_sync_fields(model)
+    update_fields = [field.attname for field in fields if not field.primary_key] + ['fingerprint']
+    current = dict(model.objects.values_list('id', 'fingerprint').iterator(chunk_size=batch_size))
+    report = {'inserted': 0, 'updated': 0, 'ended': 0, 'unchanged': 0, 'duplicates': 0, 'changed_ids': set()}
+    seen = set()
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            model.objects.bulk_create(
+                batch, update_conflicts=True, unique_fields=['id'], update_fields=update_fields
+            )
+        batch.clear()
+
+    for record in records:
+        values = normalize_record(fields, record)
+        values['fingerprint'] = get_fingerprint(fields, values)
+        record_id = values['id']
+        if record_id in seen:
+            report['duplicates'] += 1
+            continue
+        seen.add(record_id)
+
+        if record_id not in current:
+            report['inserted'] += 1
+        elif current[record_id] != values['fingerprint']:
+            report['updated'] += 1
+        else:
+            report['unchanged'] += 1
+            continue
+
+        report['changed_ids'].add(record_id)
+        batch.append(model(**values))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    # Записи, которых нет в выгрузке, не удаляются, а закрываются датой окончания
+    missing = [record_id for record_id in current if record_id not in seen]
+    today = datetime.date.today()
+    for start in range(0, len(missing), batch_size):
+        ended = model.objects.filter(id__in=missing[start:start + batch_size], end_date__isnull=True)
+        if dry_run:
+            report['ended'] += ended.count()
+        else:
+            report['ended'] += ended.update(end_date=today, fingerprint='')
+    return report
@@ -1,7 +1,8 @@
 from django import forms
 from django.core.exceptions import ValidationError
 
-from .models import Table, Column, Cell
+from .models import Table, Column, Cell, SavedView
+from .reports import REPORT_FUNCTIONS, get_dimensions, get_measures
 
 
 class TableForm(forms.ModelForm):
@@ -10,15 +11,87 @@ class TableForm(forms.ModelForm):
         fields = ['title']
 
 
+class CloneTableForm(forms.Form):
+    title = forms.CharField(max_length=200, label='Название копии')
+    include_rows = forms.BooleanField(required=False, label='Копировать строки')
+    include_permissions = forms.BooleanField(required=False, label='Копировать права доступа')
+
+
 class ColumnForm(forms.ModelForm):
     class Meta:
         model = Column
-        fields = ['name', 'data_type']
+        fields = ['name', 'data_type', 'show_aggregates']
         widgets = {
-            'data_type': forms.Select(choices=Column.ColumnType.choices)
+            'data_type': forms.Select(choices=Column.ColumnType.choices),
+            'show_aggregates': forms.CheckboxInput(attrs={'class': 'form-check-input'})
         }
 
 
+class ColumnConvertForm(forms.Form):
+    data_type = forms.ChoiceField(label='Новый тип данных', widget=forms.Select(attrs={'class': 'form-select'}))
+
+    def __init__(self, *args, **kwargs):
+        self.column = kwargs.pop('column')
+        super().__init__(*args, **kwargs)
+        self.fields['data_type'].choices = [
+            choice for choice in Column.ColumnType.choices if choice[0] != self.column.data_type
+        ]
+
+
+class ReportForm(forms.Form):
+    group_by = forms.ChoiceField(label='Группировать по', widget=forms.Select(attrs={'class': 'form-select'}))
+    pivot_by = forms.ChoiceField(
+        label='Колонки отчета', required=False, widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    function = forms.ChoiceField(
+        label='Функция', initial='sum', choices=REPORT_FUNCTIONS.items(),
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    measures = forms.TypedMultipleChoiceField(
+        label='Показатели', required=False, coerce=int,
+        widget=forms.SelectMultiple(attrs={'class': 'form-select'})
+    )
+
+    def __init__(self, *args, **kwargs):
+        columns = kwargs.pop('columns')
+        super().__init__(*args, **kwargs)
+        dimensions = list(get_dimensions(columns).items())
+        self.fields['group_by'].choices = dimensions
+        self.fields['pivot_by'].choices = [('', '—')] + dimensions
+        self.fields['measures'].choices = [(column.id, column.name) for column in get_measures(columns)]
+
+    def get_report_params(self):
+        """Параметры для reports.get_report"""
+        data = self.cleaned_data
+        return {
+            'group_by': data['group_by'],
+            'pivot_by': data['pivot_by'] or None,
+            'function': data['function'],
+            'measure_ids': data['measures'] or None,
+        }
+
+
+class SavedViewForm(forms.ModelForm):
+    columns = forms.TypedMultipleChoiceField(
+        label='Колонки', required=False, coerce=int,
+        widget=forms.SelectMultiple(attrs={'class': 'form-select'})
+    )
+
+    class Meta:
+        model = SavedView
+        fields = ['name', 'search_query', 'sort', 'columns']
+        widgets = {
+            'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Название представления'}),
+            'search_query': forms.HiddenInput(),
+            'sort': forms.HiddenInput(),
+        }
+
+    def __init__(self, *args, **kwargs):
+        table = kwargs.pop('table')
+        super().__init__(*args, **kwargs)
+        self.fields['columns'].choices = [(column.id, column.name) for column in table.columns.all()]
+
+
 class ShareTableForm(forms.Form):
     email = forms.EmailField(label="User Email")
     can_edit = forms.BooleanField(
@@ -107,11 +180,7 @@ class RowEditForm(forms.Form):
 
         if self.row:
             for column in self.row.table.columns.all():
-                cell = self.row.cells.filter(column=column).first()
-                if cell:
-                    initial_value = cell.value
-                else:
-                    initial_value = ''
+                initial_value = self.row.cell_values.get(column.id, '')
                 field_name = f'col_{column.id}'
                 if column.data_type == Column.ColumnType.INTEGER:
                     self.fields[field_name] = forms.IntegerField(
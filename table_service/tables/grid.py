@@ -0,0 +1,82 @@
+import logging
+
+from .models import Row
+from .search import search_rows, parse_column_filters, filter_rows
+
+logger = logging.getLogger(__name__)
+
+# Поле строки, по которому сортирует служебная колонка сетки (индексы row_table_creator, row_table_filial)
+SORT_FIELDS = {
+    'user': 'creator_name',
+    'filial': 'filial_name',
+}
+
+
+class GridQuery:
+    """План запроса строк сетки по параметрам запроса (q, фильтры col_<id>__<операция>, sort, page).
+
+    В запрос попадают только нужные поиск, фильтры и аннотации: подзапрос значения колонки -
+    только для колонок, по которым сортируют. Создатель и филиал хранятся в самой строке.
+    """
+
+    def __init__(self, table_obj, params):
+        self.table_obj = table_obj
+        self.columns = {column.id: column for column in table_obj.columns.all()}
+        self.search_query = params.get('q', '')
+        self.column_filters = parse_column_filters(params, self.columns.values())
+        self.page = params.get('page', '1')
+
+        self.sort = []
+        for alias in params.get('sort', '').split(','):
+            alias = alias.strip()
+            if self.sort_field(alias.lstrip('-')):
+                self.sort.append(alias)
+
+        self.annotations = []
+        for alias in self.sort:
+            field = self.sort_field(alias.lstrip('-'))
+            if field.startswith('sort_value_') and field not in self.annotations:
+                self.annotations.append(field)
+
+    def sort_field(self, name):
+        """Поле или аннотация для сортировки по колонке сетки name или None, если такой колонки нет"""
+        if name in SORT_FIELDS:
+            return SORT_FIELDS[name]
+        column_id = name[len('col_'):] if name.startswith('col_') else ''
+        if column_id.isdigit() and int(column_id) in self.columns:
+            return f'sort_value_{column_id}'
+        return None
+
+    @property
+    def ordering(self):
+        """order_by для сортировки плана; при равных значениях - порядок строк таблицы"""
+        return [
+            ('-' if alias.startswith('-') else '') + self.sort_field(alias.lstrip('-'))
+            for alias in self.sort
+        ] + ['order', 'id']
+
+    def apply(self, rows):
+        """Добавляет к rows поиск, фильтры и аннотации плана"""
+        if self.search_query:
+            rows = search_rows(rows, self.table_obj, self.search_query)
+        if self.column_filters:
+            rows = filter_rows(rows, self.column_filters)
+        for annotation in self.annotations:
+            column = self.columns[int(annotation[len('sort_value_'):])]
+            rows = Row.annotate_for_sorting(rows, self.table_obj.pk, column.id, column.data_type)
+        logger.debug('План запроса сетки: %s', '; '.join(self.describe()))
+        return rows
+
+    def describe(self):
+        """Выбранный план по строкам - для отладки"""
+        column_filters = ', '.join(
+            f'{column.name} {operation} {value}' for column, operation, value in self.column_filters
+        )
+        return [
+            f'таблица: {self.table_obj.pk}',
+            f'поиск: {self.search_query or "нет"}',
+            f'фильтры: {column_filters or "нет"}',
+            f'сортировка: {", ".join(self.ordering)}',
+            f'аннотации: {", ".join(self.annotations) or "нет"}',
+            f'страница: {self.page}',
+        ]
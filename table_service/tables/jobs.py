@@ -0,0 +1,78 @@
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Обработчики фоновых задач по виду задачи (заполняется через register_job)
+JOB_HANDLERS = {}
+
+
+def register_job(kind):
+    """Регистрирует функцию handler(job) как обработчик задач вида kind"""
+    def decorator(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return decorator
+
+
+def enqueue_job(kind, table=None, user=None, **params):
+    """Ставит задачу в очередь; выполнит её команда run_background_jobs"""
+    return BackgroundJob.objects.create(kind=kind, table=table, created_by=user, params=params)
+
+
+def claim_next_job():
+    """Забирает следующую задачу из очереди (параллельные обработчики не получат одну и ту же)"""
+    with transaction.atomic():
+        job = BackgroundJob.objects.select_for_update(skip_locked=True).filter(
+            status=BackgroundJob.Status.PENDING
+        ).order_by('id').first()
+        if job is None:
+            return None
+        job.status = BackgroundJob.Status.RUNNING
+        job.started_at = datetime.datetime.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def save_checkpoint(job, processed=0, failed=0, **state):
+    """Сохраняет прогресс и состояние задачи, чтобы после перезапуска продолжить с того же места"""
+    job.params.update(state)
+    job.processed += processed
+    job.failed += failed
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        params=job.params,
+        processed=F('processed') + processed,
+        failed=F('failed') + failed,
+    )
+
+
+def run_job(job):
+    """Выполняет задачу и записывает итоговый статус"""
+    try:
+        JOB_HANDLERS[job.kind](job)
+    except Exception as e:
+        logger.exception('Фоновая задача %s завершилась с ошибкой', job)
+        job.status = BackgroundJob.Status.FAILED
+        job.error = str(e)
+    else:
+        job.status = BackgroundJob.Status.DONE
+    job.finished_at = datetime.datetime.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Выполняет задачи из очереди, пока она не опустеет (или не будет выполнено limit задач)"""
+    done = 0
+    while limit is None or done < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        done += 1
+    return done
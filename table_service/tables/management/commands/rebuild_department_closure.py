@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tables.directory import rebuild_department_closure
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает замыкание дерева подразделений'
+
+    def handle(self, *args, **options):
+        count = rebuild_department_closure()
+        self.stdout.write(self.style.SUCCESS(f'Записано пар предок-потомок: {count}'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from tables.visibility import rebuild_row_visibility
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс видимости строк (RowVisibility)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--table', type=int, help='id таблицы (по умолчанию - все таблицы)')
+
+    def handle(self, *args, **options):
+        rebuild_row_visibility(options['table'])
+        self.stdout.write(self.style.SUCCESS('Индекс видимости строк перестроен'))
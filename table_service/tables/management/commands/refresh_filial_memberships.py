@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from tables.directory import refresh_filial_memberships
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает членство пользователей в филиалах по справочнику сотрудников'
+
+    def handle(self, *args, **options):
+        upserted, deleted = refresh_filial_memberships()
+        self.stdout.write(self.style.SUCCESS(f'Добавлено или изменено: {upserted}, удалено: {deleted}'))
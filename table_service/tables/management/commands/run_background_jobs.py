@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tables.jobs import run_pending_jobs
+from tables.models import BackgroundJob
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди (приведение типов колонок и т.п.)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Выполнить очередь и выйти')
+        parser.add_argument('--sleep', type=float, default=5, help='Пауза между проверками очереди, с')
+        parser.add_argument(
+            '--requeue-running', action='store_true',
+            help='Вернуть в очередь задачи, прерванные остановкой обработчика (продолжатся с сохраненного места)'
+        )
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = BackgroundJob.objects.filter(status=BackgroundJob.Status.RUNNING).update(
+                status=BackgroundJob.Status.PENDING
+            )
+            self.stdout.write(f'Возвращено в очередь: {requeued}')
+
+        while True:
+            done = run_pending_jobs()
+            if done:
+                self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from tables.directory import (
+    read_records, sync_model, refresh_filial_memberships, rebuild_department_closure, refresh_row_creators
+)
+from tables.models import Filial, Department, Employee
+
+
+class Command(BaseCommand):
+    help = 'Синхронизирует справочники филиалов, подразделений и сотрудников с выгрузкой (CSV или JSONL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--filials', help='Файл выгрузки филиалов')
+        parser.add_argument('--departments', help='Файл выгрузки подразделений')
+        parser.add_argument('--employees', help='Файл выгрузки сотрудников')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пакета записи')
+        parser.add_argument('--dry-run', action='store_true', help='Только показать, что изменится')
+
+    def handle(self, *args, **options):
+        sources = [
+            (Filial, options['filials']),
+            (Department, options['departments']),
+            (Employee, options['employees']),
+        ]
+        changed = False
+        for model, path in sources:
+            if not path:
+                continue
+            start = time.perf_counter()
+            report = sync_model(model, read_records(path), options['batch_size'], options['dry_run'])
+            changed = changed or any(report[key] for key in ('inserted', 'updated', 'ended'))
+            if model is Department and report['changed_ids'] and not options['dry_run']:
+                paths = rebuild_department_closure(report['changed_ids'])
+                self.stdout.write(f'Дерево подразделений: пересчитано путей {paths}')
+            self.stdout.write(
+                f'{model._meta.model_name}: новых {report["inserted"]}, изменено {report["updated"]}, '
+                f'закрыто {report["ended"]}, без изменений {report["unchanged"]}, '
+                f'дублей в выгрузке {report["duplicates"]} ({time.perf_counter() - start:.1f} с)'
+            )
+
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING('Пробный запуск: изменения не записаны'))
+        elif changed:
+            upserted, deleted = refresh_filial_memberships()
+            self.stdout.write(f'Членство в филиалах: добавлено или изменено {upserted}, удалено {deleted}')
+            self.stdout.write(f'Создатели строк таблиц: обновлено строк {refresh_row_creators()}')
+            self.stdout.write(self.style.SUCCESS('Синхронизация справочников завершена'))
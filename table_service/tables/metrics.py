@@ -0,0 +1,192 @@
+"""Метрики сервиса в формате Prometheus.
+
+Счётчики и гистограммы живут в памяти процесса (или в mmap-файлах каталога
+PROMETHEUS_MULTIPROC_DIR при запуске в несколько воркеров), поэтому их сбор
+не обращается к БД. Показатели, которые можно получить только из БД
+(число таблиц, строк, активных блокировок), кэшируются на METRICS_DB_TTL секунд.
+"""
+import datetime
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CollectorRegistry, Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from .replica import replica_configured, replica_lag
+
+VIEW_LATENCY = Histogram(
+    'table_service_view_latency_seconds',
+    'Время обработки запроса представлением',
+    ['view', 'method'],
+)
+SQL_TIME = Histogram(
+    'table_service_request_sql_seconds',
+    'Суммарное время SQL-запросов за один HTTP-запрос',
+    ['view'],
+)
+SQL_QUERIES = Histogram(
+    'table_service_request_sql_queries',
+    'Число SQL-запросов за один HTTP-запрос',
+    ['view'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+ROW_LOCK_CONTENTION = Counter(
+    'table_service_row_lock_contention',
+    'Отказы в блокировке строки, занятой другим пользователем (ответ 423)',
+)
+ROW_LOCK_EXPIRED = Counter(
+    'table_service_row_lock_expired',
+    'Устаревшие блокировки строк, перехваченные другим пользователем',
+)
+EXPORT_BYTES = Histogram(
+    'table_service_export_bytes',
+    'Размер выгрузки таблицы',
+    ['format'],
+    buckets=(1e3, 1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8),
+)
+EXPORT_SECONDS = Histogram(
+    'table_service_export_seconds',
+    'Время формирования выгрузки таблицы',
+    ['format'],
+)
+COMPRESSION_SECONDS = Histogram(
+    'table_service_compression_seconds',
+    'Время сжатия ответа (CompressionMiddleware)',
+    ['view', 'encoding'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+COMPRESSION_BYTES = Counter(
+    'table_service_compression_bytes',
+    'Объем ответов до (original) и после (compressed) сжатия',
+    ['encoding', 'stage'],
+)
+REPLICA_READS = Counter(
+    'table_service_replica_reads',
+    'Запросы к представлениям чтения по БД, из которой читались данные таблиц',
+    ['view', 'database'],
+)
+CACHE_REQUESTS = Counter(
+    'table_service_cache_requests',
+    'Обращения к кэшу сервиса',
+    ['cache', 'result'],
+)
+
+DB_GAUGES_CACHE_KEY = 'metrics:db_gauges'
+
+
+def record_cache(name, hit):
+    """Учитывает попадание или промах кэша name"""
+    CACHE_REQUESTS.labels(cache=name, result='hit' if hit else 'miss').inc()
+
+
+def get_db_gauges():
+    """Возвращает показатели из БД, пересчитывая их не чаще раза в METRICS_DB_TTL секунд"""
+    gauges = cache.get(DB_GAUGES_CACHE_KEY)
+    if gauges is None:
+        from .models import Table, RowLock
+
+        lock_timeout = datetime.timedelta(minutes=settings.ROW_LOCK_TIMEOUT_MINUTES)
+        with connection.cursor() as cursor:
+            # Оценка из статистики планировщика вместо COUNT(*) по большой таблице
+            cursor.execute(
+                "SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = 'tables_row'::regclass"
+            )
+            row_count = cursor.fetchone()[0]
+        gauges = {
+            'tables': Table.objects.count(),
+            'rows': row_count,
+            'active_row_locks': RowLock.objects.filter(
+                locked_at__gte=datetime.datetime.now() - lock_timeout
+            ).count(),
+        }
+        cache.set(DB_GAUGES_CACHE_KEY, gauges, settings.METRICS_DB_TTL)
+    return gauges
+
+
+class DatabaseCollector:
+    """Gauge-метрики по содержимому БД"""
+
+    def collect(self):
+        gauges = get_db_gauges()
+        yield GaugeMetricFamily('table_service_tables', 'Число таблиц', value=gauges['tables'])
+        yield GaugeMetricFamily('table_service_rows', 'Оценка числа строк во всех таблицах', value=gauges['rows'])
+        yield GaugeMetricFamily(
+            'table_service_active_row_locks', 'Действующие блокировки строк', value=gauges['active_row_locks']
+        )
+
+
+class ReplicaCollector:
+    """Отставание реплики БД; -1 - реплика недоступна"""
+
+    def collect(self):
+        lag = replica_lag()
+        yield GaugeMetricFamily(
+            'table_service_replica_lag_seconds', 'Отставание реплики БД, сек (-1 - недоступна)',
+            value=-1 if lag is None else lag
+        )
+
+
+class CacheRatioCollector:
+    """Доля попаданий в кэш, вычисленная из счётчиков обращений"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def collect(self):
+        totals = {}
+        for metric in self.source.collect():
+            if metric.name != 'table_service_cache_requests':
+                continue
+            for sample in metric.samples:
+                if sample.name.endswith('_total'):
+                    name = sample.labels['cache']
+                    hits, requests = totals.get(name, (0, 0))
+                    if sample.labels['result'] == 'hit':
+                        hits += sample.value
+                    totals[name] = (hits, requests + sample.value)
+
+        gauge = GaugeMetricFamily(
+            'table_service_cache_hit_ratio', 'Доля попаданий в кэш', labels=['cache']
+        )
+        for name, (hits, requests) in totals.items():
+            gauge.add_metric([name], hits / requests if requests else 0)
+        yield gauge
+
+
+def get_registry():
+    """Собирает реестр метрик с учётом многопроцессного режима"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        source = CollectorRegistry()
+        multiprocess.MultiProcessCollector(source)
+    else:
+        source = REGISTRY
+
+    registry = CollectorRegistry()
+    registry.register(_Forward(source))
+    registry.register(CacheRatioCollector(source))
+    registry.register(DatabaseCollector())
+    if replica_configured():
+        registry.register(ReplicaCollector())
+    return registry
+
+
+class _Forward:
+    """Передаёт метрики из исходного реестра в реестр ответа"""
+
+    def __init__(self, source):
+        self.source = source
+
+    def collect(self):
+        return self.source.collect()
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden('Неверный токен метрик')
+    return HttpResponse(generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,214 @@
+import re
+import time
+from contextlib import ExitStack
+
+import brotli
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+from .metrics import VIEW_LATENCY, SQL_TIME, SQL_QUERIES, COMPRESSION_SECONDS, COMPRESSION_BYTES, REPLICA_READS
+from .replica import REPLICA, replica_available, use_replica
+
+# Случайные байты в заголовке gzip - защита от BREACH, как в django.middleware.gzip
+GZIP_RANDOM_BYTES = 100
+
+
+def get_view_name(request):
+    """Имя представления для меток метрик"""
+    match = getattr(request, 'resolver_match', None)
+    return match.url_name or match.view_name if match else 'unresolved'
+
+
+class SqlTimer:
+    """execute_wrapper, накапливающий время и число SQL-запросов"""
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.queries = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """Снимает время ответа и SQL-нагрузку для каждого представления"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = SqlTimer()
+        start = time.perf_counter()
+        # Запросы к реплике учитываются вместе с запросами к основной БД
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - start
+
+        view = get_view_name(request)
+        VIEW_LATENCY.labels(view=view, method=request.method).observe(elapsed)
+        SQL_TIME.labels(view=view).observe(timer.seconds)
+        SQL_QUERIES.labels(view=view).observe(timer.queries)
+        return response
+
+
+class ReplicaMiddleware:
+    """Представления из REPLICA_READ_VIEWS читают данные таблиц с реплики.
+
+    После запроса на изменение (POST и т.п.) браузер на REPLICA_PIN_SECONDS секунд закрепляется
+    за основной БД (cookie REPLICA_PIN_COOKIE), чтобы пользователь сразу видел свои изменения.
+    Реплика не используется, если недоступна или отстает больше чем на REPLICA_MAX_LAG_SECONDS.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            request.replica_stack = stack
+            response = self.get_response(request)
+
+        if request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view = get_view_name(request)
+        if request.method not in ('GET', 'HEAD') or view not in settings.REPLICA_READ_VIEWS:
+            return None
+        if request.COOKIES.get(settings.REPLICA_PIN_COOKIE) or not replica_available():
+            REPLICA_READS.labels(view=view, database='default').inc()
+            return None
+        REPLICA_READS.labels(view=view, database=REPLICA).inc()
+        request.replica_stack.enter_context(use_replica())
+        return None
+
+
+def get_accepted_encodings(header):
+    """Кодировки из заголовка Accept-Encoding, которые клиент принимает (q > 0)"""
+    encodings = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name.strip() and quality > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def brotli_sequence(sequence):
+    """Потоковое сжатие brotli: каждая часть ответа отдается клиенту сразу после сжатия"""
+    compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+COMPRESSORS = {
+    'br': lambda content: brotli.compress(content, quality=settings.COMPRESSION_BROTLI_QUALITY),
+    'gzip': lambda content: compress_string(content, max_random_bytes=GZIP_RANDOM_BYTES),
+}
+
+STREAM_COMPRESSORS = {
+    'br': brotli_sequence,
+    'gzip': lambda sequence: compress_sequence(sequence, max_random_bytes=GZIP_RANDOM_BYTES),
+}
+
+
+class CompressionMiddleware:
+    """Сжимает HTML, JSON и выгрузки: brotli или gzip - что принимает клиент, brotli в приоритете.
+
+    Ответы меньше COMPRESSION_MIN_BYTES не сжимаются, потоковые ответы сжимаются по частям.
+    Время сжатия и объем до и после учитываются в метриках.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        content_type = response.get('Content-Type', '').split(';')[0].strip()
+        if (
+            content_type not in settings.COMPRESSION_CONTENT_TYPES
+            or response.has_header('Content-Encoding')
+            or getattr(response, 'is_async', False)
+            or (not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES)
+        ):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accepted = get_accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        encoding = next((name for name in ('br', 'gzip') if name in accepted), None)
+        if encoding is None:
+            return response
+
+        view = get_view_name(request)
+        if response.streaming:
+            response.streaming_content = self.compress_stream(response.streaming_content, encoding, view)
+            del response.headers['Content-Length']
+        else:
+            start = time.perf_counter()
+            compressed = COMPRESSORS[encoding](response.content)
+            self.record(view, encoding, time.perf_counter() - start, len(response.content), len(compressed))
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        # Сжатое тело отличается побайтно - сильный ETag становится слабым
+        if response.has_header('ETag'):
+            response.headers['ETag'] = re.sub(r'^(?!W/)', 'W/', response['ETag'])
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress_stream(self, sequence, encoding, view):
+        """Сжимает потоковый ответ; время получения исходных частей в метрику сжатия не входит"""
+        totals = {'source_seconds': 0.0, 'original': 0}
+
+        def source():
+            chunks = iter(sequence)
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                totals['source_seconds'] += time.perf_counter() - start
+                if chunk is None:
+                    return
+                totals['original'] += len(chunk)
+                yield chunk
+
+        compressor = iter(STREAM_COMPRESSORS[encoding](source()))
+        seconds = 0.0
+        compressed = 0
+        while True:
+            # Время отправки клиенту между частями тоже не учитывается
+            start = time.perf_counter()
+            data = next(compressor, None)
+            seconds += time.perf_counter() - start
+            if data is None:
+                break
+            compressed += len(data)
+            yield data
+        self.record(view, encoding, seconds - totals['source_seconds'], totals['original'], compressed)
+
+    @staticmethod
+    def record(view, encoding, seconds, original, compressed):
+        COMPRESSION_SECONDS.labels(view=view, encoding=encoding).observe(seconds)
+        COMPRESSION_BYTES.labels(encoding=encoding, stage='original').inc(original)
+        COMPRESSION_BYTES.labels(encoding=encoding, stage='compressed').inc(compressed)
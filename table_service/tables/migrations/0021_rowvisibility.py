@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0020_admin_delete_tableadmin'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowVisibility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filial_id', models.IntegerField(blank=True, null=True)),
+                ('row', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='visibility', to='tables.row')),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tables.table')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['table', 'user', 'row'], name='rowvisibility_table_user'), models.Index(fields=['table', 'filial_id', 'row'], name='rowvisibility_table_filial')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('row', 'user'), name='rowvisibility_unique_user'), models.UniqueConstraint(condition=models.Q(('filial_id__isnull', False)), fields=('row', 'filial_id'), name='rowvisibility_unique_filial'), models.CheckConstraint(condition=models.Q(models.Q(('filial_id__isnull', True), ('user__isnull', False)), models.Q(('filial_id__isnull', False), ('user__isnull', True)), _connector='OR'), name='rowvisibility_user_xor_filial')],
+            },
+        ),
+        migrations.RunSQL(
+            sql=[
+                '''
+                INSERT INTO tables_rowvisibility (table_id, row_id, user_id, filial_id)
+                SELECT r.table_id, p.row_id, p.user_id, NULL::integer
+                FROM tables_rowpermission p
+                JOIN tables_row r ON r.id = p.row_id
+                UNION
+                SELECT r.table_id, r.id, r.created_by_id, NULL::integer
+                FROM tables_row r
+                WHERE r.created_by_id IS NOT NULL
+                ON CONFLICT DO NOTHING
+                ''',
+                '''
+                INSERT INTO tables_rowvisibility (table_id, row_id, user_id, filial_id)
+                SELECT r.table_id, r.id, NULL, e.id_filial
+                FROM tables_row r
+                JOIN tables_profile pr ON pr.user_id = r.created_by_id
+                JOIN tables_employee e ON e.id = pr.employee_id
+                WHERE e.id_filial IS NOT NULL
+                ON CONFLICT DO NOTHING
+                ''',
+            ],
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
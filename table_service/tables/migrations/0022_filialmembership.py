@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0021_rowvisibility'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilialMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filial_id', models.IntegerField()),
+                ('set_date', models.DateField(blank=True, null=True)),
+                ('end_date', models.DateField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='filial_memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('filial_id', 'user'), name='filialmembership_unique')],
+            },
+        ),
+        migrations.RunSQL(
+            sql='''
+                INSERT INTO tables_filialmembership (filial_id, user_id, set_date, end_date)
+                SELECT e.id_filial, p.user_id, e.set_date, e.end_date
+                FROM tables_profile p
+                JOIN tables_employee e ON e.id = p.employee_id
+                WHERE e.id_filial IS NOT NULL
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
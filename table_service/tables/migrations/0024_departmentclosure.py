@@ -0,0 +1,74 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0023_directory_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ancestor_id', models.IntegerField()),
+                ('descendant_id', models.IntegerField()),
+                ('depth', models.PositiveIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='TableDepartmentPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('can_view', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='employee',
+            index=models.Index(fields=['id_department'], name='employee_department'),
+        ),
+        migrations.AddIndex(
+            model_name='departmentclosure',
+            index=models.Index(fields=['descendant_id'], name='departmentclosure_descendant'),
+        ),
+        migrations.AddConstraint(
+            model_name='departmentclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor_id', 'descendant_id'), name='departmentclosure_unique'),
+        ),
+        migrations.AddField(
+            model_name='tabledepartmentpermission',
+            name='department',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tables.department'),
+        ),
+        migrations.AddField(
+            model_name='tabledepartmentpermission',
+            name='table',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='department_permissions', to='tables.table'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='tabledepartmentpermission',
+            unique_together={('table', 'department')},
+        ),
+        migrations.RunSQL(
+            sql='''
+                WITH RECURSIVE up (descendant_id, ancestor_id, depth) AS (
+                    SELECT d.id, d.id, 0
+                    FROM tables_department d
+                    UNION ALL
+                    SELECT up.descendant_id, d.id_parent, up.depth + 1
+                    FROM up
+                    JOIN tables_department d ON d.id = up.ancestor_id
+                    WHERE d.id_parent IS NOT NULL AND up.depth < 100
+                )
+                INSERT INTO tables_departmentclosure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, MIN(depth)
+                FROM up
+                GROUP BY ancestor_id, descendant_id
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0025_backgroundjob'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='column',
+            options={'ordering': ['order', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='row',
+            options={'ordering': ['order', 'id']},
+        ),
+        migrations.AlterField(
+            model_name='column',
+            name='order',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='row',
+            name='order',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='column',
+            index=models.Index(fields=['table', 'order', 'id'], name='column_table_order'),
+        ),
+        migrations.AddIndex(
+            model_name='row',
+            index=models.Index(fields=['table', 'order', 'id'], name='row_table_order'),
+        ),
+        migrations.RunSQL(
+            sql='''
+                UPDATE tables_row r SET "order" = s.rn * 65536
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY table_id ORDER BY "order", id) AS rn
+                    FROM tables_row
+                ) s
+                WHERE r.id = s.id;
+                UPDATE tables_column c SET "order" = s.rn * 65536
+                FROM (
+                    SELECT id, row_number() OVER (PARTITION BY table_id ORDER BY "order", id) AS rn
+                    FROM tables_column
+                ) s
+                WHERE c.id = s.id;
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0027_soft_delete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='column',
+            name='show_aggregates',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
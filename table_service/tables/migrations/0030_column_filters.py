@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 16:56
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0029_savedview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='savedview',
+            name='filters',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['column', 'integer_value'], name='cell_column_integer'),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['column', 'float_value'], name='cell_column_float'),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['column', 'boolean_value'], name='cell_column_boolean'),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(fields=['column', 'date_value'], name='cell_column_date'),
+        ),
+        migrations.AddIndex(
+            model_name='cell',
+            index=models.Index(models.F('column'), django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper(django.db.models.functions.text.Left('text_value', 200)), name='text_pattern_ops'), name='cell_column_text_prefix'),
+        ),
+    ]
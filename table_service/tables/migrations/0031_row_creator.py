@@ -0,0 +1,51 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:03
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0030_column_filters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='row',
+            name='creator_filial_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='row',
+            name='creator_name',
+            field=models.CharField(blank=True, default='', max_length=152),
+        ),
+        migrations.AddField(
+            model_name='row',
+            name='filial_name',
+            field=models.CharField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            sql='''
+                UPDATE tables_row r
+                SET creator_name = e.secondname || ' ' || e.firstname || ' ' || e.lastname,
+                    creator_filial_id = e.id_filial,
+                    filial_name = f.name
+                FROM tables_profile p
+                JOIN tables_employee e ON e.id = p.employee_id
+                LEFT JOIN tables_filial f ON f.id = e.id_filial
+                WHERE p.user_id = r.created_by_id
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='row',
+            index=models.Index(fields=['table', 'creator_name', 'order', 'id'], name='row_table_creator'),
+        ),
+        migrations.AddIndex(
+            model_name='row',
+            index=models.Index(fields=['table', 'filial_name', 'order', 'id'], name='row_table_filial'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:09
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0031_row_creator'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='table',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='TableChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('seq', models.PositiveBigIntegerField()),
+                ('kind', models.CharField(choices=[('row_insert', 'Добавлена строка'), ('row_delete', 'Удалена строка'), ('cell_update', 'Изменена ячейка'), ('column_delete', 'Удалена колонка'), ('column_convert', 'Изменен тип колонки')], max_length=20)),
+                ('row_id', models.BigIntegerField(blank=True, null=True)),
+                ('column_id', models.BigIntegerField(blank=True, null=True)),
+                ('value', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('table', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='tables.table')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('table', 'seq'), name='tablechange_table_seq')],
+            },
+        ),
+    ]
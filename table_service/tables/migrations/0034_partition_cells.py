@@ -0,0 +1,120 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Внешние ключи и индексы ячеек - общие для секционированной и обычной tables_cell
+CELL_INDEXES_SQL = '''
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_table_id_fk_tables_table_id
+        FOREIGN KEY (table_id) REFERENCES tables_table (id) DEFERRABLE INITIALLY DEFERRED;
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_row_id_f0855ad4_fk_tables_row_id
+        FOREIGN KEY (row_id) REFERENCES tables_row (id) DEFERRABLE INITIALLY DEFERRED;
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_column_id_628f4499_fk_tables_column_id
+        FOREIGN KEY (column_id) REFERENCES tables_column (id) DEFERRABLE INITIALLY DEFERRED;
+    CREATE INDEX tables_cell_row_id_f0855ad4 ON tables_cell (row_id);
+    CREATE INDEX tables_cell_column_id_628f4499 ON tables_cell (column_id);
+    CREATE INDEX cell_column_integer ON tables_cell (column_id, integer_value);
+    CREATE INDEX cell_column_float ON tables_cell (column_id, float_value);
+    CREATE INDEX cell_column_boolean ON tables_cell (column_id, boolean_value);
+    CREATE INDEX cell_column_date ON tables_cell (column_id, date_value);
+    CREATE INDEX cell_column_text_prefix ON tables_cell (column_id, (UPPER(LEFT(text_value, 200))) text_pattern_ops);
+'''
+
+CELL_COLUMNS = 'id, table_id, row_id, column_id, text_value, integer_value, float_value, boolean_value, date_value'
+
+# tables_cell пересоздается секционированной по table_id: секция на каждую таблицу и секция по умолчанию.
+# Первичный и уникальный ключи секционированной таблицы обязаны включать table_id
+PARTITION_SQL = '''
+    -- Отложенные проверки внешних ключей после заполнения table_id, иначе DROP TABLE не выполнится
+    SET CONSTRAINTS ALL IMMEDIATE;
+    CREATE TABLE tables_cell_partitioned (
+        id bigint NOT NULL,
+        table_id bigint NOT NULL,
+        row_id bigint NOT NULL,
+        column_id bigint NOT NULL,
+        text_value text NULL,
+        integer_value integer NULL,
+        float_value double precision NULL,
+        boolean_value boolean NULL,
+        date_value date NULL
+    ) PARTITION BY LIST (table_id);
+    CREATE TABLE tables_cell_default PARTITION OF tables_cell_partitioned DEFAULT;
+    DO $$
+    DECLARE
+        partition_table_id bigint;
+    BEGIN
+        FOR partition_table_id IN SELECT id FROM tables_table LOOP
+            EXECUTE format(
+                'CREATE TABLE tables_cell_%%s PARTITION OF tables_cell_partitioned FOR VALUES IN (%%s)',
+                partition_table_id, partition_table_id
+            );
+        END LOOP;
+    END $$;
+    INSERT INTO tables_cell_partitioned (%(columns)s) SELECT %(columns)s FROM tables_cell;
+    DROP TABLE tables_cell;
+    ALTER TABLE tables_cell_partitioned RENAME TO tables_cell;
+
+    CREATE SEQUENCE tables_cell_id_seq OWNED BY tables_cell.id;
+    SELECT setval('tables_cell_id_seq', COALESCE(max(id), 0) + 1, false) FROM tables_cell;
+    ALTER TABLE tables_cell ALTER COLUMN id SET DEFAULT nextval('tables_cell_id_seq');
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_pkey PRIMARY KEY (table_id, id);
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_table_id_row_id_column_id_uniq
+        UNIQUE (table_id, row_id, column_id);
+    %(indexes)s
+''' % {'columns': CELL_COLUMNS, 'indexes': CELL_INDEXES_SQL}
+
+UNPARTITION_SQL = '''
+    ALTER SEQUENCE tables_cell_id_seq OWNED BY NONE;
+    CREATE TABLE tables_cell_plain (LIKE tables_cell INCLUDING DEFAULTS);
+    INSERT INTO tables_cell_plain (%(columns)s) SELECT %(columns)s FROM tables_cell;
+    DROP TABLE tables_cell;
+    ALTER TABLE tables_cell_plain RENAME TO tables_cell;
+    ALTER SEQUENCE tables_cell_id_seq OWNED BY tables_cell.id;
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_pkey PRIMARY KEY (id);
+    ALTER TABLE tables_cell ADD CONSTRAINT tables_cell_row_id_column_id_3d8740f1_uniq UNIQUE (row_id, column_id);
+    %(indexes)s
+''' % {'columns': CELL_COLUMNS, 'indexes': CELL_INDEXES_SQL}
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0033_export_watermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cell',
+            name='table',
+            field=models.ForeignKey(
+                db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                to='tables.table'
+            ),
+        ),
+        migrations.RunSQL(
+            sql='''
+                UPDATE tables_cell c
+                SET table_id = r.table_id
+                FROM tables_row r
+                WHERE r.id = c.row_id
+            ''',
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(sql=PARTITION_SQL, reverse_sql=UNPARTITION_SQL),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='cell',
+                    name='table',
+                    field=models.ForeignKey(
+                        db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                        to='tables.table'
+                    ),
+                ),
+                migrations.AlterUniqueTogether(
+                    name='cell',
+                    unique_together={('table', 'row', 'column')},
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0034_partition_cells'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cell',
+            name='row',
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING, related_name='cells', to='tables.row'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='cell',
+            name='column',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='tables.column'),
+        ),
+    ]
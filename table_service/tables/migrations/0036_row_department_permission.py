@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tables', '0035_cell_delete_by_table'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RowDepartmentPermission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('can_edit', models.BooleanField(default=True)),
+                ('can_delete', models.BooleanField(default=False)),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tables.department')),
+                ('row', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='department_permissions', to='tables.row')),
+            ],
+            options={
+                'unique_together': {('row', 'department')},
+            },
+        ),
+    ]
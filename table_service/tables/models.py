@@ -1,11 +1,15 @@
 import datetime
 
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.functions import Concat
+from django.contrib.postgres.indexes import OpClass
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Left, Upper
 from django.urls import reverse
 from django.utils.crypto import get_random_string
-from django.db.models import IntegerField, FloatField, BooleanField, DateField, F, TextField, Value
+
+from .partitions import create_cell_partition
+from django.db.models import IntegerField, FloatField, BooleanField, DateField, F, TextField
 from datetime import date
 
 
@@ -17,6 +21,7 @@ class Filial(models.Model):
     set_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
     boss = models.CharField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=32, blank=True, default='')  # Хэш записи справочника
 
 
 class Employee(models.Model):
@@ -30,6 +35,12 @@ class Employee(models.Model):
     lastname = models.CharField(max_length=50)
     set_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=32, blank=True, default='')  # Хэш записи справочника
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id_department'], name='employee_department'),
+        ]
 
 
 class Department(models.Model):
@@ -41,6 +52,22 @@ class Department(models.Model):
     short_name = models.CharField(null=True, blank=True)
     set_date = models.DateField(null=True, blank=True)
     end_date = models.DateField(null=True, blank=True)
+    fingerprint = models.CharField(max_length=32, blank=True, default='')  # Хэш записи справочника
+
+
+class DepartmentClosure(models.Model):
+    """Замыкание дерева подразделений: все пары предок - потомок (включая сам узел с depth=0)"""
+    ancestor_id = models.IntegerField()
+    descendant_id = models.IntegerField()
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ancestor_id', 'descendant_id'], name='departmentclosure_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['descendant_id'], name='departmentclosure_descendant'),
+        ]
 
 
 class Profile(models.Model):
@@ -56,16 +83,58 @@ class Profile(models.Model):
     )
 
 
+class FilialMembershipQuerySet(models.QuerySet):
+    def active(self, on_date=None):
+        """Членства, действующие на дату (по умолчанию - сегодня)"""
+        on_date = on_date or date.today()
+        return self.filter(
+            models.Q(set_date__isnull=True) | models.Q(set_date__lte=on_date),
+            models.Q(end_date__isnull=True) | models.Q(end_date__gte=on_date),
+        )
+
+
+class FilialMembership(models.Model):
+    """Принадлежность пользователя филиалу по справочнику сотрудников (ведется в tables/directory.py)"""
+    filial_id = models.IntegerField()
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='filial_memberships')
+    set_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+
+    objects = FilialMembershipQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['filial_id', 'user'], name='filialmembership_unique'),
+        ]
+
+
+class ActiveManager(models.Manager):
+    """Скрывает мягко удаленные записи, которые ждут фоновой очистки (purge_deleted)"""
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Table(models.Model):
     title = models.CharField(max_length=200)
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField()
     share_token = models.CharField(max_length=32, unique=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Версия данных: растет при каждом изменении строк, ячеек, колонок и видимости строк
+    version = models.PositiveBigIntegerField(default=0)
+    # Номер последней записи журнала изменений (TableChange.seq)
+    change_seq = models.PositiveBigIntegerField(default=0)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     def save(self, *args, **kwargs):
         if not self.share_token:
             self.share_token = get_random_string(32)
+        adding = self._state.adding
         super().save(*args, **kwargs)
+        if adding:
+            create_cell_partition(self.pk)
 
     def get_absolute_url(self):
         return reverse('table_detail', kwargs={'pk': self.pk})
@@ -78,7 +147,12 @@ class Table(models.Model):
 
     def is_admin(self, user):
         """Проверяет, является ли пользователь админом таблицы"""
-        return Admin.objects.filter(user=user).exists()
+        # Кэшируем на экземпляре: проверка вызывается для каждой строки при отрисовке
+        if not hasattr(self, '_is_admin_cache'):
+            self._is_admin_cache = {}
+        if user.pk not in self._is_admin_cache:
+            self._is_admin_cache[user.pk] = Admin.objects.filter(user=user).exists()
+        return self._is_admin_cache[user.pk]
 
     def has_add_permission(self, user):
         """Проверяет, может ли пользователь добавлять строки в таблицу"""
@@ -104,12 +178,17 @@ class Table(models.Model):
     @classmethod
     def get_shared_tables(cls, user):
         """Возвращает все таблицы, к которым у пользователя есть доступ"""
-        # Таблицы, где пользователь явно указан в TablePermission
+        # Таблицы, где пользователь явно указан в TablePermission (пара table/user уникальна - без DISTINCT)
         shared_via_permissions = cls.objects.filter(
             permissions__user=user,
-        ).distinct()
+        ).select_related('owner')
         return shared_via_permissions
 
+    @classmethod
+    def bump_version(cls, table_id):
+        """Увеличивает версию данных таблицы - кэши, построенные по старой версии, больше не читаются"""
+        cls.all_objects.filter(pk=table_id).update(version=F('version') + 1)
+
     def __str__(self):
         return self.title
 
@@ -133,23 +212,36 @@ class Column(models.Model):
 
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='columns')
     name = models.CharField(max_length=100)
-    order = models.PositiveIntegerField(default=0)
+    order = models.BigIntegerField(default=0)  # Разреженный ключ порядка (см. ordering.ORDER_STEP)
     data_type = models.CharField(
         max_length=10,
         choices=ColumnType.choices,
         default=ColumnType.TEXT
     )
+    show_aggregates = models.BooleanField(default=False)  # Итоги по колонке в подвале таблицы
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     class Meta:
-        ordering = ['order']
+        ordering = ['order', 'id']
+        indexes = [
+            models.Index(fields=['table', 'order', 'id'], name='column_table_order'),
+        ]
 
     def __str__(self):
         return f"{self.table.title} - {self.name}"
 
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Cell.objects.filter(table_id=self.table_id, column=self).delete()
+            return super().delete(*args, **kwargs)
+
 
 class Row(models.Model):
     table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='rows')
-    order = models.PositiveIntegerField(default=0)
+    order = models.BigIntegerField(default=0)  # Разреженный ключ порядка (см. ordering.ORDER_STEP)
     created_by = models.ForeignKey(
         User,
         on_delete=models.SET_NULL,
@@ -157,9 +249,44 @@ class Row(models.Model):
         blank=True,
         related_name='created_rows'
     )
+    # Создатель и его филиал на момент вставки, обновляются при синхронизации справочников
+    # (directory.refresh_row_creators): сортировка и вывод без join к профилю и справочникам
+    creator_name = models.CharField(max_length=152, blank=True, default='')
+    creator_filial_id = models.IntegerField(null=True, blank=True)
+    filial_name = models.CharField(null=True, blank=True)
 
     class Meta:
-        ordering = ['order']
+        ordering = ['order', 'id']
+        indexes = [
+            models.Index(fields=['table', 'order', 'id'], name='row_table_order'),
+            models.Index(fields=['table', 'creator_name', 'order', 'id'], name='row_table_creator'),
+            models.Index(fields=['table', 'filial_name', 'order', 'id'], name='row_table_filial'),
+        ]
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Cell.objects.filter(table_id=self.table_id, row=self).delete()
+            return super().delete(*args, **kwargs)
+
+    @classmethod
+    def creator_fields(cls, user):
+        """Значения полей создателя строки для пользователя user"""
+        employee = getattr(getattr(user, 'profile', None), 'employee', None)
+        if employee is None:
+            return {'creator_name': '', 'creator_filial_id': None, 'filial_name': None}
+        filial = Filial.objects.filter(id=employee.id_filial).first() if employee.id_filial else None
+        return {
+            'creator_name': f'{employee.secondname} {employee.firstname} {employee.lastname}',
+            'creator_filial_id': employee.id_filial,
+            'filial_name': filial.name if filial else None,
+        }
+
+    def get_user_permission(self, user):
+        """Возвращает RowPermission пользователя на строку (или None)"""
+        # Права, подгруженные через prefetch_for_grid, не требуют запроса на каждую строку
+        if hasattr(self, 'user_permissions'):
+            return next((perm for perm in self.user_permissions if perm.user_id == user.pk), None)
+        return self.permissions.filter(user=user).first()
 
     def has_edit_permission(self, user):
         """Проверяет, может ли пользователь редактировать строку"""
@@ -167,7 +294,8 @@ class Row(models.Model):
             return True
         if self.table.is_admin(user):
             return True
-        return self.permissions.filter(user=user, can_edit=True).exists()
+        permission = self.get_user_permission(user)
+        return permission is not None and permission.can_edit
 
     def has_delete_permission(self, user):
         """Проверяет, может ли пользователь удалять строку"""
@@ -175,7 +303,8 @@ class Row(models.Model):
             return True
         if self.table.is_admin(user):
             return True
-        return self.permissions.filter(user=user, can_delete=True).exists()
+        permission = self.get_user_permission(user)
+        return permission is not None and permission.can_delete
 
     def has_manage_permission(self, user):
         """Проверяет, может ли пользователь управлять правами на строку"""
@@ -192,57 +321,50 @@ class Row(models.Model):
             return table.rows.all()
         if table.is_admin(user):
             return table.rows.all()
-        result = models.Q(permissions__user=user) | models.Q(created_by=user)
+        keys = models.Q(user=user)
 
         user_filial = None
         if hasattr(user, 'profile') and user.profile.employee:
             user_filial = user.profile.employee.id_filial
 
-        # Если у пользователя есть филиал, добавляем условие для коллег из того же филиала
+        # Если у пользователя есть филиал, добавляем строки, созданные коллегами из того же филиала
         if user_filial:
-            colleagues = User.objects.filter(
-                profile__employee__id_filial=user_filial
-            ).values_list('id', flat=True)
-            result |= models.Q(created_by__in=colleagues)
+            keys |= models.Q(filial_id=user_filial)
 
-        return table.rows.filter(result).distinct()
+        visible_ids = RowVisibility.objects.filter(models.Q(table=table) & keys).values('row_id')
+        return table.rows.filter(id__in=visible_ids)
+
+    @classmethod
+    def prefetch_for_grid(cls, queryset, user, table):
+        """Подгружает всё, что нужно для отрисовки строк, фиксированным числом запросов"""
+        return queryset.prefetch_related(
+            models.Prefetch('cells', queryset=Cell.objects.filter(table=table)),
+            'cells__column',
+            models.Prefetch(
+                'permissions',
+                queryset=RowPermission.objects.filter(user=user),
+                to_attr='user_permissions'
+            )
+        )
 
     @property
     def user_values(self):
-        if not hasattr(self, '_user_values_cache'):
-            # Получаем пользователя через создателя строки (если он есть)
-            user = None
-            if self.created_by and hasattr(self.created_by, 'profile') and self.created_by.profile.employee:
-                user = self.created_by.profile.employee
-
-            self._user_values_cache = {
-                'id': user.id if user else None,
-                'firstname': user.firstname if user else '',
-                'secondname': user.secondname if user else '',
-                'lastname': user.lastname if user else '',
-                'full_name': f'{user.secondname} {user.firstname} {user.lastname}' if user else ''
-            }
-        return self._user_values_cache
+        return {'full_name': self.creator_name}
 
     @property
     def filial_values(self):
-        if not hasattr(self, '_filial_values_cache'):
-            # Получаем филиал через создателя строки (если он есть)
-            filial = None
-            if self.created_by and hasattr(self.created_by, 'profile') and self.created_by.profile.employee:
-                filial_id = self.created_by.profile.employee.id_filial
-                filial = Filial.objects.get(id=filial_id)
-
-            self._filial_values_cache = {
-                'id': filial.id if filial else None,
-                'name': filial.name if filial else '',
-            }
-        return self._filial_values_cache
+        return {
+            'id': self.creator_filial_id if self.filial_name is not None else None,
+            'name': self.filial_name or '',
+        }
 
     @property
     def cell_values(self):
         if not hasattr(self, '_cell_values_cache'):
-            cells = self.cells.select_related('column').all()
+            if 'cells' in getattr(self, '_prefetched_objects_cache', {}):
+                cells = self.cells.all()
+            else:
+                cells = self.cells.filter(table_id=self.table_id).select_related('column')
             self._cell_values_cache = {
                 cell.column_id: cell.value
                 for cell in cells
@@ -250,11 +372,12 @@ class Row(models.Model):
         return self._cell_values_cache
 
     @classmethod
-    def annotate_for_sorting(cls, queryset, column_id, data_type):
+    def annotate_for_sorting(cls, queryset, table_id, column_id, data_type):
         """Добавляет аннотации для сортировки по типу данных"""
         # Создаем подзапрос для каждого типа данных
         if data_type == Column.ColumnType.INTEGER:
             subquery = Cell.objects.filter(
+                table_id=table_id,
                 row=models.OuterRef('pk'),
                 column_id=column_id
             ).values('integer_value')[:1]
@@ -263,6 +386,7 @@ class Row(models.Model):
             )
         elif data_type == Column.ColumnType.FLOAT:
             subquery = Cell.objects.filter(
+                table_id=table_id,
                 row=models.OuterRef('pk'),
                 column_id=column_id
             ).values('float_value')[:1]
@@ -271,6 +395,7 @@ class Row(models.Model):
             )
         elif data_type == Column.ColumnType.BOOLEAN:
             subquery = Cell.objects.filter(
+                table_id=table_id,
                 row=models.OuterRef('pk'),
                 column_id=column_id
             ).values('boolean_value')[:1]
@@ -279,6 +404,7 @@ class Row(models.Model):
             )
         elif data_type == Column.ColumnType.DATE:
             subquery = Cell.objects.filter(
+                table_id=table_id,
                 row=models.OuterRef('pk'),
                 column_id=column_id
             ).values('date_value')[:1]
@@ -286,18 +412,8 @@ class Row(models.Model):
                 **{f'sort_value_{column_id}': models.Subquery(subquery, output_field=DateField())}
             )
         else:  # TEXT
-            queryset = queryset.annotate(
-                user_full_name=Concat(
-                    F('created_by__profile__employee__secondname'),
-                    Value(' '),
-                    F('created_by__profile__employee__firstname'),
-                    Value(' '),
-                    F('created_by__profile__employee__lastname'),
-                    output_field=TextField()
-                )
-            )
-
             subquery = Cell.objects.filter(
+                table_id=table_id,
                 row=models.OuterRef('pk'),
                 column_id=column_id
             ).values('text_value')[:1]
@@ -306,9 +422,18 @@ class Row(models.Model):
             )
 
 
+# Префикс текста ячейки в индексе: длинные значения целиком не помещаются в btree
+TEXT_PREFIX_LENGTH = 200
+
+
 class Cell(models.Model):
-    row = models.ForeignKey(Row, on_delete=models.CASCADE, related_name='cells')
-    column = models.ForeignKey(Column, on_delete=models.CASCADE)
+    # Ключ секционирования tables_cell (см. partitions): в БД первичный ключ - (table_id, id),
+    # поэтому запросы ячеек одной таблицы должны фильтровать по table.
+    # Каскад ORM удалял бы ячейки по row_id/column_id без table_id, то есть во всех секциях:
+    # их удаляют Row.delete, Column.delete и purge
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='+', db_index=False)
+    row = models.ForeignKey(Row, on_delete=models.DO_NOTHING, related_name='cells')
+    column = models.ForeignKey(Column, on_delete=models.DO_NOTHING)
     # Поля для разных типов данных
     text_value = models.TextField(blank=True, null=True)
     integer_value = models.IntegerField(blank=True, null=True)
@@ -316,8 +441,10 @@ class Cell(models.Model):
     boolean_value = models.BooleanField(blank=True, null=True)
     date_value = models.DateField(blank=True, null=True)
 
-    class Meta:
-        unique_together = ('row', 'column')
+    def save(self, *args, **kwargs):
+        if self.table_id is None:
+            self.table_id = self.row.table_id
+        super().save(*args, **kwargs)
 
     @staticmethod
     def get_default_value(data_type):
@@ -360,7 +487,19 @@ class Cell(models.Model):
             self.text_value = str(val) if val is not None else ''
 
     class Meta:
-        unique_together = ('row', 'column')
+        unique_together = ('table', 'row', 'column')
+        # Фильтры по колонкам (search.filter_rows) сравнивают типизированное поле одной колонки
+        indexes = [
+            models.Index(fields=['column', 'integer_value'], name='cell_column_integer'),
+            models.Index(fields=['column', 'float_value'], name='cell_column_float'),
+            models.Index(fields=['column', 'boolean_value'], name='cell_column_boolean'),
+            models.Index(fields=['column', 'date_value'], name='cell_column_date'),
+            models.Index(
+                F('column'),
+                OpClass(Upper(Left('text_value', TEXT_PREFIX_LENGTH)), name='text_pattern_ops'),
+                name='cell_column_text_prefix',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.row} - {self.column}: {self.value}"
@@ -384,6 +523,16 @@ class TableFilialPermission(models.Model):
         unique_together = ('table', 'filial')
 
 
+class TableDepartmentPermission(models.Model):
+    """Право просмотра таблицы для подразделения вместе со всеми вложенными подразделениями"""
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='department_permissions')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    can_view = models.BooleanField(default=True)
+
+    class Meta:
+        unique_together = ('table', 'department')
+
+
 class RowPermission(models.Model):
     row = models.ForeignKey(Row, on_delete=models.CASCADE, related_name='permissions')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -404,6 +553,54 @@ class RowFilialPermission(models.Model):
         unique_together = ('row', 'filial')
 
 
+class RowDepartmentPermission(models.Model):
+    """Права на строку для подразделения вместе со всеми вложенными подразделениями"""
+    row = models.ForeignKey(Row, on_delete=models.CASCADE, related_name='department_permissions')
+    department = models.ForeignKey(Department, on_delete=models.CASCADE)
+    can_edit = models.BooleanField(default=True)
+    can_delete = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('row', 'department')
+
+
+class RowVisibility(models.Model):
+    """Индекс видимости строк: пользователь или филиал, которому видна строка.
+
+    Запись по пользователю есть у создателя строки и у всех, кому выданы RowPermission,
+    запись по филиалу - у филиала создателя строки. Ведётся в tables/visibility.py.
+    """
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='+')
+    row = models.ForeignKey(Row, on_delete=models.CASCADE, related_name='visibility')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    filial_id = models.IntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['table', 'user', 'row'], name='rowvisibility_table_user'),
+            models.Index(fields=['table', 'filial_id', 'row'], name='rowvisibility_table_filial'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['row', 'user'],
+                condition=models.Q(user__isnull=False),
+                name='rowvisibility_unique_user'
+            ),
+            models.UniqueConstraint(
+                fields=['row', 'filial_id'],
+                condition=models.Q(filial_id__isnull=False),
+                name='rowvisibility_unique_filial'
+            ),
+            models.CheckConstraint(
+                condition=(
+                    models.Q(user__isnull=False, filial_id__isnull=True) |
+                    models.Q(user__isnull=True, filial_id__isnull=False)
+                ),
+                name='rowvisibility_user_xor_filial'
+            ),
+        ]
+
+
 class RowLock(models.Model):
     row = models.OneToOneField(
         Row,
@@ -426,3 +623,101 @@ class TableFilialLock(models.Model):
 
     class Meta:
         unique_together = ('table', 'filial')
+
+
+class SavedView(models.Model):
+    """Сохраненное представление таблицы: поиск, сортировка и видимые колонки пользователя"""
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='saved_views')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='saved_views')
+    name = models.CharField(max_length=100)
+    search_query = models.CharField(max_length=255, blank=True, default='')
+    sort = models.CharField(max_length=50, blank=True, default='')  # Как параметр sort сетки: col_<id>, -user
+    filters = models.JSONField(default=dict, blank=True)  # Параметры фильтров по колонкам: {'col_<id>__gte': '10'}
+    columns = models.JSONField(default=list, blank=True)  # id видимых колонок; пусто - все
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['name']
+        unique_together = ('table', 'user', 'name')
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def grid_params(self):
+        """Параметры запроса сетки, которые сохранены в представлении"""
+        return {'q': self.search_query, 'sort': self.sort, **self.filters}
+
+
+class TableChange(models.Model):
+    """Журнал изменений данных таблицы (только добавление): seq растет внутри таблицы без пропусков"""
+    class Kind(models.TextChoices):
+        ROW_INSERT = 'row_insert', 'Добавлена строка'  # value - {id колонки: значение}
+        ROW_DELETE = 'row_delete', 'Удалена строка'
+        CELL_UPDATE = 'cell_update', 'Изменена ячейка'
+        COLUMN_DELETE = 'column_delete', 'Удалена колонка'
+        COLUMN_CONVERT = 'column_convert', 'Изменен тип колонки'  # value - новый тип; значения читаются заново
+
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='changes')
+    seq = models.PositiveBigIntegerField()
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    row_id = models.BigIntegerField(null=True, blank=True)  # Без внешнего ключа: строка могла быть удалена
+    column_id = models.BigIntegerField(null=True, blank=True)
+    value = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['table', 'seq'], name='tablechange_table_seq'),
+        ]
+
+
+class ExportWatermark(models.Model):
+    """Номер журнала изменений (TableChange.seq), до которого пользователь уже выгрузил таблицу"""
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, related_name='export_watermarks')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_watermarks')
+    seq = models.PositiveBigIntegerField(default=0)
+    exported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('table', 'user')
+
+
+class BackgroundJob(models.Model):
+    """Фоновая задача: выполняется командой run_background_jobs вне HTTP-запроса"""
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'В очереди'
+        RUNNING = 'running', 'Выполняется'
+        DONE = 'done', 'Завершена'
+        FAILED = 'failed', 'Ошибка'
+
+    kind = models.CharField(max_length=50)
+    table = models.ForeignKey(Table, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    params = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
+    processed = models.PositiveIntegerField(default=0)  # Обработано записей
+    failed = models.PositiveIntegerField(default=0)  # Записей с ошибками
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='backgroundjob_status'),
+        ]
+
+    @property
+    def is_active(self):
+        return self.status in (self.Status.PENDING, self.Status.RUNNING)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+
+class ColumnConversionFailure(models.Model):
+    """Значение ячейки, которое не удалось привести к новому типу колонки"""
+    job = models.ForeignKey(BackgroundJob, on_delete=models.CASCADE, related_name='conversion_failures')
+    row = models.ForeignKey(Row, on_delete=models.CASCADE, related_name='+')
+    value = models.TextField()
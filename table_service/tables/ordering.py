@@ -0,0 +1,169 @@
+from django.db import connection, transaction
+from django.db.models import Q, F
+
+from .jobs import register_job, enqueue_job, save_checkpoint
+from .models import Table, Row, Column, BackgroundJob
+
+# Шаг между соседними значениями order: строку или колонку можно вставить между соседями
+# около 16 раз подряд в одно место, прежде чем понадобится перебалансировка
+ORDER_STEP = 65536
+
+# Сколько соседей после места вставки можно раздвинуть, когда между соседями не осталось места
+ORDER_WINDOW = 64
+
+REBALANCE_ORDER = 'rebalance_order'
+
+ORDERED_MODELS = {
+    'row': Row,
+    'column': Column,
+}
+
+# Пакет перебалансировки: самые последние еще не обработанные записи (order <= floor) встают
+# сразу под уже обработанными с шагом ORDER_STEP. Порядок записей не меняется ни в какой момент
+REBALANCE_BATCH_SQL = '''
+    WITH bound AS (
+        SELECT COALESCE(MIN("order") - %%(step)s, %%(top)s) AS top
+        FROM %(db_table)s
+        WHERE table_id = %%(table_id)s AND "order" > %%(floor)s
+    ), batch AS (
+        SELECT id, row_number() OVER (ORDER BY "order" DESC, id DESC) AS rn
+        FROM %(db_table)s
+        WHERE table_id = %%(table_id)s AND "order" <= %%(floor)s
+        ORDER BY "order" DESC, id DESC
+        LIMIT %%(batch_size)s
+    ), updated AS (
+        UPDATE %(db_table)s t SET "order" = bound.top - (batch.rn - 1) * %%(step)s
+        FROM batch, bound
+        WHERE t.id = batch.id AND bound.top - (batch.rn - 1) * %%(step)s > %%(floor)s
+        RETURNING 1
+    )
+    SELECT count(*) FROM updated
+'''
+
+
+def lock_table_order(table_id):
+    """Блокирует порядок строк и колонок таблицы до конца транзакции.
+
+    FOR NO KEY UPDATE не мешает вставкам, ссылающимся на таблицу, но упорядочивает
+    параллельные добавления в конец, перемещения и пакеты перебалансировки.
+    """
+    Table.objects.select_for_update(no_key=True).filter(pk=table_id).values_list('pk').first()
+
+
+def next_order(table, siblings):
+    """order для добавления в конец: одно чтение по индексу (table, order) вместо count()"""
+    lock_table_order(table.pk)
+    last = siblings.order_by('-order').values_list('order', flat=True).first()
+    return ORDER_STEP if last is None else last + ORDER_STEP
+
+
+def request_rebalance(model_name, table_id):
+    """Ставит перебалансировку order в очередь, если она еще не запланирована"""
+    queued = BackgroundJob.objects.filter(
+        kind=REBALANCE_ORDER,
+        table_id=table_id,
+        params__model=model_name,
+        status__in=[BackgroundJob.Status.PENDING, BackgroundJob.Status.RUNNING],
+    )
+    if not queued.exists():
+        enqueue_job(REBALANCE_ORDER, table=Table(pk=table_id), model=model_name, batch_size=5000)
+
+
+def spread_window(item, before, low, siblings):
+    """Ставит item перед before, раздвигая ближайших соседей после места вставки.
+
+    Берется самое короткое окно before и следующих за ним записей (не больше ORDER_WINDOW), в котором
+    item и окно помещаются между low и первой не вошедшей в окно записью, и окно расставляется равномерно.
+    Хвост сдвигается целиком, только если окно забито подряд идущими значениями order.
+    """
+    window = list(siblings.filter(
+        Q(order__gt=before.order) | Q(order=before.order, id__gte=before.id)
+    ).order_by('order', 'id').only('order')[:ORDER_WINDOW + 1])
+    for count in range(1, len(window) + 1):
+        if count < len(window):
+            high = window[count].order
+        elif len(window) <= ORDER_WINDOW:
+            # Окно дошло до конца списка: после него места сколько угодно
+            high = window[-1].order + ORDER_STEP
+        else:
+            break
+        if high - low >= count + 2:
+            step = (high - low) // (count + 2)
+            item.order = low + step
+            for position, neighbour in enumerate(window[:count], 2):
+                neighbour.order = low + step * position
+            type(item).objects.bulk_update(window[:count], ['order'])
+            return
+
+    siblings.filter(
+        Q(order__gt=before.order) | Q(order=before.order, id__gte=before.id)
+    ).update(order=F('order') + ORDER_STEP)
+    item.order = before.order + ORDER_STEP // 2
+
+
+def move_item(item, siblings, before=None, after=None):
+    """Перемещает строку или колонку перед before (или после after, или в конец).
+
+    Меняется только order самого item: он становится серединой между соседями.
+    Если места между соседями не осталось, раздвигаются несколько ближайших соседей (spread_window)
+    и ставится в очередь перебалансировка всей таблицы.
+    """
+    model_name = item._meta.model_name
+    with transaction.atomic():
+        lock_table_order(item.table_id)
+        siblings = siblings.exclude(pk=item.pk)
+
+        if after is not None:
+            before = siblings.filter(
+                Q(order__gt=after.order) | Q(order=after.order, id__gt=after.id)
+            ).order_by('order', 'id').first()
+
+        if before is None:
+            last = siblings.order_by('-order').values_list('order', flat=True).first()
+            item.order = ORDER_STEP if last is None else last + ORDER_STEP
+        else:
+            before.refresh_from_db(fields=['order'])
+            previous = siblings.filter(
+                Q(order__lt=before.order) | Q(order=before.order, id__lt=before.id)
+            ).order_by('-order', '-id').values_list('order', flat=True).first()
+            low = before.order - ORDER_STEP if previous is None else previous
+
+            if before.order - low >= 2:
+                item.order = (low + before.order) // 2
+            else:
+                spread_window(item, before, low, siblings)
+                request_rebalance(model_name, item.table_id)
+
+        item.save(update_fields=['order'])
+    return item
+
+
+@register_job(REBALANCE_ORDER)
+def rebalance_order(job):
+    """Перенумеровывает order строк или колонок таблицы с шагом ORDER_STEP короткими пакетами"""
+    params = job.params
+    model = ORDERED_MODELS[params['model']]
+    items = model.objects.filter(table_id=job.table_id)
+
+    sql = REBALANCE_BATCH_SQL % {'db_table': connection.ops.quote_name(model._meta.db_table)}
+    with connection.cursor() as cursor:
+        while True:
+            with transaction.atomic():
+                lock_table_order(job.table_id)
+                if 'floor' not in params:
+                    # Граница и первый пакет - в одной транзакции: добавленные позже записи окажутся выше top
+                    floor = items.order_by('-order').values_list('order', flat=True).first()
+                    if floor is None:
+                        return
+                    save_checkpoint(job, floor=floor, top=floor + (items.count() + 1) * ORDER_STEP)
+                cursor.execute(sql, {
+                    'table_id': job.table_id,
+                    'floor': params['floor'],
+                    'top': params['top'],
+                    'step': ORDER_STEP,
+                    'batch_size': params['batch_size'],
+                })
+                moved, = cursor.fetchone()
+                if not moved:
+                    return
+                save_checkpoint(job, moved)
@@ -0,0 +1,50 @@
+"""Секции ячеек.
+
+tables_cell секционирована списком по table_id (миграция 0034_partition_cells): у каждой таблицы своя секция
+tables_cell_<id>, ячейки таблиц без своей секции попадают в секцию по умолчанию. Запросы с условием
+table_id = <число> читают только секцию таблицы, а удаление таблицы удаляет секцию целиком.
+"""
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+DEFAULT_PARTITION = 'tables_cell_default'
+
+
+def partition_name(table_id):
+    return f'tables_cell_{int(table_id)}'
+
+
+def create_cell_partition(table_id):
+    """Создает секцию ячеек таблицы.
+
+    Секция создается отдельно и присоединяется через ATTACH: он берет на tables_cell только
+    SHARE UPDATE EXCLUSIVE и не мешает чтению и записи ячеек других таблиц.
+    """
+    name = partition_name(table_id)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'CREATE TABLE {name} (LIKE tables_cell INCLUDING DEFAULTS)')
+        cursor.execute(f'ALTER TABLE tables_cell ATTACH PARTITION {name} FOR VALUES IN ({int(table_id)})')
+
+
+def drop_cell_partition(table_id):
+    """Отсоединяет и удаляет секцию ячеек таблицы - все её ячейки без DELETE.
+
+    DETACH ждет блокировку tables_cell не дольше CELL_PARTITION_LOCK_TIMEOUT_MS, чтобы не задерживать
+    запросы к другим таблицам. Возвращает False, если секции нет или блокировку получить не удалось:
+    тогда ячейки нужно удалить обычным DELETE.
+    """
+    name = partition_name(table_id)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+        if not cursor.fetchone()[0]:
+            return False
+        # ALTER TABLE не выполняется, пока в транзакции есть отложенные проверки внешних ключей
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute('SET LOCAL lock_timeout = %s', [settings.CELL_PARTITION_LOCK_TIMEOUT_MS])
+        try:
+            with transaction.atomic():
+                cursor.execute(f'ALTER TABLE tables_cell DETACH PARTITION {name}')
+                cursor.execute(f'DROP TABLE {name}')
+        except OperationalError:
+            return False
+    return True
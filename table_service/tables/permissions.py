@@ -0,0 +1,96 @@
+from django.db import connection
+
+# Действующие пользователи филиала
+FILIAL_MEMBERS_SQL = '''
+    SELECT m.user_id
+    FROM tables_filialmembership m
+    WHERE m.filial_id = %s
+        AND (m.set_date IS NULL OR m.set_date <= CURRENT_DATE)
+        AND (m.end_date IS NULL OR m.end_date >= CURRENT_DATE)
+'''
+
+# Действующие пользователи подразделения и всех вложенных в него (через замыкание дерева)
+DEPARTMENT_SUBTREE_MEMBERS_SQL = '''
+    SELECT p.user_id
+    FROM tables_departmentclosure c
+    JOIN tables_employee e ON e.id_department = c.descendant_id
+    JOIN tables_profile p ON p.employee_id = e.id
+    WHERE c.ancestor_id = %s
+        AND (e.end_date IS NULL OR e.end_date >= CURRENT_DATE)
+'''
+
+
+def propagate_table_filial_permission(table, filial_id, can_view, overwrite=True):
+    """Выдает право просмотра таблицы всем пользователям филиала одним INSERT ... SELECT.
+
+    При overwrite=False существующие права пользователей не меняются.
+    Возвращает id пользователей, чьи права были созданы или изменены.
+    """
+    on_conflict = 'UPDATE SET can_view = EXCLUDED.can_view' if overwrite else 'NOTHING'
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO tables_tablepermission (table_id, user_id, can_view)
+            SELECT %s, members.user_id, %s
+            FROM ({FILIAL_MEMBERS_SQL}) members
+            ON CONFLICT (table_id, user_id) DO {on_conflict}
+            RETURNING user_id
+        ''', [table.pk, can_view, filial_id])
+        return [user_id for user_id, in cursor.fetchall()]
+
+
+def propagate_table_department_permission(table, department_id, can_view, overwrite=True):
+    """Выдает право просмотра таблицы всем пользователям поддерева подразделения одним INSERT ... SELECT.
+
+    При overwrite=False существующие права пользователей не меняются.
+    Возвращает id пользователей, чьи права были созданы или изменены.
+    """
+    on_conflict = 'UPDATE SET can_view = EXCLUDED.can_view' if overwrite else 'NOTHING'
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO tables_tablepermission (table_id, user_id, can_view)
+            SELECT %s, members.user_id, %s
+            FROM ({DEPARTMENT_SUBTREE_MEMBERS_SQL}) members
+            ON CONFLICT (table_id, user_id) DO {on_conflict}
+            RETURNING user_id
+        ''', [table.pk, can_view, department_id])
+        return [user_id for user_id, in cursor.fetchall()]
+
+
+def propagate_row_filial_permission(row, filial_id, can_edit, can_delete, overwrite=True):
+    """Выдает права на строку всем пользователям филиала одним INSERT ... SELECT.
+
+    При overwrite=False существующие права пользователей не меняются.
+    Возвращает id пользователей, чьи права были созданы или изменены.
+    """
+    on_conflict = (
+        'UPDATE SET can_edit = EXCLUDED.can_edit, can_delete = EXCLUDED.can_delete' if overwrite else 'NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO tables_rowpermission (row_id, user_id, can_edit, can_delete)
+            SELECT %s, members.user_id, %s, %s
+            FROM ({FILIAL_MEMBERS_SQL}) members
+            ON CONFLICT (row_id, user_id) DO {on_conflict}
+            RETURNING user_id
+        ''', [row.pk, can_edit, can_delete, filial_id])
+        return [user_id for user_id, in cursor.fetchall()]
+
+
+def propagate_row_department_permission(row, department_id, can_edit, can_delete, overwrite=True):
+    """Выдает права на строку всем пользователям поддерева подразделения одним INSERT ... SELECT.
+
+    При overwrite=False существующие права пользователей не меняются.
+    Возвращает id пользователей, чьи права были созданы или изменены.
+    """
+    on_conflict = (
+        'UPDATE SET can_edit = EXCLUDED.can_edit, can_delete = EXCLUDED.can_delete' if overwrite else 'NOTHING'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            INSERT INTO tables_rowpermission (row_id, user_id, can_edit, can_delete)
+            SELECT %s, members.user_id, %s, %s
+            FROM ({DEPARTMENT_SUBTREE_MEMBERS_SQL}) members
+            ON CONFLICT (row_id, user_id) DO {on_conflict}
+            RETURNING user_id
+        ''', [row.pk, can_edit, can_delete, department_id])
+        return [user_id for user_id, in cursor.fetchall()]
@@ -0,0 +1,93 @@
+import datetime
+
+from django.db import connection, models, transaction
+
+from .changes import column_deleted
+from .jobs import register_job, enqueue_job, save_checkpoint
+from .models import Table, Column, Row, Cell, TableChange, ExportWatermark, SavedView
+from .partitions import drop_cell_partition
+
+PURGE_DELETED = 'purge_deleted'
+
+PURGED_MODELS = {
+    'table': Table,
+    'column': Column,
+}
+
+# Прочие данные таблицы, которые удаляются пакетами: журнал изменений растет с каждым изменением ячейки
+TABLE_DATA_MODELS = (TableChange, ExportWatermark, SavedView)
+
+
+def get_cascade_relations(model):
+    """Таблицы, ссылающиеся на model с каскадным удалением: (имя таблицы, колонка внешнего ключа)"""
+    return [
+        (relation.related_model._meta.db_table, relation.field.column)
+        for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created and not relation.concrete and relation.on_delete is models.CASCADE
+    ]
+
+
+def delete_chunk(cursor, db_table, filters, children, batch_size):
+    """Удаляет пакет записей db_table (и ссылающиеся на них записи children) одним коротким запросом.
+
+    filters - условия {колонка: значение}; они повторяются и в DELETE, чтобы запрос к секционированной
+    таблице читал только нужные секции. Возвращает число удаленных записей db_table.
+    """
+    where = ' AND '.join(f'{column} = %s' for column in filters)
+    cursor.execute(
+        f'SELECT id FROM {db_table} WHERE {where} ORDER BY id LIMIT %s',
+        [*filters.values(), batch_size]
+    )
+    ids = [item_id for item_id, in cursor.fetchall()]
+    if ids:
+        for child_table, child_column in children:
+            cursor.execute(f'DELETE FROM {child_table} WHERE {child_column} = ANY(%s)', [ids])
+        cursor.execute(f'DELETE FROM {db_table} WHERE {where} AND id = ANY(%s)', [*filters.values(), ids])
+    return len(ids)
+
+
+def delete_in_chunks(job, db_table, filters, children=()):
+    """Удаляет записи db_table пакетами, каждый пакет в своей транзакции"""
+    with connection.cursor() as cursor:
+        while True:
+            with transaction.atomic():
+                deleted = delete_chunk(cursor, db_table, filters, children, job.params['batch_size'])
+                if not deleted:
+                    break
+                save_checkpoint(job, deleted)
+
+
+def soft_delete(item, user=None):
+    """Скрывает таблицу или колонку сразу, а данные удаляет фоновая задача"""
+    with transaction.atomic():
+        item.deleted_at = datetime.datetime.now()
+        item.save(update_fields=['deleted_at'])
+        if isinstance(item, Column):
+            column_deleted(item)
+    Table.bump_version(item.pk if isinstance(item, Table) else item.table_id)
+    # Задача не ссылается на таблицу внешним ключом: иначе удалилась бы вместе с ней
+    return enqueue_job(PURGE_DELETED, user=user, model=item._meta.model_name, id=item.pk, batch_size=2000)
+
+
+@register_job(PURGE_DELETED)
+def purge_deleted(job):
+    """Пакетно удаляет данные мягко удаленной таблицы (строки с ячейками и правами, журнал изменений) или колонки (ячейки)"""
+    params = job.params
+    item = PURGED_MODELS[params['model']].all_objects.filter(pk=params['id'], deleted_at__isnull=False).first()
+    if item is None:
+        return
+
+    cells = Cell._meta.db_table
+    if isinstance(item, Table):
+        # Ячейки таблицы удаляются вместе с её секцией; без секции - пакетами
+        if not drop_cell_partition(item.pk):
+            delete_in_chunks(job, cells, {'table_id': item.pk})
+        children = [relation for relation in get_cascade_relations(Row) if relation[0] != cells]
+        delete_in_chunks(job, Row._meta.db_table, {'table_id': item.pk}, children)
+        for model in TABLE_DATA_MODELS:
+            delete_in_chunks(job, model._meta.db_table, {'table_id': item.pk}, get_cascade_relations(model))
+    else:
+        delete_in_chunks(job, cells, {'table_id': item.table_id, 'column_id': item.pk})
+
+    # Оставшиеся записи (колонки, права на таблицу) немногочисленны - их удаляет ORM
+    item.delete()
@@ -0,0 +1,82 @@
+"""Чтение с реплики БД.
+
+Реплика подключается псевдонимом REPLICA в DATABASES (settings: DB_REPLICA_HOST). На неё уходят только
+чтения моделей приложения tables внутри use_replica() - его включает ReplicaMiddleware для представлений
+из REPLICA_READ_VIEWS. Записи, пользователи и сессии всегда на основной БД.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+REPLICA = 'replica'
+
+LAG_CACHE_KEY = 'replica:lag'
+
+# Отставание реплики: время с последней примененной транзакции, 0 - если реплика догнала основную БД
+# (или это не реплика, например локальный второй экземпляр без репликации)
+LAG_SQL = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+_read_db = ContextVar('read_db', default=DEFAULT_DB_ALIAS)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+@contextmanager
+def use_replica():
+    """Чтения моделей tables внутри блока идут на реплику"""
+    token = _read_db.set(REPLICA)
+    try:
+        yield
+    finally:
+        _read_db.reset(token)
+
+
+def replica_lag():
+    """Отставание реплики в секундах, None - реплика недоступна. Проверяется не чаще раза в REPLICA_LAG_TTL секунд"""
+    lag = cache.get(LAG_CACHE_KEY)
+    if lag is None:
+        try:
+            with connections[REPLICA].cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = float(cursor.fetchone()[0])
+        except DatabaseError:
+            lag = -1
+        cache.set(LAG_CACHE_KEY, lag, settings.REPLICA_LAG_TTL)
+    return None if lag < 0 else lag
+
+
+def replica_available():
+    """Реплика настроена, отвечает и отстает не больше чем на REPLICA_MAX_LAG_SECONDS"""
+    if not replica_configured():
+        return False
+    lag = replica_lag()
+    return lag is not None and lag <= settings.REPLICA_MAX_LAG_SECONDS
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'tables':
+            return _read_db.get()
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Без явного ответа Django пишет в БД, из которой прочитан объект, то есть на реплику
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика содержит те же данные, что и основная БД
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -0,0 +1,168 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .conversion import CELL_FIELDS
+from .metrics import record_cache
+from .models import Column, Row
+
+REPORT_KEY = 'report:{table_id}:{version}:{scope}:{params_hash}'
+
+# Агрегатная функция показателя: SQL-шаблон
+REPORT_FUNCTION_SQL = {
+    'sum': 'SUM({})',
+    'avg': 'ROUND(AVG({})::numeric, 2)',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+    'count': 'COUNT({})',
+}
+
+REPORT_FUNCTIONS = {
+    'sum': 'Сумма',
+    'avg': 'Среднее',
+    'min': 'Минимум',
+    'max': 'Максимум',
+    'count': 'Количество',
+}
+
+DATE_PERIODS = {
+    'month': 'по месяцам',
+    'year': 'по годам',
+}
+
+GROUPED_TYPES = (Column.ColumnType.TEXT, Column.ColumnType.BOOLEAN, Column.ColumnType.DATE)
+MEASURE_TYPES = (Column.ColumnType.INTEGER, Column.ColumnType.FLOAT)
+
+# Строки таблицы (создатель и филиал хранятся в строке); группировки и показатели добавляют свои join к ячейкам
+REPORT_SQL = '''
+    SELECT %(dimensions)s, COUNT(*) AS row_count%(measures)s
+    FROM tables_row r
+    %(joins)s
+    WHERE r.table_id = %%s%(visibility)s
+    GROUP BY %(group_by)s
+    ORDER BY %(group_by)s
+'''
+
+
+def get_dimensions(columns):
+    """Доступные группировки отчета: {ключ: название}"""
+    dimensions = {'filial': 'Филиал', 'creator': 'Пользователь'}
+    for column in columns:
+        if column.data_type in GROUPED_TYPES:
+            dimensions[f'col_{column.id}'] = column.name
+        if column.data_type == Column.ColumnType.DATE:
+            for period, label in DATE_PERIODS.items():
+                dimensions[f'col_{column.id}:{period}'] = f'{column.name} ({label})'
+    return dimensions
+
+
+def get_measures(columns):
+    """Колонки, по которым считаются показатели"""
+    return [column for column in columns if column.data_type in MEASURE_TYPES]
+
+
+def cell_join(alias, column, joins, params):
+    """Добавляет join ячейки колонки и возвращает выражение её типизированного значения"""
+    joins.append(
+        f'LEFT JOIN tables_cell {alias} ON {alias}.table_id = %s AND {alias}.row_id = r.id AND {alias}.column_id = %s'
+    )
+    params.extend([column.table_id, column.id])
+    return f'{alias}.{CELL_FIELDS[column.data_type]}'
+
+
+def dimension_sql(key, columns_by_id, alias, joins, params):
+    """SQL-выражение группировки по ключу из get_dimensions"""
+    if key == 'filial':
+        return 'r.filial_name'
+    if key == 'creator':
+        return 'r.creator_name'
+    column_key, _, period = key.partition(':')
+    value = cell_join(alias, columns_by_id[int(column_key[len('col_'):])], joins, params)
+    if period:
+        return f"date_trunc('{period}', {value})::date"
+    return value
+
+
+def build_report(table, user, group_by, pivot_by=None, function='sum', measure_ids=None):
+    """Сводный отчет по таблице одним GROUP BY.
+
+    Возвращает {'headers': [...], 'rows': [[...], ...]}; при pivot_by значения второй
+    группировки разворачиваются в колонки.
+    """
+    columns = list(table.columns.all())
+    columns_by_id = {column.id: column for column in columns}
+    measures = [
+        column for column in get_measures(columns)
+        if measure_ids is None or column.id in measure_ids
+    ]
+
+    joins, params = [], []
+    dimensions = [dimension_sql(group_by, columns_by_id, 'g1', joins, params)]
+    if pivot_by:
+        dimensions.append(dimension_sql(pivot_by, columns_by_id, 'g2', joins, params))
+    measure_sql = ''.join(
+        f', {REPORT_FUNCTION_SQL[function].format(cell_join(f"m{index}", column, joins, params))} AS m{index}'
+        for index, column in enumerate(measures)
+    )
+    params.append(table.pk)
+
+    visibility = ''
+    if not (table.owner == user or table.is_admin(user)):
+        visible_sql, visible_params = Row.get_visible_rows(user, table).values('id').query.sql_with_params()
+        visibility = f' AND r.id IN ({visible_sql})'
+        params.extend(visible_params)
+
+    sql = REPORT_SQL % {
+        'dimensions': ', '.join(f'{dimension} AS d{index}' for index, dimension in enumerate(dimensions)),
+        'measures': measure_sql,
+        'joins': '\n    '.join(joins),
+        'visibility': visibility,
+        'group_by': ', '.join(str(index + 1) for index in range(len(dimensions))),
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        result = cursor.fetchall()
+
+    values_headers = ['Строк'] + [f'{column.name}: {REPORT_FUNCTIONS[function]}' for column in measures]
+    group_dimensions = get_dimensions(columns)
+    if not pivot_by:
+        return {
+            'headers': [group_dimensions[group_by]] + values_headers,
+            'rows': [list(row) for row in result],
+        }
+
+    # Разворот второй группировки в колонки
+    pivot_values = sorted({row[1] for row in result}, key=lambda value: (value is None, str(value)))
+    cells = {}
+    for row in result:
+        cells.setdefault(row[0], {})[row[1]] = row[2:]
+    empty = [None] * len(values_headers)
+    return {
+        'headers': [group_dimensions[group_by]] + [
+            f'{"—" if value is None else value} · {header}' for value in pivot_values for header in values_headers
+        ],
+        'rows': [
+            [group] + [item for value in pivot_values for item in cells[group].get(value, empty)]
+            for group in cells
+        ],
+    }
+
+
+def get_report(table, user, **params):
+    """Отчет из кэша; ключ включает версию таблицы, поэтому изменение данных сразу дает новый отчет"""
+    scope = 'all' if table.owner == user or table.is_admin(user) else f'user{user.pk}'
+    key = REPORT_KEY.format(
+        table_id=table.pk,
+        version=table.version,
+        scope=scope,
+        params_hash=hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode('utf-8')).hexdigest(),
+    )
+    report = cache.get(key)
+    record_cache('report', report is not None)
+    if report is None:
+        report = build_report(table, user, **params)
+        cache.set(key, report, settings.REPORT_CACHE_TTL)
+    return report
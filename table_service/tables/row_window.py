@@ -0,0 +1,51 @@
+from .conversion import CELL_FIELDS
+from .grid import GridQuery
+from .models import Cell, RowPermission
+
+# Биты прав пользователя на строку в окне строк
+ROW_EDIT = 1
+ROW_DELETE = 2
+ROW_MANAGE = 4
+
+
+def get_row_window(table_obj, user, rows, params, offset, limit):
+    """Окно строк сетки в колоночном виде - для виртуальной прокрутки в браузере.
+
+    rows - видимые пользователю строки; поиск, фильтры и сортировка берутся из params, как в сетке.
+    Значения ячеек - массивы по колонкам в порядке column_ids, права - битовые маски ROW_*.
+    Окно читается фиксированным числом запросов без построения объектов строк и ячеек;
+    общее число строк считается только для первого окна.
+    """
+    plan = GridQuery(table_obj, params)
+    rows = plan.apply(rows).order_by(*plan.ordering)
+    columns = list(plan.columns.values())
+
+    window = list(rows.values_list('id', 'creator_name', 'filial_name')[offset:offset + limit])
+    row_ids = [row_id for row_id, _, _ in window]
+    positions = {row_id: position for position, row_id in enumerate(row_ids)}
+
+    cells = {column.id: [None] * len(row_ids) for column in columns}
+    fields = {column.id: CELL_FIELDS[column.data_type] for column in columns}
+    for cell in Cell.objects.filter(table=table_obj, row_id__in=row_ids).values('row_id', 'column_id', *set(fields.values())):
+        if cell['column_id'] in cells:
+            cells[cell['column_id']][positions[cell['row_id']]] = cell[fields[cell['column_id']]]
+
+    if table_obj.owner_id == user.pk or table_obj.is_admin(user):
+        permissions = [ROW_EDIT | ROW_DELETE | ROW_MANAGE] * len(row_ids)
+    else:
+        permissions = [0] * len(row_ids)
+        for row_id, can_edit, can_delete in RowPermission.objects.filter(
+            row_id__in=row_ids, user=user
+        ).values_list('row_id', 'can_edit', 'can_delete'):
+            permissions[positions[row_id]] = (ROW_EDIT if can_edit else 0) | (ROW_DELETE if can_delete else 0)
+
+    return {
+        'offset': offset,
+        'total': rows.count() if offset == 0 else None,
+        'column_ids': [column.id for column in columns],
+        'ids': row_ids,
+        'creators': [creator_name for _, creator_name, _ in window],
+        'filials': [filial_name or '' for _, _, filial_name in window],
+        'cells': [cells[column.id] for column in columns],
+        'permissions': permissions,
+    }
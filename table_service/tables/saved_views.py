@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django_tables2.data import TableListData
+
+from .grid import GridQuery
+from .metrics import record_cache
+from .models import Row
+
+SAVED_VIEW_KEY = 'saved_view:{view_id}:{version}:{params_hash}'
+
+
+def get_saved_view_row_ids(saved_view, rows):
+    """id строк представления в его порядке.
+
+    Кэшируются по версии таблицы и параметрам представления: поиск, фильтры и сортировка выполняются
+    только после изменения данных или пересохранения представления.
+    """
+    table = saved_view.table
+    key = SAVED_VIEW_KEY.format(
+        view_id=saved_view.pk,
+        version=table.version,
+        params_hash=hashlib.md5(json.dumps(saved_view.grid_params, sort_keys=True).encode('utf-8')).hexdigest(),
+    )
+    row_ids = cache.get(key)
+    record_cache('saved_view', row_ids is not None)
+    if row_ids is None:
+        plan = GridQuery(table, saved_view.grid_params)
+        row_ids = list(plan.apply(rows).order_by(*plan.ordering).values_list('id', flat=True))
+        cache.set(key, row_ids, settings.SAVED_VIEW_CACHE_TTL)
+    return row_ids
+
+
+class SavedViewData(TableListData):
+    """Строки сохраненного представления для django-tables2: страница читается одним запросом по id"""
+
+    def __init__(self, saved_view, rows, user):
+        super().__init__(get_saved_view_row_ids(saved_view, rows))
+        self.table_obj = saved_view.table
+        self.user = user
+
+    @property
+    def queryset(self):
+        """Все строки представления - для итогов по колонкам"""
+        return self.table_obj.rows.filter(id__in=self.data)
+
+    def fetch(self, row_ids):
+        rows = Row.prefetch_for_grid(self.table_obj.rows.filter(id__in=row_ids), self.user, self.table_obj)
+        rows_by_id = {row.id: row for row in rows}
+        return [rows_by_id[row_id] for row_id in row_ids if row_id in rows_by_id]
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.fetch(self.data[key])
+        return self.fetch([self.data[key]])[0]
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def order_by(self, aliases):
+        # Порядок задан представлением и уже учтен в списке id
+        pass
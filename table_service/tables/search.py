@@ -0,0 +1,236 @@
+import datetime
+import hashlib
+import re
+
+from django import forms
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import FilteredRelation, Q, Value
+from django.db.models.functions import Left, Upper
+
+from .conversion import CELL_FIELDS
+from .metrics import record_cache
+from .models import Column, Row, Cell, Filial, TEXT_PREFIX_LENGTH
+
+SEARCH_KEY = 'search:{table_id}:{version}:{scope}:{query_hash}'
+
+# Фильтр по колонке задается параметром col_<id>__<операция>
+FILTER_PARAM = re.compile(r'^col_(\d+)__(\w+)$')
+
+FILTER_OPERATIONS = {
+    'eq': 'равно',
+    'gte': 'от',
+    'lte': 'до',
+    'prefix': 'начинается с',
+    'empty': 'пусто',
+}
+
+COLUMN_FILTER_OPERATIONS = {
+    Column.ColumnType.TEXT: ('eq', 'prefix', 'empty'),
+    Column.ColumnType.INTEGER: ('eq', 'gte', 'lte', 'empty'),
+    Column.ColumnType.FLOAT: ('eq', 'gte', 'lte', 'empty'),
+    Column.ColumnType.DATE: ('eq', 'gte', 'lte', 'empty'),
+    Column.ColumnType.BOOLEAN: ('eq', 'empty'),
+}
+
+# Разбор значения фильтра в тип колонки
+FILTER_VALUE_FIELDS = {
+    Column.ColumnType.TEXT: forms.CharField(),
+    Column.ColumnType.INTEGER: forms.IntegerField(),
+    Column.ColumnType.FLOAT: forms.FloatField(),
+    Column.ColumnType.DATE: forms.DateField(input_formats=['%Y-%m-%d', '%d.%m.%Y']),
+    Column.ColumnType.BOOLEAN: forms.NullBooleanField(),
+}
+
+FILTER_INPUTS = {
+    Column.ColumnType.TEXT: 'text',
+    Column.ColumnType.INTEGER: 'number',
+    Column.ColumnType.FLOAT: 'number',
+    Column.ColumnType.DATE: 'date',
+    Column.ColumnType.BOOLEAN: 'select',
+}
+
+
+def filter_params(params):
+    """Непустые параметры фильтров по колонкам"""
+    return {name: value for name, value in params.items() if FILTER_PARAM.match(name) and value != ''}
+
+
+def parse_column_filters(params, columns):
+    """Фильтры по колонкам из параметров запроса: [(колонка, операция, значение)].
+
+    Параметры с неизвестной колонкой, операцией или неподходящим значением пропускаются.
+    """
+    columns_by_id = {column.id: column for column in columns}
+    column_filters = []
+    for name, raw_value in filter_params(params).items():
+        column_id, operation = FILTER_PARAM.match(name).groups()
+        column = columns_by_id.get(int(column_id))
+        if column is None or operation not in COLUMN_FILTER_OPERATIONS[column.data_type]:
+            continue
+        field = FILTER_VALUE_FIELDS[Column.ColumnType.BOOLEAN if operation == 'empty' else column.data_type]
+        try:
+            value = field.clean(raw_value)
+        except ValidationError:
+            continue
+        if value is not None:
+            column_filters.append((column, operation, value))
+    return column_filters
+
+
+def column_filter_cells(column, operation, value):
+    """Ячейки колонки, подходящие под фильтр: условие на типизированное поле по индексу (column, поле)"""
+    cells = Cell.objects.filter(table_id=column.table_id).filter(column_id=column.id)
+    field = CELL_FIELDS[column.data_type]
+    if operation == 'empty':
+        cells = cells.filter(**{f'{field}__isnull': False})
+        return cells.exclude(text_value='') if column.data_type == Column.ColumnType.TEXT else cells
+    if column.data_type == Column.ColumnType.TEXT:
+        # Условие на выражение индекса cell_column_text_prefix, точная проверка - по самому значению.
+        # Регистр приводится в базе: правила UPPER зависят от её локали
+        cells = cells.alias(text_prefix=Upper(Left('text_value', TEXT_PREFIX_LENGTH))).filter(
+            text_prefix__startswith=Upper(Value(value[:TEXT_PREFIX_LENGTH]))
+        )
+        if operation == 'eq':
+            return cells.filter(text_value__iexact=value)
+        return cells.filter(text_value__istartswith=value) if len(value) > TEXT_PREFIX_LENGTH else cells
+    return cells.filter(**{f'{field}__{operation if operation != "eq" else "exact"}': value})
+
+
+def filter_rows(queryset, column_filters):
+    """Строки, подходящие под все фильтры по колонкам (AND)"""
+    for column, operation, value in column_filters:
+        row_ids = column_filter_cells(column, operation, value).values('row_id')
+        if operation == 'empty' and value:
+            queryset = queryset.exclude(pk__in=row_ids)
+        else:
+            queryset = queryset.filter(pk__in=row_ids)
+    return queryset
+
+
+def get_filter_fields(columns, params):
+    """Поля формы фильтров по колонкам с текущими значениями из params"""
+    return [
+        {
+            'column': column,
+            'operations': [
+                {
+                    'name': f'col_{column.id}__{operation}',
+                    'label': FILTER_OPERATIONS[operation],
+                    'input': 'select' if operation == 'empty' else FILTER_INPUTS[column.data_type],
+                    'step': 'any' if column.data_type == Column.ColumnType.FLOAT else '1',
+                    'value': params.get(f'col_{column.id}__{operation}', ''),
+                }
+                for operation in COLUMN_FILTER_OPERATIONS[column.data_type]
+            ],
+        }
+        for column in columns
+    ]
+
+
+def search_conditions(table_obj, search_query):
+    """Условия поиска: (вхождение подстроки, точное совпадение значения).
+
+    Подстрока ищется в тексте ячеек, ФИО создателя и названии его филиала; точные совпадения -
+    число, логическое значение или дата в ячейках колонок подходящего типа.
+    """
+    text_conditions = Q()
+    typed_conditions = Q()
+    for column in table_obj.columns.all():
+        text_conditions |= Q(table_cells__column=column, table_cells__text_value__icontains=search_query)
+        if column.data_type == Column.ColumnType.INTEGER:
+            try:
+                int_value = int(search_query)
+                typed_conditions |= Q(table_cells__column=column, table_cells__integer_value=int_value)
+            except ValueError:
+                pass
+        elif column.data_type == Column.ColumnType.FLOAT:
+            try:
+                float_value = float(search_query)
+                typed_conditions |= Q(table_cells__column=column,
+                                      table_cells__float_value__gte=float_value - 0.1,
+                                      table_cells__float_value__lte=float_value + 0.1)
+            except ValueError:
+                pass
+        elif column.data_type == Column.ColumnType.BOOLEAN:
+            # Поиск по булевым значениям (true/false, да/нет и т.д.)
+            bool_value = None
+            if search_query.lower() in ['true', 'да', 'yes', '1', 'истина']:
+                bool_value = True
+            elif search_query.lower() in ['false', 'нет', 'no', '0', 'ложь']:
+                bool_value = False
+
+            if bool_value is not None:
+                typed_conditions |= Q(table_cells__column=column, table_cells__boolean_value=bool_value)
+        elif column.data_type == Column.ColumnType.DATE:
+            # Пробуем разные форматы дат
+            date_formats = ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%m/%d/%Y']
+            parsed_date = None
+            for fmt in date_formats:
+                try:
+                    parsed_date = datetime.datetime.strptime(search_query, fmt).date()
+                    break
+                except ValueError:
+                    continue
+
+            if parsed_date:
+                typed_conditions |= Q(table_cells__column=column, table_cells__date_value=parsed_date)
+
+    filter_filial_ids = Filial.objects.filter(
+        Q(name__icontains=search_query) |
+        Q(long_name__icontains=search_query) |
+        Q(short_name__icontains=search_query)
+    ).values_list('id', flat=True)
+
+    text_conditions |= (
+        Q(creator_name__icontains=search_query) |
+        Q(creator_filial_id__in=filter_filial_ids)
+    )
+    return text_conditions, typed_conditions
+
+
+def search_rows(queryset, table_obj, search_query, candidates=None):
+    """Строки, в ячейках, создателе или филиале которых встречается search_query.
+
+    candidates - id строк, найденных по началу запроса: подстрока может встретиться только среди них,
+    а точные совпадения значений проверяются по всем строкам.
+    """
+    text_conditions, typed_conditions = search_conditions(table_obj, search_query)
+    if candidates is not None:
+        text_conditions &= Q(pk__in=candidates)
+    # Условие на table_id в самом join: план читает только секцию ячеек таблицы
+    queryset = queryset.alias(table_cells=FilteredRelation('cells', condition=Q(cells__table=table_obj)))
+    return queryset.filter(text_conditions | typed_conditions).distinct()
+
+
+def search_key(table, scope, search_query):
+    return SEARCH_KEY.format(
+        table_id=table.pk,
+        version=table.version,
+        scope=scope,
+        query_hash=hashlib.md5(search_query.encode('utf-8')).hexdigest(),
+    )
+
+
+def get_search_row_ids(table, user, search_query):
+    """id найденных строк (в порядке таблицы) из кэша по версии таблицы.
+
+    Пока пользователь печатает, результат для начала запроса уже в кэше:
+    новый запрос ищет подстроку только среди его строк.
+    """
+    scope = 'all' if table.owner == user or table.is_admin(user) else f'user{user.pk}'
+    key = search_key(table, scope, search_query)
+    row_ids = cache.get(key)
+    record_cache('search', row_ids is not None)
+    if row_ids is None:
+        prefixes = {
+            search_key(table, scope, search_query[:length]): length
+            for length in range(1, len(search_query))
+        }
+        cached = cache.get_many(prefixes)
+        candidates = cached[max(cached, key=prefixes.get)] if cached else None
+        rows = search_rows(Row.get_visible_rows(user, table), table, search_query, candidates)
+        row_ids = list(rows.values_list('id', flat=True))
+        cache.set(key, row_ids, settings.SEARCH_CACHE_TTL)
+    return row_ids
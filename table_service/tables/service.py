@@ -1,6 +1,8 @@
 import datetime
 
+from django.conf import settings
 from django.db import transaction
+from .metrics import ROW_LOCK_EXPIRED
 from .models import RowLock
 
 
@@ -14,7 +16,14 @@ def lock_row(row, user):
                       'locked_at': datetime.datetime.now()}
         )
         if not created and lock.user != user:
-            return False, lock.user  # Уже заблокировано другим пользователем
+            lock_timeout = datetime.timedelta(minutes=settings.ROW_LOCK_TIMEOUT_MINUTES)
+            if lock.locked_at >= datetime.datetime.now() - lock_timeout:
+                return False, lock.user  # Уже заблокировано другим пользователем
+            # Блокировка устарела - перехватываем её
+            lock.user = user
+            lock.locked_at = datetime.datetime.now()
+            lock.save()
+            ROW_LOCK_EXPIRED.inc()
         return True, None
 
 
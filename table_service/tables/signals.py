@@ -0,0 +1,32 @@
+"""Обновление производных данных справочников при изменении отдельных профилей и сотрудников.
+
+Синхронизация справочников (sync_directory) пересчитывает их массово; здесь - привязка профиля к
+сотруднику и правки одной записи, чтобы новый пользователь сразу попадал в filial_members().
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .directory import refresh_filial_memberships, refresh_row_creators
+from .models import Employee, Profile
+
+
+def refresh_user_directory(user_id):
+    """Членство в филиале и создатель строк одного пользователя"""
+    refresh_filial_memberships([user_id])
+    refresh_row_creators([user_id])
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    refresh_user_directory(instance.user_id)
+
+
+@receiver(post_save, sender=Employee)
+def employee_changed(sender, instance, created, **kwargs):
+    if created:
+        # Новый сотрудник еще не привязан к профилю
+        return
+    user_id = Profile.objects.filter(employee=instance).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        refresh_user_directory(user_id)
@@ -0,0 +1 @@
+SELECT "tables_row"."id", "tables_row"."table_id", "tables_row"."order", "tables_row"."created_by_id", "tables_row"."creator_name", "tables_row"."creator_filial_id", "tables_row"."filial_name" FROM "tables_row" WHERE "tables_row"."table_id" = N ORDER BY "tables_row"."order" ASC, "tables_row"."id" ASC
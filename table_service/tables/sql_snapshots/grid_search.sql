@@ -0,0 +1 @@
+SELECT DISTINCT "tables_row"."id", "tables_row"."table_id", "tables_row"."order", "tables_row"."created_by_id", "tables_row"."creator_name", "tables_row"."creator_filial_id", "tables_row"."filial_name" FROM "tables_row" LEFT OUTER JOIN "tables_cell" table_cells ON ("tables_row"."id" = table_cells."row_id" AND (table_cells."table_id" = N)) WHERE ("tables_row"."table_id" = N AND ((table_cells."column_id" = N AND UPPER(table_cells."text_value"::text) LIKE UPPER(%N%)) OR (table_cells."column_id" = N AND UPPER(table_cells."text_value"::text) LIKE UPPER(%N%)) OR (table_cells."column_id" = N AND UPPER(table_cells."text_value"::text) LIKE UPPER(%N%)) OR (table_cells."column_id" = N AND UPPER(table_cells."text_value"::text) LIKE UPPER(%N%)) OR (table_cells."column_id" = N AND UPPER(table_cells."text_value"::text) LIKE UPPER(%N%)) OR UPPER("tables_row"."creator_name"::text) LIKE UPPER(%N%) OR "tables_row"."creator_filial_id" IN (SELECT U0."id" AS "id" FROM "tables_filial" U0 WHERE (UPPER(U0."name"::text) LIKE UPPER(%N%) OR UPPER(U0."long_name"::text) LIKE UPPER(%N%) OR UPPER(U0."short_name"::text) LIKE UPPER(%N%))) OR (table_cells."column_id" = N AND table_cells."integer_value" = N) OR (table_cells."column_id" = N AND table_cells."float_value" >= N.N AND table_cells."float_value" <= N.N) OR (table_cells."boolean_value" AND table_cells."column_id" = N))) ORDER BY "tables_row"."order" ASC, "tables_row"."id" ASC
@@ -0,0 +1 @@
+SELECT "tables_row"."id", "tables_row"."table_id", "tables_row"."order", "tables_row"."created_by_id", "tables_row"."creator_name", "tables_row"."creator_filial_id", "tables_row"."filial_name", (SELECT U0."text_value" AS "text_value" FROM "tables_cell" U0 WHERE (U0."column_id" = N AND U0."row_id" = ("tables_row"."id") AND U0."table_id" = N) LIMIT N) AS "sort_value_N" FROM "tables_row" WHERE "tables_row"."table_id" = N ORDER BY "tables_row"."order" ASC, "tables_row"."id" ASC
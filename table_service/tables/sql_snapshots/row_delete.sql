@@ -0,0 +1 @@
+DELETE FROM "tables_cell" WHERE ("tables_cell"."row_id" = N AND "tables_cell"."table_id" = N) DELETE FROM "tables_rowpermission" WHERE "tables_rowpermission"."row_id" IN (N) DELETE FROM "tables_rowfilialpermission" WHERE "tables_rowfilialpermission"."row_id" IN (N) DELETE FROM "tables_rowdepartmentpermission" WHERE "tables_rowdepartmentpermission"."row_id" IN (N) DELETE FROM "tables_rowvisibility" WHERE "tables_rowvisibility"."row_id" IN (N) DELETE FROM "tables_rowlock" WHERE "tables_rowlock"."row_id" IN (N) DELETE FROM "tables_columnconversionfailure" WHERE "tables_columnconversionfailure"."row_id" IN (N) DELETE FROM "tables_row" WHERE "tables_row"."id" IN (N)
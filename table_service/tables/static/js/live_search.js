@@ -0,0 +1,38 @@
+// Поиск по мере ввода: сервер возвращает только id найденных строк, строки текущей страницы
+// скрываются без перезагрузки. Enter по-прежнему ищет по всей таблице с перерисовкой
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('input[data-live-search]').forEach(input => {
+        const counter = document.createElement('span');
+        counter.className = 'input-group-text d-none';
+        input.after(counter);
+        let timer = null;
+
+        function showRows(rowIds) {
+            document.querySelectorAll('tbody tr[data-row-id]').forEach(row => {
+                row.classList.toggle('d-none', rowIds !== null && !rowIds.has(Number(row.dataset.rowId)));
+            });
+        }
+
+        input.addEventListener('input', function() {
+            clearTimeout(timer);
+            timer = setTimeout(() => {
+                const query = input.value.trim();
+                if (!query) {
+                    showRows(null);
+                    counter.classList.add('d-none');
+                    return;
+                }
+                fetch(`${input.dataset.liveSearch}?q=${encodeURIComponent(query)}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        if (data.status !== 'success' || input.value.trim() !== query) {
+                            return;
+                        }
+                        showRows(new Set(data.row_ids));
+                        counter.textContent = `Найдено: ${data.count}`;
+                        counter.classList.remove('d-none');
+                    });
+            }, 300);
+        });
+    });
+});
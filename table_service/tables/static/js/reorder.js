@@ -0,0 +1,64 @@
+// Перетаскивание строк и колонок таблицы. Доступно только в порядке по умолчанию: при сортировке,
+// поиске, фильтрах или в сохраненном представлении положение строки на странице не совпадает с её order
+document.addEventListener('DOMContentLoaded', function() {
+    const grid = document.getElementById('reorder-grid');
+    const params = new URLSearchParams(window.location.search);
+    const filtered = Array.from(params.keys()).some(name => name.startsWith('col_'));
+    if (!grid || params.get('sort') || params.get('q') || params.get('view') || filtered) {
+        return;
+    }
+    const tableId = grid.dataset.tableId;
+
+    function move(url, target, before) {
+        const body = new FormData();
+        body.append(before ? 'before' : 'after', target);
+        return fetch(url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': getCookie('csrftoken')},
+            body: body
+        }).then(response => response.json()).then(data => {
+            if (data.status !== 'success') {
+                alert(data.message || 'Не удалось изменить порядок');
+            }
+            window.location.reload();
+        });
+    }
+
+    function makeSortable(items, idAttr, urlFor) {
+        let dragged = null;
+        items.forEach(item => {
+            item.draggable = true;
+            item.addEventListener('dragstart', function(e) {
+                dragged = item;
+                e.dataTransfer.effectAllowed = 'move';
+            });
+            item.addEventListener('dragover', function(e) {
+                if (dragged && dragged !== item && dragged.parentNode === item.parentNode) {
+                    e.preventDefault();
+                }
+            });
+            item.addEventListener('drop', function(e) {
+                e.preventDefault();
+                if (!dragged || dragged === item) {
+                    return;
+                }
+                // Тащим вперед - встаем перед целью, назад - после неё
+                const siblings = Array.from(item.parentNode.children);
+                const before = siblings.indexOf(dragged) > siblings.indexOf(item);
+                move(urlFor(dragged.getAttribute(idAttr)), item.getAttribute(idAttr), before);
+                dragged = null;
+            });
+        });
+    }
+
+    makeSortable(
+        grid.querySelectorAll('tbody tr[data-row-id]'),
+        'data-row-id',
+        rowId => `/${tableId}/move_row/${rowId}/`
+    );
+    makeSortable(
+        grid.querySelectorAll('thead th[data-column-id]'),
+        'data-column-id',
+        columnId => `/${tableId}/move_column/${columnId}/`
+    );
+});
@@ -0,0 +1,189 @@
+// Виртуальная прокрутка сетки (?grid=virtual): строки подгружаются окнами из api/tables/<id>/rows/
+// в колоночном JSON, в DOM находятся только видимые строки
+document.addEventListener('DOMContentLoaded', function() {
+    const grid = document.getElementById('virtual-grid');
+    if (!grid) {
+        return;
+    }
+    const ROW_HEIGHT = 36;
+    const WINDOW = 200;
+    const OVERSCAN = 10;
+    const ROW_EDIT = 1, ROW_DELETE = 2, ROW_MANAGE = 4;
+
+    const body = grid.querySelector('.virtual-grid-body');
+    const rowsContainer = grid.querySelector('.virtual-grid-rows');
+    const status = grid.querySelector('.virtual-grid-status');
+    const csrfToken = grid.querySelector('input[name="csrfmiddlewaretoken"]').value;
+    const headers = Array.from(grid.querySelectorAll('.virtual-grid-header [data-sort]'));
+    const columns = headers.filter(header => header.dataset.columnId).map(header => ({
+        id: Number(header.dataset.columnId),
+        type: header.dataset.type,
+    }));
+
+    // Поиск, фильтры и сортировка - те же параметры, что у постраничной сетки
+    const params = new URLSearchParams(window.location.search);
+    params.delete('grid');
+    params.delete('page');
+
+    const loaded = new Map();  // номер окна -> ответ сервера
+    const pending = new Map();  // номер окна -> запрос
+    let total = null;
+    let frame = null;
+
+    grid.style.setProperty('--virtual-grid-columns', `repeat(${headers.length}, minmax(120px, 1fr)) 125px`);
+
+    function rowUrl(url, rowId) {
+        // В шаблоне URL построен для строки 0
+        return url.replace(/\/0\/(?!.*\/0\/)/, `/${rowId}/`);
+    }
+
+    function loadWindow(index) {
+        if (!pending.has(index)) {
+            const query = new URLSearchParams(params);
+            query.set('offset', index * WINDOW);
+            query.set('limit', WINDOW);
+            pending.set(index, fetch(`${grid.dataset.rowsUrl}?${query}`)
+                .then(response => response.json())
+                .then(data => {
+                    if (data.status !== 'success') {
+                        throw new Error(data.message);
+                    }
+                    if (data.total !== null) {
+                        total = data.total;
+                        rowsContainer.style.height = `${total * ROW_HEIGHT}px`;
+                        status.textContent = `Строк: ${total}`;
+                    }
+                    data.cellsByColumn = new Map(data.column_ids.map((id, i) => [id, data.cells[i]]));
+                    loaded.set(index, data);
+                    scheduleRender();
+                })
+                .catch(error => {
+                    console.error('Error:', error);
+                    status.textContent = 'Не удалось загрузить строки';
+                }));
+        }
+        return pending.get(index);
+    }
+
+    function formatValue(value, type) {
+        if (value === null || value === undefined || value === '') {
+            return '—';
+        }
+        if (type === 'boolean') {
+            return value ? '✔' : '✘';
+        }
+        if (type === 'date') {
+            return value.split('-').reverse().join('.');
+        }
+        return String(value);
+    }
+
+    function textCell(text) {
+        const div = document.createElement('div');
+        div.textContent = text;
+        return div;
+    }
+
+    function actionsCell(rowId, mask) {
+        const div = document.createElement('div');
+        if (mask & ROW_EDIT) {
+            const edit = document.createElement('a');
+            edit.className = 'btn btn-sm btn-outline-primary edit-row-btn';
+            edit.title = 'Редактировать строку';
+            edit.dataset.rowId = rowId;
+            edit.dataset.tableId = grid.dataset.tableId;
+            edit.innerHTML = '<i class="bi bi-pen"></i>';
+            div.appendChild(edit);
+        }
+        if (mask & ROW_DELETE) {
+            const form = document.createElement('form');
+            form.method = 'post';
+            form.action = rowUrl(grid.dataset.deleteUrl, rowId);
+            form.style.display = 'inline';
+            form.innerHTML = '<input type="hidden" name="csrfmiddlewaretoken">' +
+                '<button type="submit" class="btn btn-sm btn-danger"><i class="bi bi-x-lg"></i></button>';
+            form.firstChild.value = csrfToken;
+            form.addEventListener('submit', e => {
+                if (!confirm('Удалить строку?')) {
+                    e.preventDefault();
+                }
+            });
+            div.appendChild(form);
+        }
+        if (mask & ROW_MANAGE) {
+            const manage = document.createElement('a');
+            manage.className = 'btn btn-sm btn-outline-secondary';
+            manage.title = 'Настроить разрешения';
+            manage.href = rowUrl(grid.dataset.permissionsUrl, rowId);
+            manage.innerHTML = '<i class="bi bi-people-fill"></i>';
+            div.appendChild(manage);
+        }
+        return div;
+    }
+
+    function renderRow(data, i, position) {
+        const row = document.createElement('div');
+        row.className = 'virtual-grid-row';
+        row.style.top = `${position * ROW_HEIGHT}px`;
+        row.dataset.rowId = data.ids[i];
+        row.appendChild(textCell(data.filials[i] || '—'));
+        row.appendChild(textCell(data.creators[i] || '—'));
+        columns.forEach(column => {
+            const values = data.cellsByColumn.get(column.id);
+            row.appendChild(textCell(formatValue(values ? values[i] : null, column.type)));
+        });
+        row.appendChild(actionsCell(data.ids[i], data.permissions[i]));
+        return row;
+    }
+
+    function render() {
+        frame = null;
+        if (total === null) {
+            return;
+        }
+        const first = Math.max(Math.floor(body.scrollTop / ROW_HEIGHT) - OVERSCAN, 0);
+        const last = Math.min(Math.ceil((body.scrollTop + body.clientHeight) / ROW_HEIGHT) + OVERSCAN, total);
+        const fragment = document.createDocumentFragment();
+        for (let position = first; position < last; position++) {
+            const index = Math.floor(position / WINDOW);
+            const data = loaded.get(index);
+            if (!data) {
+                loadWindow(index);
+            } else if (position - data.offset < data.ids.length) {
+                fragment.appendChild(renderRow(data, position - data.offset, position));
+            }
+        }
+        rowsContainer.replaceChildren(fragment);
+    }
+
+    function scheduleRender() {
+        if (frame === null) {
+            frame = requestAnimationFrame(render);
+        }
+    }
+
+    // Сортировка по заголовку: по возрастанию, по убыванию, без сортировки
+    const sort = params.get('sort') || '';
+    headers.forEach(header => {
+        const key = header.dataset.sort;
+        if (sort === key || sort === `-${key}`) {
+            header.insertAdjacentHTML('afterbegin', sort === key ? '<i class="bi bi-sort-up"></i> ' : '<i class="bi bi-sort-down"></i> ');
+        }
+        header.addEventListener('click', function() {
+            const query = new URLSearchParams(params);
+            if (sort === key) {
+                query.set('sort', `-${key}`);
+            } else if (sort === `-${key}`) {
+                query.delete('sort');
+            } else {
+                query.set('sort', key);
+            }
+            query.set('grid', 'virtual');
+            window.location.search = query.toString();
+        });
+    });
+
+    body.addEventListener('scroll', scheduleRender);
+    window.addEventListener('resize', scheduleRender);
+    loadWindow(0);
+});
@@ -1,8 +1,37 @@
+from functools import cached_property, partial
+
 import django_tables2 as tables
 from django.template.backends.utils import csrf_input
 from django.urls import reverse
-from django.utils.html import format_html
+from django.utils.formats import localize
+from django.utils.html import format_html, format_html_join
+from .aggregates import AGGREGATE_FUNCTIONS, get_column_aggregates
 from .models import Row, Column
+from .saved_views import SavedViewData
+
+
+AGGREGATE_LABELS = {
+    'count': 'Кол-во',
+    'sum': 'Сумма',
+    'avg': 'Среднее',
+    'min': 'Мин.',
+    'max': 'Макс.',
+}
+
+
+def render_aggregates(column_id, table):
+    """Подвал колонки с итогами"""
+    values = table.aggregates.get(column_id, {})
+    return format_html(
+        '<div class="small text-muted">{}</div>',
+        format_html_join(
+            '<br>', '{}: {}',
+            (
+                (AGGREGATE_LABELS[name], localize(round(value, 2) if isinstance(value, float) else value))
+                for name, value in values.items() if value is not None
+            )
+        )
+    )
 
 
 class ExportTable(tables.Table):
@@ -18,11 +47,16 @@ class ExportTable(tables.Table):
         }
         fields = ()  # Будем заполнять динамически
 
-    def __init__(self, *args, table_obj=None, request=None, **kwargs):
+    def __init__(self, *args, table_obj=None, request=None, incremental=False, **kwargs):
         self.base_columns.clear()
         self.table_obj = table_obj
         self.request = request
         if table_obj:
+            if incremental:
+                # Инкрементальная выгрузка (export.IncrementalExport): по id строки обновляют у себя
+                self.base_columns['id'] = tables.Column(verbose_name='id', orderable=False)
+                self.base_columns['export_change'] = tables.Column(verbose_name='Изменение', orderable=False)
+
             self.base_columns['filial'] = tables.Column(
                 verbose_name='Филиал',
                 accessor=f'filial_values.name',
@@ -101,9 +135,12 @@ class DynamicTable(tables.Table):
                 'class': 'table-light'
             }
         }
+        row_attrs = {
+            'data-row-id': lambda record: record.pk  # Для перетаскивания строк
+        }
         fields = ()  # Будем заполнять динамически
 
-    def __init__(self, *args, table_obj=None, request=None, **kwargs):
+    def __init__(self, *args, table_obj=None, request=None, visible_columns=None, **kwargs):
         self.base_columns.clear()
         self.table_obj = table_obj
         self.request = request
@@ -123,10 +160,15 @@ class DynamicTable(tables.Table):
                 attrs={
                     'td': {'class': 'text-center'}
                 },
-                order_by='user_full_name'
+                order_by='creator_name'
             )
 
-            for column in table_obj.columns.all():
+            # visible_columns - id колонок сохраненного представления
+            self.grid_columns = [
+                column for column in table_obj.columns.all()
+                if not visible_columns or column.id in visible_columns
+            ]
+            for column in self.grid_columns:
                 self._add_column(column)
 
             self.base_columns['actions'] = tables.Column(
@@ -147,7 +189,7 @@ class DynamicTable(tables.Table):
         column_kwargs = {
             'verbose_name': self.get_column_header(column),
             'accessor': accessor,
-            'attrs': {'td': {'class': 'text-center'}},
+            'attrs': {'td': {'class': 'text-center'}, 'th': {'data-column-id': column.id}},
             'order_by': f'sort_value_{column.id}'
         }
 
@@ -158,9 +200,20 @@ class DynamicTable(tables.Table):
             # Для INTEGER FLOAT и TEXT используем обычный Column
         }
 
+        if column.show_aggregates and column.data_type in AGGREGATE_FUNCTIONS:
+            # Функция модуля, а не метод: колонки копируются (deepcopy) вместе с footer
+            column_kwargs['footer'] = partial(render_aggregates, column.id)
+
         column_class = column_types.get(column.data_type, tables.Column)
         self.base_columns[col_name] = column_class(**column_kwargs)
 
+    @cached_property
+    def aggregates(self):
+        """Итоги по колонкам для всех отфильтрованных строк (не только текущей страницы)"""
+        rows = self.data.queryset if isinstance(self.data, SavedViewData) else self.data.data
+        return get_column_aggregates(self.table_obj, self.grid_columns, rows)
+
+
     def render_delete(self, record):
         if (self.table_obj.owner == self.request.user) or (record.has_delete_permission(self.request.user)):
             delete_url = reverse('delete_row',
@@ -224,19 +277,43 @@ class DynamicTable(tables.Table):
                                  kwargs={'table_pk': self.table_obj.pk,
                                          'column_pk': column.id
                                          })
+            convert_url = reverse('convert_column',
+                                  kwargs={'table_pk': self.table_obj.pk,
+                                          'column_pk': column.id
+                                          })
+            aggregates_button = format_html('')
+            if column.data_type in AGGREGATE_FUNCTIONS:
+                aggregates_url = reverse('toggle_column_aggregates',
+                                         kwargs={'table_pk': self.table_obj.pk,
+                                                 'column_pk': column.id
+                                                 })
+                aggregates_button = format_html(
+                    '<form method="post" action="{}" style="display:inline;">{}'
+                    '<button type="submit" class="btn btn-sm {} ms-1" title="Итоги по колонке">'
+                    '<i class="bi bi-calculator"></i></button>'
+                    '</form>',
+                    aggregates_url,
+                    csrf_input(self.request),
+                    'btn-secondary' if column.show_aggregates else 'btn-outline-secondary'
+                )
             edit += format_html(
                 '<div class="d-flex justify-content-between align-items-center">'
                 '<div>{}</div>'
                 '<div>'
+                '<a href="{}" class="btn btn-sm btn-outline-secondary ms-3" title="Изменить тип">'
+                '<i class="bi bi-arrow-left-right"></i></a>'
+                '{}'
                 '<form method="post" action="{}" style="display:inline;">{}'
                 '<button type="submit" '
-                'class="btn btn-sm btn-danger ms-3" '
+                'class="btn btn-sm btn-danger ms-1" '
                 'onclick="return confirm(\'Удалить столбец?\');">'
                 '<i class="bi bi-x-lg"></i></button>'
                 '</form>'
                 '</div>'
                 '</div>',
                 column.name,
+                convert_url,
+                aggregates_button,
                 delete_url,
                 csrf_input(self.request)
             )
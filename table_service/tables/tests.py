@@ -1,3 +1,1450 @@
-from django.test import TestCase
+import csv
+import datetime
+import gzip
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
 
-# Create your tests here.
+import brotli
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections, router, transaction
+from django.http import StreamingHttpResponse
+from django.test import TestCase, TransactionTestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from prometheus_client import REGISTRY
+
+from .models import Table, Column, Row, Cell, RowPermission, TablePermission, Filial, Employee, Profile, Department, \
+    DepartmentClosure, BackgroundJob, SavedView, RowVisibility, TableChange, ExportWatermark, RowDepartmentPermission
+from .changes import cells_updated, record_changes
+from .conversion import start_column_conversion
+from .jobs import run_pending_jobs
+from .permissions import DEPARTMENT_SUBTREE_MEMBERS_SQL
+from .ordering import ORDER_STEP, ORDER_WINDOW, next_order, move_item
+from .partitions import DEFAULT_PARTITION, partition_name
+from .directory import filial_members, refresh_filial_memberships, rebuild_department_closure, refresh_row_creators
+from .grid import GridQuery
+from .middleware import CompressionMiddleware
+from .replica import REPLICA, LAG_CACHE_KEY, replica_lag, use_replica
+from .row_window import ROW_EDIT, ROW_DELETE, ROW_MANAGE
+from .visibility import rebuild_row_visibility
+
+# Размеры таблиц, на которых проверяется, что число запросов не зависит от числа строк
+ROW_COUNTS = (10, 100, 1000)
+
+# Явный бюджет запросов на одну отрисовку страницы
+QUERY_BUDGETS = {
+    'table_list': 13,
+    'table_detail': 12,
+    'table_detail_sorted': 12,
+    'table_detail_search': 13,
+    'shared_table_view': 17,
+    'shared_tables_list': 3,
+    'export_table': 9,
+    'export_table_csv': 9,
+}
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / 'sql_snapshots'
+
+
+def normalize_sql(sql):
+    """Приводит SQL к «форме»: без литералов и лишних пробелов"""
+    sql = re.sub(r"'(?:[^']|'')*'", "'?'", sql)
+    sql = re.sub(r'(?<![A-Za-z])\d+', 'N', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def create_user(username, filial_id, employee_id):
+    user = User.objects.create_user(username=username)
+    employee = Employee.objects.create(
+        id=employee_id,
+        id_filial=filial_id,
+        tabnumber=employee_id,
+        firstname=f'Имя{employee_id}',
+        secondname=f'Фамилия{employee_id}',
+        lastname=f'Отчество{employee_id}',
+    )
+    Profile.objects.create(user=user, employee=employee)
+    return user
+
+
+def create_table(owner, viewer, creator, row_count):
+    table = Table.objects.create(
+        title=f'Таблица на {row_count} строк',
+        owner=owner,
+        created_at=datetime.datetime.now()
+    )
+    TablePermission.objects.create(table=table, user=viewer, can_view=True)
+
+    columns = [
+        Column.objects.create(table=table, name=data_type.label, order=order, data_type=data_type)
+        for order, data_type in enumerate(Column.ColumnType)
+    ]
+    rows = Row.objects.bulk_create([
+        Row(table=table, order=order, created_by=creator, **Row.creator_fields(creator))
+        for order in range(row_count)
+    ])
+
+    cells = []
+    for row in rows:
+        for column in columns:
+            cell = Cell(table=table, row=row, column=column)
+            cell.value = {
+                Column.ColumnType.TEXT: f'текст {row.order}',
+                Column.ColumnType.INTEGER: row.order,
+                Column.ColumnType.FLOAT: row.order / 2,
+                Column.ColumnType.BOOLEAN: row.order % 2 == 0,
+                Column.ColumnType.DATE: datetime.date(2025, 1, 1) + datetime.timedelta(days=row.order),
+            }[column.data_type]
+            cells.append(cell)
+    Cell.objects.bulk_create(cells)
+
+    RowPermission.objects.bulk_create([
+        RowPermission(row=row, user=viewer, can_edit=True, can_delete=row.order % 2 == 0)
+        for row in rows
+    ])
+    rebuild_row_visibility(table.id)
+    return table
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов на страницу не должно расти вместе с числом строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        Filial.objects.create(id=1910, name='Администрация')
+        cls.owner = create_user('owner', 1910, 1)
+        cls.viewer = create_user('viewer', 10, 2)
+        cls.creator = create_user('creator', 10, 3)
+        cls.tables = {
+            row_count: create_table(cls.owner, cls.viewer, cls.creator, row_count)
+            for row_count in ROW_COUNTS
+        }
+
+    def count_queries(self, user, url, data=None):
+        cache.clear()
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        if hasattr(response, 'streaming_content'):
+            b''.join(response.streaming_content)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, budget_name, user, get_url, data=None):
+        counts = {
+            row_count: self.count_queries(user, get_url(table), data)
+            for row_count, table in self.tables.items()
+        }
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'{budget_name}: число запросов зависит от числа строк {counts}'
+        )
+        self.assertLessEqual(
+            max(counts.values()), QUERY_BUDGETS[budget_name],
+            f'{budget_name}: превышен бюджет запросов {counts}'
+        )
+
+    def test_table_list(self):
+        self.assertConstantQueries('table_list', self.owner, lambda table: reverse('table_list'))
+
+    def test_table_detail(self):
+        self.assertConstantQueries('table_detail', self.owner, lambda table: table.get_absolute_url())
+
+    def test_table_detail_sorted(self):
+        self.assertConstantQueries(
+            'table_detail_sorted', self.owner, lambda table: table.get_absolute_url(), {'sort': '-filial'}
+        )
+
+    def test_table_detail_search(self):
+        self.assertConstantQueries(
+            'table_detail_search', self.owner, lambda table: table.get_absolute_url(), {'q': 'текст'}
+        )
+
+    def test_shared_table_view(self):
+        self.assertConstantQueries('shared_table_view', self.viewer, lambda table: table.get_shared_url())
+
+    def test_shared_tables_list(self):
+        self.assertConstantQueries(
+            'shared_tables_list', self.viewer, lambda table: reverse('shared_tables_list')
+        )
+
+    def test_export_table(self):
+        self.assertConstantQueries(
+            'export_table', self.owner, lambda table: reverse('export_table', kwargs={'table_pk': table.pk})
+        )
+
+    def test_export_table_csv(self):
+        counts = {
+            row_count: self.count_queries(
+                self.owner, reverse('export_table', kwargs={'table_pk': table.pk}), {'_export': 'csv'}
+            )
+            for row_count, table in self.tables.items()
+        }
+        self.assertEqual(len(set(counts.values())), 1, f'export_table_csv: {counts}')
+        self.assertLessEqual(max(counts.values()), QUERY_BUDGETS['export_table_csv'])
+
+
+class SqlSnapshotTests(TestCase):
+    """Форма SQL запросов сетки (GridQuery) сверяется со снимками в sql_snapshots/.
+
+    Для обновления снимков после осознанного изменения запросов:
+    UPDATE_SQL_SNAPSHOTS=1 python manage.py test tables
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 1)
+
+    def assertMatchesSnapshot(self, name, queryset):
+        self.assertSqlMatchesSnapshot(name, str(queryset.query))
+
+    def assertSqlMatchesSnapshot(self, name, sql):
+        sql = normalize_sql(sql)
+        path = SNAPSHOT_DIR / f'{name}.sql'
+        if os.environ.get('UPDATE_SQL_SNAPSHOTS') or not path.exists():
+            SNAPSHOT_DIR.mkdir(exist_ok=True)
+            path.write_text(sql + '\n', encoding='utf-8')
+        self.assertEqual(sql, path.read_text(encoding='utf-8').strip(), f'Изменилась форма SQL: {name}')
+
+    def grid_queryset(self, **params):
+        return GridQuery(self.table, params).apply(self.table.rows.all())
+
+    def test_grid_default(self):
+        self.assertMatchesSnapshot('grid_default', self.grid_queryset())
+
+    def test_grid_sorted(self):
+        column = self.table.columns.get(data_type='text')
+        self.assertMatchesSnapshot('grid_sorted', self.grid_queryset(sort=f'-col_{column.id}'))
+
+    def test_grid_search(self):
+        self.assertMatchesSnapshot('grid_search', self.grid_queryset(q='1'))
+
+    def test_row_delete(self):
+        # Ячейки удаляются одним запросом с table_id - он читает только секцию таблицы
+        self.client.force_login(self.owner)
+        row = self.table.rows.get()
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(reverse('delete_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+        self.assertFalse(Row.objects.filter(pk=row.pk).exists())
+        self.assertSqlMatchesSnapshot('row_delete', '\n'.join(
+            query['sql'] for query in context.captured_queries if query['sql'].startswith('DELETE')
+        ))
+
+
+class MetricsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 3)
+
+    def test_metrics_exposition(self):
+        self.client.force_login(self.owner)
+        self.client.get(self.table.get_absolute_url())
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn('table_service_view_latency_seconds_bucket{', body)
+        self.assertIn('view="table_detail"', body)
+        self.assertIn('table_service_tables 1.0', body)
+        self.assertIn('table_service_active_row_locks', body)
+
+    def test_row_lock_contention_counted(self):
+        row = self.table.rows.first()
+        other = User.objects.get(username='viewer')
+        RowPermission.objects.filter(row=row, user=other).update(can_edit=True)
+        self.client.force_login(self.owner)
+        self.client.get(reverse('edit_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+
+        before = REGISTRY.get_sample_value('table_service_row_lock_contention_total')
+        self.client.force_login(other)
+        response = self.client.get(reverse('edit_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+        self.assertEqual(response.status_code, 423)
+        self.assertEqual(REGISTRY.get_sample_value('table_service_row_lock_contention_total'), before + 1)
+
+
+class RowVisibilityTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        Filial.objects.create(id=20, name='Другой филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.viewer = create_user('viewer', 20, 2)
+        cls.creator = create_user('creator', 10, 3)
+        cls.colleague = create_user('colleague', 10, 4)
+        cls.outsider = create_user('outsider', 20, 5)
+        cls.table = create_table(cls.owner, cls.viewer, cls.creator, 4)
+
+    def visible_ids(self, user):
+        return set(Row.get_visible_rows(user, self.table).values_list('id', flat=True))
+
+    def test_visibility_sources(self):
+        all_ids = set(self.table.rows.values_list('id', flat=True))
+        self.assertEqual(self.visible_ids(self.owner), all_ids)
+        self.assertEqual(self.visible_ids(self.creator), all_ids)
+        self.assertEqual(self.visible_ids(self.colleague), all_ids)  # Филиал создателя
+        self.assertEqual(self.visible_ids(self.viewer), all_ids)  # RowPermission
+        self.assertEqual(self.visible_ids(self.outsider), set())
+
+    def test_visible_rows_query_has_no_distinct(self):
+        sql = str(Row.get_visible_rows(self.colleague, self.table).query)
+        self.assertNotIn('DISTINCT', sql)
+        self.assertIn('tables_rowvisibility', sql)
+
+    def test_add_row_updates_index(self):
+        self.client.force_login(self.outsider)
+        TablePermission.objects.create(table=self.table, user=self.outsider)
+        response = self.client.post(reverse('add_row', kwargs={'pk': self.table.pk}), {})
+        self.assertEqual(response.status_code, 200)
+        row = self.table.rows.get(created_by=self.outsider)
+        self.assertIn(row.id, self.visible_ids(self.outsider))
+        self.assertNotIn(row.id, self.visible_ids(self.colleague))
+
+
+class SharedTablesListTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.viewer = create_user('viewer', 10, 2)
+        cls.table = create_table(cls.owner, cls.viewer, cls.owner, 2)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.viewer)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('shared_tables_list'))
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def test_query_count_does_not_depend_on_table_count(self):
+        single, _ = self.count_queries()
+        for number in range(20):
+            create_table(self.owner, self.viewer, self.owner, 1)
+        cache.clear()
+        many, response = self.count_queries()
+        self.assertEqual(single, many)
+        self.assertEqual(len(response.context['tables']), 21)
+
+    def test_cached_until_permissions_change(self):
+        self.count_queries()
+        cached, response = self.count_queries()
+        self.assertTrue(response.context['tables'][0]['can_edit'])
+
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('manage_table_permissions', kwargs={'table_pk': self.table.pk}),
+                {'update_submit': '1'}
+            )
+        self.client.force_login(self.viewer)
+        rebuilt, response = self.count_queries()
+        self.assertGreater(rebuilt, cached)
+
+
+class FilialPermissionPropagationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        Filial.objects.create(id=20, name='Другой филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 1)
+        cls.members = [create_user(f'member{number}', 20, 100 + number) for number in range(30)]
+
+    def post(self, data):
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                reverse('manage_table_permissions', kwargs={'table_pk': self.table.pk}), data
+            )
+        self.assertEqual(response.status_code, 302)
+        return len(context.captured_queries)
+
+    def test_add_filial_grants_all_members(self):
+        TablePermission.objects.create(table=self.table, user=self.members[0], can_view=False)
+        queries = self.post({'add_filials_submit': '1', 'new_filials': ['20'], 'new_filial_can_view': 'on'})
+        self.assertLess(queries, 20)
+        permissions = TablePermission.objects.filter(table=self.table, user__in=self.members)
+        self.assertEqual(permissions.count(), 30)
+        # Уже выданные права при добавлении филиала не перезаписываются
+        self.assertFalse(permissions.get(user=self.members[0]).can_view)
+
+    def test_update_filial_overwrites_members(self):
+        self.post({'add_filials_submit': '1', 'new_filials': ['20'], 'new_filial_can_view': 'on'})
+        self.post({'update_submit_fil': '1'})
+        self.assertFalse(
+            TablePermission.objects.filter(table=self.table, user__in=self.members, can_view=True).exists()
+        )
+
+
+class FilialMembershipTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.current = create_user('current', 10, 1)
+        cls.dismissed = create_user('dismissed', 10, 2)
+        cls.other = create_user('other', 20, 3)
+
+    def test_members_follow_directory(self):
+        self.assertEqual(set(filial_members(10)), {self.current, self.dismissed})
+
+        Employee.objects.filter(id=2).update(end_date=datetime.date.today() - datetime.timedelta(days=1))
+        Employee.objects.filter(id=3).update(id_filial=10)
+        refresh_filial_memberships()
+        self.assertEqual(set(filial_members(10)), {self.current, self.other})
+        self.assertFalse(filial_members(20).exists())
+
+    def test_profile_and_employee_changes_update_members(self):
+        user = User.objects.create_user(username='new')
+        employee = Employee.objects.create(id=4, id_filial=20, tabnumber=4, firstname='И', secondname='Ф', lastname='О')
+        profile = Profile.objects.create(user=user)
+        self.assertNotIn(user, filial_members(20))
+
+        profile.employee = employee
+        profile.save()
+        self.assertIn(user, filial_members(20))
+
+        employee.id_filial = 10
+        employee.save()
+        self.assertIn(user, filial_members(10))
+        self.assertNotIn(user, filial_members(20))
+
+        profile.delete()
+        self.assertNotIn(user, filial_members(10))
+
+    def test_members_query_uses_membership_only(self):
+        sql = str(filial_members(10).query)
+        self.assertIn('tables_filialmembership', sql)
+        self.assertNotIn('tables_employee', sql)
+
+
+class DirectorySyncTests(TestCase):
+
+    def write_export(self, name, records):
+        path = Path(self.tmpdir.name) / name
+        path.write_text('\n'.join(json.dumps(record) for record in records), encoding='utf-8')
+        return str(path)
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def sync(self, employees, dry_run=False):
+        call_command(
+            'sync_directory',
+            employees=self.write_export('employees.jsonl', employees),
+            dry_run=dry_run,
+            stdout=open(os.devnull, 'w')
+        )
+
+    def employee(self, employee_id, filial_id, lastname='Иванов'):
+        return {
+            'id': employee_id, 'id_filial': filial_id, 'tabnumber': employee_id,
+            'firstname': 'Иван', 'secondname': 'Иванович', 'lastname': lastname,
+        }
+
+    def test_inserts_updates_and_end_dates(self):
+        self.sync([self.employee(1, 10), self.employee(2, 10), self.employee(3, 20)])
+        self.assertEqual(Employee.objects.count(), 3)
+        fingerprints = dict(Employee.objects.values_list('id', 'fingerprint'))
+
+        self.sync([self.employee(1, 10), self.employee(2, 20, lastname='Петров')])
+        employees = Employee.objects.in_bulk()
+        self.assertEqual(employees[1].fingerprint, fingerprints[1])
+        self.assertEqual((employees[2].id_filial, employees[2].lastname), (20, 'Петров'))
+        self.assertEqual(employees[3].end_date, datetime.date.today())
+
+    def test_dry_run_changes_nothing(self):
+        self.sync([self.employee(1, 10)], dry_run=True)
+        self.assertFalse(Employee.objects.exists())
+
+    def test_memberships_refreshed(self):
+        user = User.objects.create_user(username='user')
+        self.sync([self.employee(1, 10)])
+        Profile.objects.create(user=user, employee_id=1)
+        self.sync([self.employee(1, 20)])
+        self.assertEqual(list(filial_members(20)), [user])
+
+    def test_row_creators_refreshed(self):
+        Filial.objects.create(id=10, name='Север')
+        Filial.objects.create(id=20, name='Юг')
+        user = User.objects.create_user(username='user')
+        self.sync([self.employee(1, 10)])
+        Profile.objects.create(user=user, employee_id=1)
+        table = Table.objects.create(title='Таблица', owner=user, created_at=datetime.datetime.now())
+        row = Row.objects.create(table=table, created_by=user, **Row.creator_fields(user))
+        self.assertEqual((row.creator_name, row.filial_name), ('Иванович Иван Иванов', 'Север'))
+
+        self.sync([self.employee(1, 20, lastname='Петров')])
+        row.refresh_from_db()
+        self.assertEqual(
+            (row.creator_name, row.creator_filial_id, row.filial_name), ('Иванович Иван Петров', 20, 'Юг')
+        )
+        self.assertEqual(Table.objects.get(pk=table.pk).version, table.version + 1)
+
+
+class DepartmentClosureTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # 1 -> 2 -> 3, 1 -> 4
+        for department_id, parent_id in [(1, None), (2, 1), (3, 2), (4, 1)]:
+            Department.objects.create(id=department_id, id_parent=parent_id, name=f'Отдел {department_id}')
+        rebuild_department_closure()
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 1)
+        cls.members = {}
+        for department_id in (2, 3, 4):
+            user = create_user(f'member{department_id}', 10, 100 + department_id)
+            Employee.objects.filter(id=100 + department_id).update(id_department=department_id)
+            cls.members[department_id] = user
+
+    def pairs(self):
+        return set(DepartmentClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+
+    def test_full_rebuild(self):
+        self.assertIn((1, 3, 2), self.pairs())
+        self.assertEqual(DepartmentClosure.objects.count(), 8)
+
+    def test_incremental_rebuild_matches_full(self):
+        # Переносим поддерево 2 -> 3 под отдел 4
+        Department.objects.filter(id=2).update(id_parent=4)
+        rebuild_department_closure([2])
+        incremental = self.pairs()
+        rebuild_department_closure()
+        self.assertEqual(incremental, self.pairs())
+        self.assertIn((4, 3, 2), incremental)
+
+    def test_subtree_members(self):
+        with connection.cursor() as cursor:
+            for department_id, expected in [(2, {2, 3}), (1, {2, 3, 4})]:
+                cursor.execute(DEPARTMENT_SUBTREE_MEMBERS_SQL, [department_id])
+                self.assertEqual(
+                    {user_id for user_id, in cursor.fetchall()},
+                    {self.members[member].id for member in expected}
+                )
+
+    def test_department_row_grant_covers_subtree(self):
+        self.client.force_login(self.owner)
+        row = self.table.rows.get()
+        response = self.client.post(
+            reverse('manage_row_permissions', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}),
+            {'add_departments_submit': '1', 'new_departments': ['2'], 'new_department_can_edit': 'on'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(RowDepartmentPermission.objects.filter(row=row, department_id=2).exists())
+        granted = set(RowPermission.objects.filter(row=row, can_edit=True).values_list('user_id', flat=True))
+        self.assertTrue({self.members[2].id, self.members[3].id} <= granted)
+        self.assertNotIn(self.members[4].id, granted)
+        visible = set(RowVisibility.objects.filter(row=row).values_list('user_id', flat=True))
+        self.assertIn(self.members[3].id, visible)
+        self.assertNotIn(self.members[4].id, visible)
+
+    def test_department_grant_covers_subtree(self):
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('manage_table_permissions', kwargs={'table_pk': self.table.pk}),
+            {'add_departments_submit': '1', 'new_departments': ['2'], 'new_department_can_view': 'on'}
+        )
+        self.assertEqual(response.status_code, 302)
+        granted = set(User.objects.filter(tablepermission__table=self.table, tablepermission__can_view=True))
+        self.assertIn(self.members[3], granted)
+        self.assertNotIn(self.members[4], granted)
+
+
+class ColumnConversionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 0)
+
+    def convert(self, source_type, target_type, values):
+        column = self.table.columns.get(data_type=source_type)
+        field = f'{source_type}_value'
+        for order, value in enumerate(values):
+            row = Row.objects.create(table=self.table, order=order, created_by=self.owner)
+            Cell.objects.create(row=row, column=column, **{field: value})
+        job = start_column_conversion(column, target_type, self.owner, batch_size=2)
+        run_pending_jobs()
+        job.refresh_from_db()
+        column.refresh_from_db()
+        self.assertEqual(job.status, BackgroundJob.Status.DONE)
+        self.assertEqual(column.data_type, target_type)
+        # Старое поле очищено
+        self.assertFalse(Cell.objects.filter(column=column, **{f'{field}__isnull': False}).exists())
+        cells = Cell.objects.filter(column=column).select_related('column').order_by('row__order')
+        failures = list(job.conversion_failures.order_by('row__order').values_list('value', flat=True))
+        return [cell.value for cell in cells], failures
+
+    def test_text_to_integer(self):
+        values, failures = self.convert('text', 'integer', ['12', ' -7 ', 'abc', '', None, '99999999999'])
+        self.assertEqual(values, [12, -7, None, None, None, None])
+        self.assertEqual(failures, ['abc', '99999999999'])
+
+    def test_text_to_date(self):
+        values, failures = self.convert('text', 'date', ['2024-02-29', '31.12.2023', '2023-02-29', 'завтра'])
+        self.assertEqual(values, [datetime.date(2024, 2, 29), datetime.date(2023, 12, 31), None, None])
+        self.assertEqual(failures, ['2023-02-29', 'завтра'])
+
+    def test_float_to_integer_and_boolean_to_text(self):
+        values, failures = self.convert('float', 'integer', [3.0, 3.5])
+        self.assertEqual((values, failures), ([3, None], ['3.5']))
+        values, failures = self.convert('boolean', 'text', [True, False])
+        self.assertEqual((values, failures), (['true', 'false'], []))
+
+    def test_edit_blocked_while_converting(self):
+        row = Row.objects.create(table=self.table, order=0, created_by=self.owner)
+        RowPermission.objects.create(row=row, user=self.owner, can_edit=True, can_delete=True)
+        start_column_conversion(self.table.columns.get(data_type='text'), 'integer', self.owner)
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('edit_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+        self.assertEqual(response.status_code, 423)
+        response = self.client.get(reverse('convert_column', kwargs={
+            'table_pk': self.table.pk, 'column_pk': self.table.columns.get(data_type='text').pk
+        }))
+        self.assertContains(response, 'В очереди')
+
+
+class OrderingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 0)
+
+    def add_rows(self, count):
+        return [
+            Row.objects.create(table=self.table, order=next_order(self.table, self.table.rows.all()))
+            for _ in range(count)
+        ]
+
+    def ids(self):
+        return list(self.table.rows.values_list('id', flat=True))
+
+    def test_append_leaves_gaps(self):
+        rows = self.add_rows(3)
+        self.assertEqual([row.order for row in rows], [ORDER_STEP, 2 * ORDER_STEP, 3 * ORDER_STEP])
+
+    def test_move_changes_only_moved_row(self):
+        first, second, third = self.add_rows(3)
+        with self.assertNumQueries(6):
+            move_item(third, self.table.rows.all(), before=second)
+        self.assertEqual(self.ids(), [first.id, third.id, second.id])
+        self.assertEqual(Row.objects.get(pk=second.pk).order, 2 * ORDER_STEP)
+
+    def test_exhausted_gap_is_rebalanced(self):
+        first, second, last = self.add_rows(3)
+        moved = self.add_rows(20)
+        # Раз за разом вставляем перед одной и той же строкой, пока место между соседями не кончится
+        for row in moved:
+            move_item(row, self.table.rows.all(), before=second)
+        expected = [first.id] + [row.id for row in moved] + [second.id, last.id]
+        self.assertEqual(self.ids(), expected)
+        self.assertTrue(BackgroundJob.objects.filter(kind='rebalance_order', table=self.table).exists())
+
+        run_pending_jobs()
+        self.assertEqual(self.ids(), expected)
+        orders = list(self.table.rows.values_list('order', flat=True))
+        self.assertEqual({b - a for a, b in zip(orders, orders[1:])}, {ORDER_STEP})
+
+    def test_exhausted_gap_moves_only_near_neighbours(self):
+        first, second = self.add_rows(2)
+        tail = self.add_rows(100)
+        moved = self.add_rows(40)
+        for row in moved:
+            move_item(row, self.table.rows.all(), before=second)
+        self.assertEqual(self.ids(), [first.id] + [row.id for row in moved] + [second.id] + [row.id for row in tail])
+        # Дальний хвост не перенумеровывается: место освобождают несколько ближайших соседей
+        far_tail = tail[ORDER_WINDOW:]
+        self.assertEqual(
+            list(Row.objects.filter(pk__in=[row.pk for row in far_tail]).values_list('order', flat=True)),
+            [row.order for row in far_tail]
+        )
+
+    def test_packed_window_shifts_tail(self):
+        rows = self.add_rows(ORDER_WINDOW + 3)
+        for order, row in enumerate(rows, 1):
+            row.order = order
+        Row.objects.bulk_update(rows, ['order'])
+        move_item(rows[-1], self.table.rows.all(), before=rows[1])
+        self.assertEqual(self.ids(), [rows[0].id, rows[-1].id] + [row.id for row in rows[1:-1]])
+
+    def test_move_endpoints(self):
+        first, second = self.add_rows(2)
+        self.client.force_login(self.owner)
+        response = self.client.post(
+            reverse('move_row', kwargs={'table_pk': self.table.pk, 'row_pk': first.pk}), {'after': second.pk}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(), [second.id, first.id])
+
+        columns = list(self.table.columns.values_list('id', flat=True))
+        self.client.post(
+            reverse('move_column', kwargs={'table_pk': self.table.pk, 'column_pk': columns[-1]}),
+            {'before': columns[0]}
+        )
+        self.assertEqual(list(self.table.columns.values_list('id', flat=True)), columns[-1:] + columns[:-1])
+
+
+class SoftDeleteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 30)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def test_delete_table_hides_then_purges(self):
+        record_changes(self.table.pk, [TableChange(kind=TableChange.Kind.ROW_DELETE, row_id=i) for i in range(5)])
+        ExportWatermark.objects.create(table=self.table, user=self.owner, seq=5)
+        SavedView.objects.create(table=self.table, user=self.owner, name='Все')
+        self.client.get(reverse('delete_table', kwargs={'pk': self.table.pk}))
+        response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(Row.objects.filter(table_id=self.table.pk).count(), 30)
+
+        run_pending_jobs()
+        job = BackgroundJob.objects.get(kind='purge_deleted')
+        # Строки, записи журнала, отметка выгрузки и представление удалены пакетами задачи
+        self.assertEqual((job.status, job.processed), (BackgroundJob.Status.DONE, 30 + 5 + 1 + 1))
+        self.assertFalse(TableChange.objects.filter(table_id=self.table.pk).exists())
+        self.assertFalse(Table.all_objects.filter(pk=self.table.pk).exists())
+        self.assertFalse(Row.objects.filter(table_id=self.table.pk).exists())
+        self.assertFalse(Cell.objects.filter(row__table_id=self.table.pk).exists())
+        self.assertFalse(RowPermission.objects.exists())
+
+    def test_delete_column_hides_then_purges(self):
+        column = self.table.columns.first()
+        self.client.post(reverse('delete_column', kwargs={'table_pk': self.table.pk, 'column_pk': column.pk}))
+        self.assertNotIn(column, self.table.columns.all())
+        self.assertEqual(Cell.objects.filter(column=column).count(), 30)
+
+        run_pending_jobs()
+        self.assertFalse(Cell.objects.filter(column=column).exists())
+        self.assertFalse(Column.all_objects.filter(pk=column.pk).exists())
+        self.assertEqual(Cell.objects.filter(row__table=self.table).count(), 30 * 4)
+
+
+class ColumnAggregatesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 10)
+        cls.table.columns.filter(data_type__in=['integer', 'date']).update(show_aggregates=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def get(self, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}), params)
+        return response, len(context.captured_queries)
+
+    def test_footer_over_filtered_rows(self):
+        response, _ = self.get()
+        aggregates = response.context['table'].aggregates
+        integer_column = self.table.columns.get(data_type='integer')
+        date_column = self.table.columns.get(data_type='date')
+        self.assertEqual(aggregates[integer_column.id], {'count': 10, 'sum': 45, 'avg': 4.5, 'min': 0, 'max': 9})
+        self.assertEqual(aggregates[date_column.id]['max'], datetime.date(2025, 1, 10))
+        self.assertContains(response, 'Сумма: 45')
+
+        response, _ = self.get(q='текст 3')
+        self.assertEqual(response.context['table'].aggregates[integer_column.id]['sum'], 3)
+
+    def test_repeated_view_uses_cache_until_data_changes(self):
+        _, first = self.get()
+        _, second = self.get()
+        self.assertEqual(second, first - 1)
+
+        row = self.table.rows.first()
+        Cell.objects.filter(row=row, column__data_type='integer').update(integer_value=100)
+        Table.bump_version(self.table.pk)
+        response, _ = self.get()
+        self.assertContains(response, 'Сумма: 145')
+
+
+class ReportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Север')
+        Filial.objects.create(id=20, name='Юг')
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 10)
+        cls.table.rows.filter(order__lt=4).update(created_by=create_user('south', 20, 3))
+        refresh_row_creators()
+        cls.boolean_column = cls.table.columns.get(data_type='boolean')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def get_report(self, **params):
+        response = self.client.get(reverse('table_report_api', kwargs={'table_pk': self.table.pk}), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['report']
+
+    def test_group_by_filial(self):
+        report = self.get_report(group_by='filial', function='sum')
+        self.assertEqual(report['headers'], ['Филиал', 'Строк', 'Целое число: Сумма', 'Число с плавающей точкой: Сумма'])
+        self.assertEqual(report['rows'], [['Север', 6, 39, 19.5], ['Юг', 4, 6, 3.0]])
+
+        report = self.get_report(group_by='creator', function='max')
+        self.assertEqual(report['rows'][0][:3], ['Фамилия1 Имя1 Отчество1', 6, 9])
+
+    def test_pivot_by_boolean_column(self):
+        report = self.get_report(
+            group_by='filial', pivot_by=f'col_{self.boolean_column.id}', function='count',
+            measures=self.table.columns.get(data_type='integer').id,
+        )
+        self.assertEqual(report['headers'][1:], [
+            'False · Строк', 'False · Целое число: Количество', 'True · Строк', 'True · Целое число: Количество',
+        ])
+        self.assertEqual(report['rows'], [['Север', 3, 3, 3, 3], ['Юг', 2, 2, 2, 2]])
+
+    def test_csv_and_cache_by_version(self):
+        url = reverse('table_report', kwargs={'table_pk': self.table.pk})
+        response = self.client.get(url, {'group_by': 'filial', 'function': 'sum', 'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(response.content.decode('utf-8').splitlines()[1], 'Север;6;39;19.5')
+
+        with CaptureQueriesContext(connection) as context:
+            self.get_report(group_by='filial', function='sum')
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in context.captured_queries))
+
+        Cell.objects.filter(row__order=9, column__data_type='integer').update(integer_value=100)
+        Table.bump_version(self.table.pk)
+        self.assertEqual(self.get_report(group_by='filial', function='sum')['rows'][0][2], 130)
+
+    def test_invalid_group_by(self):
+        response = self.client.get(
+            reverse('table_report_api', kwargs={'table_pk': self.table.pk}), {'group_by': 'unknown'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class SavedViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.viewer = create_user('viewer', 10, 2)
+        cls.table = create_table(cls.owner, cls.viewer, cls.owner, 30)
+        cls.integer_column = cls.table.columns.get(data_type='integer')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def open_view(self, saved_view):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}), {'view': saved_view.pk})
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in context.captured_queries]
+
+    def test_save_and_open_view(self):
+        response = self.client.post(reverse('save_view', kwargs={'table_pk': self.table.pk}), {
+            'name': 'Единицы',
+            'search_query': 'текст 1',
+            'sort': f'-col_{self.integer_column.id}',
+            'columns': [self.integer_column.id],
+        })
+        saved_view = SavedView.objects.get(table=self.table, user=self.owner)
+        self.assertRedirects(response, f'/{self.table.pk}/?view={saved_view.pk}', fetch_redirect_response=False)
+
+        response, _ = self.open_view(saved_view)
+        rows = list(response.context['table'].page.object_list)
+        self.assertEqual([row.record.order for row in rows], [19, 18, 17, 16, 15, 14, 13, 12, 11, 10, 1])
+        self.assertEqual(list(response.context['table'].columns.names()), ['filial', 'user', f'col_{self.integer_column.id}', 'actions'])
+
+    def test_row_ids_cached_by_version(self):
+        saved_view = SavedView.objects.create(
+            table=self.table, user=self.owner, name='Поиск', search_query='текст 2', sort='col_%d' % self.integer_column.id
+        )
+        _, first = self.open_view(saved_view)
+        response, second = self.open_view(saved_view)
+        self.assertTrue(any('UPPER' in sql for sql in first))
+        self.assertFalse(any('UPPER' in sql for sql in second))
+        self.assertEqual(response.context['table'].paginator.count, 11)
+
+        Cell.objects.filter(row__order=5, column__data_type='text').update(text_value='текст 25')
+        Table.bump_version(self.table.pk)
+        response, _ = self.open_view(saved_view)
+        self.assertEqual(response.context['table'].paginator.count, 12)
+
+    def test_resaved_view_not_served_from_cache(self):
+        url = reverse('save_view', kwargs={'table_pk': self.table.pk})
+        self.client.post(url, {'name': 'Поиск', 'search_query': 'текст 2'})
+        saved_view = SavedView.objects.get(table=self.table, user=self.owner)
+        response, _ = self.open_view(saved_view)
+        self.assertEqual(response.context['table'].paginator.count, 11)
+
+        self.client.post(url, {'name': 'Поиск', 'search_query': 'текст 3'})
+        self.assertEqual(SavedView.objects.get(table=self.table, user=self.owner).pk, saved_view.pk)
+        response, _ = self.open_view(saved_view)
+        self.assertEqual(response.context['table'].paginator.count, 1)
+
+    def test_view_of_another_user(self):
+        saved_view = SavedView.objects.create(table=self.table, user=self.viewer, name='Чужое')
+        response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}), {'view': saved_view.pk})
+        self.assertEqual(response.status_code, 404)
+
+        self.client.force_login(self.viewer)
+        response = self.client.get(
+            reverse('shared_table_view', kwargs={'share_token': self.table.share_token}), {'view': saved_view.pk}
+        )
+        self.assertEqual(response.context['table'].paginator.count, 30)
+
+
+class ColumnFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 20)
+        cls.columns = {column.data_type: column for column in cls.table.columns.all()}
+
+    def filter_orders(self, **filters):
+        params = {}
+        for name, value in filters.items():
+            data_type, operation = name.split('__')
+            params[f'col_{self.columns[data_type].id}__{operation}'] = value
+        queryset = GridQuery(self.table, params).apply(self.table.rows.all())
+        return sorted(queryset.values_list('order', flat=True)), str(queryset.query)
+
+    def test_typed_filters(self):
+        orders, sql = self.filter_orders(**{'integer__gte': 3, 'integer__lte': 5})
+        self.assertEqual(orders, [3, 4, 5])
+        self.assertIn('U0."column_id" = %d AND U0."integer_value" >= 3' % self.columns['integer'].id, sql)
+
+        orders, sql = self.filter_orders(**{'text__prefix': 'текст 1'})
+        self.assertEqual(orders, [1] + list(range(10, 20)))
+        self.assertIn('UPPER(LEFT(U0."text_value", 200))::text LIKE', sql)
+
+        self.assertEqual(self.filter_orders(**{'date__eq': '05.01.2025'})[0], [4])
+        self.assertEqual(self.filter_orders(**{'boolean__eq': 'false', 'float__gte': 8})[0], [17, 19])
+        self.assertEqual(self.filter_orders(**{'text__eq': 'текст 7'})[0], [7])
+
+    def test_empty_and_invalid_values(self):
+        Cell.objects.filter(row__order=2, column=self.columns['integer']).update(integer_value=None)
+        self.assertEqual(self.filter_orders(**{'integer__empty': 'true'})[0], [2])
+        self.assertEqual(len(self.filter_orders(**{'integer__empty': 'false'})[0]), 19)
+        # Неподходящее значение и операция для типа колонки игнорируются
+        self.assertEqual(len(self.filter_orders(**{'integer__gte': 'abc', 'boolean__prefix': 'x'})[0]), 20)
+
+    def test_filters_in_saved_view(self):
+        self.client.force_login(self.owner)
+        self.client.post(reverse('save_view', kwargs={'table_pk': self.table.pk}), {
+            'name': 'Большие', f'col_{self.columns["integer"].id}__gte': '15',
+        })
+        saved_view = SavedView.objects.get(name='Большие')
+        response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}), {'view': saved_view.pk})
+        self.assertEqual(response.context['table'].paginator.count, 5)
+
+
+class SearchApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 30)
+        cls.row_ids = dict(cls.table.rows.values_list('order', 'id'))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def search(self, search_query):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                reverse('search_table_api', kwargs={'table_pk': self.table.pk}), {'q': search_query}
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query['sql'] for query in context.captured_queries]
+
+    def test_row_ids_and_count(self):
+        result, _ = self.search('текст 1')
+        self.assertEqual(result['count'], 11)
+        self.assertEqual(result['row_ids'], [self.row_ids[order] for order in [1] + list(range(10, 20))])
+
+        _, queries = self.search('текст 1')
+        self.assertFalse(any('tables_cell' in sql for sql in queries))
+
+    def test_prefix_narrows_cached_superset(self):
+        self.search('7')
+        result, queries = self.search('7.5')
+        # Подстрока ищется среди строк, найденных по '7', а совпадение числа 7.5 - по всей таблице
+        self.assertTrue(any(str(self.row_ids[27]) in sql and 'IN (' in sql for sql in queries))
+        self.assertEqual(result['row_ids'], [self.row_ids[15]])
+
+    def test_requires_view_permission(self):
+        self.client.force_login(create_user('stranger', 20, 3))
+        response = self.client.get(reverse('search_table_api', kwargs={'table_pk': self.table.pk}), {'q': 'x'})
+        self.assertEqual(response.status_code, 403)
+
+
+class GridQueryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 5)
+        cls.columns = {column.data_type: column for column in cls.table.columns.all()}
+
+    def test_only_needed_annotations(self):
+        plan = GridQuery(self.table, {})
+        self.assertEqual(plan.annotations, [])
+        self.assertNotIn('sort_value_', str(plan.apply(self.table.rows.all()).query))
+
+        integer_column = self.columns['integer']
+        plan = GridQuery(self.table, {'sort': f'-col_{integer_column.id},user', 'page': '2'})
+        self.assertEqual(plan.annotations, [f'sort_value_{integer_column.id}'])
+        self.assertEqual(plan.ordering, [f'-sort_value_{integer_column.id}', 'creator_name', 'order', 'id'])
+        self.assertIn('страница: 2', plan.describe())
+
+    def test_unknown_sort_is_ignored(self):
+        plan = GridQuery(self.table, {'sort': 'col_999999,-nothing'})
+        self.assertEqual(plan.ordering, ['order', 'id'])
+
+    def test_grid_sorted_by_column(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(
+            reverse('table_detail', kwargs={'pk': self.table.pk}), {'sort': f'-col_{self.columns["integer"].id}'}
+        )
+        orders = [row.record.order for row in response.context['table'].page.object_list]
+        self.assertEqual(orders, [4, 3, 2, 1, 0])
+
+
+class RowWindowTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.viewer = create_user('viewer', 10, 2)
+        cls.table = create_table(cls.owner, cls.viewer, cls.owner, 30)
+        cls.columns = {column.data_type: column for column in cls.table.columns.all()}
+
+    def get_window(self, **params):
+        response = self.client.get(reverse('table_rows_api', kwargs={'table_pk': self.table.pk}), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_columnar_window(self):
+        self.client.force_login(self.owner)
+        window = self.get_window(offset=0, limit=3)
+        self.assertEqual(window['total'], 30)
+        self.assertEqual(window['column_ids'], [column.id for column in self.table.columns.all()])
+        self.assertEqual(window['filials'], ['Филиал'] * 3)
+        integer_cells = window['cells'][window['column_ids'].index(self.columns['integer'].id)]
+        date_cells = window['cells'][window['column_ids'].index(self.columns['date'].id)]
+        self.assertEqual(integer_cells, [0, 1, 2])
+        self.assertEqual(date_cells, ['2025-01-01', '2025-01-02', '2025-01-03'])
+        self.assertEqual(window['permissions'], [ROW_EDIT | ROW_DELETE | ROW_MANAGE] * 3)
+
+        window = self.get_window(offset=28, limit=5, sort=f'-col_{self.columns["integer"].id}')
+        self.assertIsNone(window['total'])
+        self.assertEqual(window['cells'][window['column_ids'].index(self.columns['integer'].id)], [1, 0])
+
+    def test_viewer_permission_masks(self):
+        self.client.force_login(self.viewer)
+        window = self.get_window(limit=2)
+        self.assertEqual(window['permissions'], [ROW_EDIT | ROW_DELETE, ROW_EDIT])
+
+    def test_queries_do_not_grow_with_window(self):
+        self.client.force_login(self.viewer)
+        with CaptureQueriesContext(connection) as small:
+            self.get_window(limit=2)
+        with CaptureQueriesContext(connection) as large:
+            self.get_window(limit=30)
+        self.assertEqual(len(small), len(large))
+
+    def test_requires_view_permission(self):
+        self.client.force_login(create_user('stranger', 20, 3))
+        response = self.client.get(reverse('table_rows_api', kwargs={'table_pk': self.table.pk}))
+        self.assertEqual(response.status_code, 403)
+
+    def test_virtual_grid_mode(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('table_detail', kwargs={'pk': self.table.pk}), {'grid': 'virtual'})
+        self.assertIsNone(response.context['table'])
+        self.assertContains(response, reverse('table_rows_api', kwargs={'table_pk': self.table.pk}))
+
+
+class CompressionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 20)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def get_table(self, accept_encoding):
+        return self.client.get(
+            reverse('table_detail', kwargs={'pk': self.table.pk}), HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+
+    def unmasked(self, content):
+        # Маска CSRF-токена своя в каждом ответе
+        return re.sub(rb'name="csrfmiddlewaretoken" value="\w+"', b'', content)
+
+    def test_negotiated_encoding(self):
+        plain = self.get_table('').content
+        response = self.get_table('gzip, deflate, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(self.unmasked(brotli.decompress(response.content)), self.unmasked(plain))
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+
+        response = self.get_table('br;q=0, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(self.unmasked(gzip.decompress(response.content)), self.unmasked(plain))
+
+    def test_small_response_not_compressed(self):
+        response = self.client.get(
+            reverse('search_table_api', kwargs={'table_pk': self.table.pk}), {'q': 'нет такого'},
+            HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        chunks = [f'{number};строка\n'.encode('utf-8') * 100 for number in range(5)]
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(chunks, content_type='text/csv'))
+        original = REGISTRY.get_sample_value(
+            'table_service_compression_bytes_total', {'encoding': 'gzip', 'stage': 'original'}
+        ) or 0
+        response = middleware(RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip'))
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(chunks))
+        self.assertEqual(
+            REGISTRY.get_sample_value(
+                'table_service_compression_bytes_total', {'encoding': 'gzip', 'stage': 'original'}
+            ),
+            original + len(b''.join(chunks)),
+        )
+
+
+class ChangeLogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Filial.objects.create(id=10, name='Филиал')
+        Filial.objects.create(id=20, name='Другой филиал')
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 3)
+        cls.columns = {column.data_type: column for column in cls.table.columns.all()}
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def get_changes(self, **params):
+        response = self.client.get(reverse('table_changes_api', kwargs={'table_pk': self.table.pk}), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_write_paths_are_logged(self):
+        self.client.post(reverse('add_row', kwargs={'pk': self.table.pk}), {
+            f'col_{self.columns["integer"].id}': '42', f'col_{self.columns["text"].id}': 'новая',
+        })
+        row = self.table.rows.get(cells__column=self.columns['integer'], cells__integer_value=42)
+
+        self.client.post(reverse('edit_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}), {
+            f'col_{self.columns["integer"].id}': '43', f'col_{self.columns["text"].id}': 'новая',
+            f'col_{self.columns["float"].id}': '0.0', f'col_{self.columns["boolean"].id}': '',
+            f'col_{self.columns["date"].id}': '',
+        })
+        self.client.post(reverse('delete_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+
+        result = self.get_changes(since=0)
+        self.assertEqual(result['fields'], ['seq', 'kind', 'row_id', 'column_id', 'value'])
+        changes = [dict(zip(result['fields'], change)) for change in result['changes']]
+        self.assertEqual([change['seq'] for change in changes], list(range(1, len(changes) + 1)))
+        self.assertEqual(changes[0]['kind'], 'row_insert')
+        self.assertEqual(changes[0]['value'][str(self.columns['integer'].id)], 42)
+        updates = [change for change in changes if change['kind'] == 'cell_update']
+        self.assertIn((self.columns['integer'].id, 43), [(change['column_id'], change['value']) for change in updates])
+        self.assertNotIn(self.columns['text'].id, [change['column_id'] for change in updates])
+        self.assertEqual((changes[-1]['kind'], changes[-1]['row_id']), ('row_delete', row.pk))
+        self.assertEqual((result['last_seq'], result['has_more']), (len(changes), False))
+
+        self.assertEqual(self.get_changes(since=result['last_seq'])['changes'], [])
+
+    def test_batches(self):
+        for row in self.table.rows.all():
+            self.client.post(reverse('delete_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}))
+        result = self.get_changes(since=0, limit=2)
+        self.assertEqual(([change[0] for change in result['changes']], result['has_more']), ([1, 2], True))
+        result = self.get_changes(since=result['last_seq'], limit=2)
+        self.assertEqual(([change[0] for change in result['changes']], result['has_more']), ([3], False))
+
+    def test_invisible_rows_are_filtered(self):
+        outsider = create_user('outsider', 20, 3)
+        TablePermission.objects.create(table=self.table, user=outsider, can_view=True)
+        self.client.post(reverse('add_row', kwargs={'pk': self.table.pk}), {})
+
+        self.client.force_login(outsider)
+        result = self.get_changes(since=0)
+        self.assertEqual(result['changes'], [])
+        self.assertEqual(result['last_seq'], 1)
+
+
+class IncrementalExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 5)
+        cls.integer_column = cls.table.columns.get(data_type='integer')
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def export(self, **params):
+        response = self.client.get(
+            reverse('export_table', kwargs={'table_pk': self.table.pk}), {'_export': 'csv', 'incremental': '1', **params}
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(response.content.decode('utf-8').splitlines()))
+        return rows, int(response['X-Export-Watermark'])
+
+    def change_rows(self):
+        rows = list(self.table.rows.all())
+        with transaction.atomic():
+            Cell.objects.filter(row=rows[0], column=self.integer_column).update(integer_value=100)
+            cells_updated(rows[0], {self.integer_column.id: 0}, {self.integer_column.id: 100})
+        self.client.post(reverse('delete_row', kwargs={'table_pk': self.table.pk, 'row_pk': rows[1].pk}))
+        return rows[0], rows[1]
+
+    def test_remembered_watermark(self):
+        rows, watermark = self.export()
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(watermark, 0)
+
+        changed, deleted = self.change_rows()
+        rows, watermark = self.export()
+        self.assertEqual(
+            [(row['id'], row['Изменение'], row[self.integer_column.name]) for row in rows],
+            [(str(changed.pk), 'upsert', '100'), (str(deleted.pk), 'delete', '')]
+        )
+        self.assertEqual(watermark, 2)
+
+        rows, _ = self.export()
+        self.assertEqual(rows, [])
+
+    def test_explicit_watermark(self):
+        changed, deleted = self.change_rows()
+        rows, _ = self.export(since=1)
+        self.assertEqual([row['id'] for row in rows], [str(deleted.pk)])
+
+        rows, _ = self.export(since_time=(datetime.datetime.now() - datetime.timedelta(days=1)).isoformat())
+        self.assertEqual(len(rows), 4)  # Журнала до метки нет - выгружается вся таблица
+
+        response = self.client.get(
+            reverse('export_table', kwargs={'table_pk': self.table.pk}), {'incremental': '1', 'since': 'вчера'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class CloneTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.viewer = create_user('viewer', 10, 2)
+        cls.table = create_table(cls.owner, cls.viewer, cls.owner, 5)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def clone(self, source, **options):
+        response = self.client.post(reverse('clone_table', kwargs={'pk': source.pk}), {'title': 'Копия', **options})
+        self.assertEqual(response.status_code, 302)
+        return Table.objects.latest('id')
+
+    def cell_values(self, table):
+        return sorted(
+            (row.order, column, value)
+            for row in table.rows.all()
+            for column, value in Cell.objects.filter(row=row).values_list('column__name', 'text_value')
+        )
+
+    def test_schema_only(self):
+        Column.all_objects.filter(pk=self.table.columns.first().pk).update(deleted_at=datetime.datetime.now())
+        clone = self.clone(self.table)
+        self.assertEqual(
+            list(clone.columns.values_list('name', 'data_type', 'order')),
+            list(self.table.columns.values_list('name', 'data_type', 'order'))
+        )
+        self.assertFalse(clone.rows.exists())
+        self.assertEqual(list(clone.permissions.values_list('user_id', flat=True)), [self.owner.id])
+
+    def test_rows_and_permissions(self):
+        clone = self.clone(self.table, include_rows='on', include_permissions='on')
+        self.assertEqual(self.cell_values(clone), self.cell_values(self.table))
+        self.assertNotEqual(
+            set(Cell.objects.filter(row__table=clone).values_list('column_id', flat=True)),
+            set(Cell.objects.filter(row__table=self.table).values_list('column_id', flat=True))
+        )
+        self.assertTrue(clone.permissions.filter(user=self.viewer).exists())
+        self.assertEqual(RowPermission.objects.filter(row__table=clone, user=self.viewer).count(), 5)
+        self.assertEqual(
+            RowVisibility.objects.filter(table=clone, user=self.viewer).count(),
+            RowVisibility.objects.filter(table=self.table, user=self.viewer).count()
+        )
+
+    def test_query_count_does_not_depend_on_rows(self):
+        counts = []
+        for source in [self.table, create_table(self.owner, self.viewer, self.owner, 20)]:
+            with CaptureQueriesContext(connection) as queries:
+                self.clone(source, include_rows='on', include_permissions='on')
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CellPartitionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = create_user('owner', 10, 1)
+        cls.table = create_table(cls.owner, create_user('viewer', 10, 2), cls.owner, 5)
+
+    def setUp(self):
+        self.client.force_login(self.owner)
+
+    def partition_rows(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+            if not cursor.fetchone()[0]:
+                return None
+            cursor.execute(f'SELECT count(*) FROM {name}')
+            return cursor.fetchone()[0]
+
+    def test_table_cells_in_own_partition(self):
+        self.assertEqual(self.partition_rows(partition_name(self.table.pk)), 5 * len(Column.ColumnType))
+        self.assertEqual(self.partition_rows(DEFAULT_PARTITION), 0)
+
+    def test_table_query_reads_only_its_partition(self):
+        other = create_table(self.owner, self.owner, self.owner, 1)
+        plan = Cell.objects.filter(table=self.table, column__in=self.table.columns.all()).explain()
+        self.assertIn(partition_name(self.table.pk), plan)
+        self.assertNotIn(partition_name(other.pk), plan)
+        self.assertNotIn(DEFAULT_PARTITION, plan)
+
+    def test_edit_row_upserts_cells(self):
+        row = self.table.rows.first()
+        Cell.objects.filter(row=row, column__data_type=Column.ColumnType.TEXT).delete()
+        data = {
+            f'col_{column.id}': {
+                Column.ColumnType.TEXT: 'новый текст',
+                Column.ColumnType.INTEGER: '42',
+                Column.ColumnType.FLOAT: '1.5',
+                Column.ColumnType.BOOLEAN: 'on',
+                Column.ColumnType.DATE: '2025-02-01',
+            }[column.data_type]
+            for column in self.table.columns.all()
+        }
+        response = self.client.post(
+            reverse('edit_row', kwargs={'table_pk': self.table.pk, 'row_pk': row.pk}), data
+        )
+        self.assertEqual(response.status_code, 200)
+        values = {cell.column.data_type: cell.value for cell in Cell.objects.filter(row=row)}
+        self.assertEqual(values, {
+            Column.ColumnType.TEXT: 'новый текст',
+            Column.ColumnType.INTEGER: 42,
+            Column.ColumnType.FLOAT: 1.5,
+            Column.ColumnType.BOOLEAN: True,
+            Column.ColumnType.DATE: datetime.date(2025, 2, 1),
+        })
+        self.assertEqual(Cell.objects.filter(table=self.table).count(), 5 * len(Column.ColumnType))
+
+    def test_purge_drops_partition(self):
+        self.client.get(reverse('delete_table', kwargs={'pk': self.table.pk}))
+        run_pending_jobs()
+        self.assertIsNone(self.partition_rows(partition_name(self.table.pk)))
+        self.assertFalse(Table.all_objects.filter(pk=self.table.pk).exists())
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    # Реплика - второе подключение к тестовой БД: данные должны быть зафиксированы, чтобы оно их видело
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        if REPLICA not in connections:
+            connections.settings[REPLICA] = dict(connections['default'].settings_dict)
+            cls.addClassCleanup(cls.remove_replica)
+        super().setUpClass()
+
+    @staticmethod
+    def remove_replica():
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+
+    def setUp(self):
+        self.owner = create_user('owner', 10, 1)
+        self.table = create_table(self.owner, create_user('viewer', 10, 2), self.owner, 3)
+        cache.clear()
+        self.client.force_login(self.owner)
+
+    def reads(self, database):
+        return REGISTRY.get_sample_value(
+            'table_service_replica_reads_total', {'view': 'table_detail', 'database': database}
+        ) or 0
+
+    def assert_read_from(self, database):
+        before = self.reads(database)
+        self.assertEqual(self.client.get(self.table.get_absolute_url()).status_code, 200)
+        self.assertEqual(self.reads(database), before + 1)
+
+    def test_router(self):
+        self.assertEqual(Table.objects.all().db, 'default')
+        with use_replica():
+            self.assertEqual(Table.objects.all().db, REPLICA)
+            self.assertEqual(User.objects.all().db, 'default')
+            self.assertEqual(router.db_for_write(Row, instance=Row.objects.first()), 'default')
+        self.assertEqual(replica_lag(), 0)
+
+    def test_pinned_to_primary_after_write(self):
+        self.assert_read_from(REPLICA)
+
+        column = self.table.columns.first()
+        response = self.client.post(
+            reverse('toggle_column_aggregates', kwargs={'table_pk': self.table.pk, 'column_pk': column.pk})
+        )
+        self.assertIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assert_read_from('default')
+
+        del self.client.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assert_read_from(REPLICA)
+
+    def test_lagging_replica_not_used(self):
+        cache.set(LAG_CACHE_KEY, settings.REPLICA_MAX_LAG_SECONDS + 1)
+        self.assert_read_from('default')
+        body = self.client.get(reverse('metrics')).content.decode()
+        self.assertIn(f'table_service_replica_lag_seconds {settings.REPLICA_MAX_LAG_SECONDS + 1}', body)
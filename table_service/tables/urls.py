@@ -4,18 +4,26 @@ from django.contrib.auth import views as auth_views
 
 from api.views import CurrentUserView
 from . import views
+from .metrics import metrics_view
 
 urlpatterns = [
     path('test/', CurrentUserView.as_view(), name='test'),
+    path('metrics', metrics_view, name='metrics'),
     path('admin/', admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('', views.table_list, name='table_list'),
     path('create/', views.create_table, name='create_table'),
     path('<int:pk>/', views.table_detail, name='table_detail'),
     path('<int:pk>/delete_table', views.delete_table, name='delete_table'),
+    path('<int:pk>/clone/', views.clone_table, name='clone_table'),
     path('<int:pk>/add_column/', views.add_column, name='add_column'),
     path('<int:pk>/add_row/', views.add_row, name='add_row'),
     path('<int:table_pk>/delete_column/<int:column_pk>/', views.delete_column, name='delete_column'),
+    path('<int:table_pk>/convert_column/<int:column_pk>/', views.convert_column, name='convert_column'),
+    path('<int:table_pk>/column_aggregates/<int:column_pk>/', views.toggle_column_aggregates,
+         name='toggle_column_aggregates'),
+    path('<int:table_pk>/move_column/<int:column_pk>/', views.move_column, name='move_column'),
+    path('<int:table_pk>/move_row/<int:row_pk>/', views.move_row, name='move_row'),
     path('<int:table_pk>/delete_row/<int:row_pk>/', views.delete_row, name='delete_row'),
     path('<int:table_pk>/edit_row/<int:row_pk>/', views.edit_row, name='edit_row'),
     path('shared/', views.shared_tables_list, name='shared_tables_list'),
@@ -25,6 +33,14 @@ urlpatterns = [
     path('<int:table_pk>/table_permissions/', views.manage_table_permissions, name='manage_table_permissions'),
     path('<int:table_pk>/unlock_filial/', views.unlock_filial_table, name='unlock_filial_table'),
     path('api/unlock_row/<int:row_pk>/', views.unlock_row_api, name='unlock_row_api'),
+    path('api/jobs/<int:job_pk>/', views.job_status, name='job_status'),
+    path('api/tables/<int:table_pk>/report/', views.table_report_api, name='table_report_api'),
+    path('api/tables/<int:table_pk>/search/', views.search_table_api, name='search_table_api'),
+    path('api/tables/<int:table_pk>/rows/', views.table_rows_api, name='table_rows_api'),
+    path('api/tables/<int:table_pk>/changes/', views.table_changes_api, name='table_changes_api'),
     path('admins/', views.manage_admins, name='manage_admins'),
     path('<int:table_pk>/export/', views.export_table, name='export_table'),
+    path('<int:table_pk>/report/', views.table_report, name='table_report'),
+    path('<int:table_pk>/views/save/', views.save_view, name='save_view'),
+    path('<int:table_pk>/views/<int:view_pk>/delete/', views.delete_view, name='delete_view'),
 ]
@@ -1,35 +1,88 @@
+import csv
 import datetime
+import time
 from django.db import transaction
-from django.db.models import F, Value, TextField, Subquery, OuterRef, Q
-from django.db.models.functions import Concat
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db.models import OuterRef, Exists, Prefetch, prefetch_related_objects
 from django.contrib.auth.models import User
 from django.shortcuts import render, redirect, get_object_or_404, reverse
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponseForbidden
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
 from django.template.loader import render_to_string
 from django_tables2.export import ExportMixin, TableExport
 
 from .models import Table, Column, Row, Cell, RowPermission, Filial, Employee, RowFilialPermission, TablePermission, \
-    TableFilialPermission, TableFilialLock, Admin
-from .forms import TableForm, ColumnForm, RowEditForm, AddRowForm
+    TableFilialPermission, TableFilialLock, Admin, Department, TableDepartmentPermission, BackgroundJob, SavedView, \
+    RowDepartmentPermission
+from .forms import TableForm, ColumnForm, RowEditForm, AddRowForm, ColumnConvertForm, ReportForm, \
+    SavedViewForm, CloneTableForm
 from .service import unlock_row, lock_row
+from .visibility import index_new_row, grant_row_visibility
+from .caching import cached_shared_tables, invalidate_shared_tables
+from .permissions import propagate_table_filial_permission, propagate_row_filial_permission, \
+    propagate_table_department_permission, propagate_row_department_permission
+from .directory import filial_members
+from .conversion import start_column_conversion, active_conversions, CONVERT_COLUMN
+from .ordering import next_order, move_item
+from .purge import soft_delete
+from .cloning import clone_table as copy_table
+from .export import IncrementalExport
+from .changes import CHANGE_FIELDS, row_inserted, row_deleted, cells_updated, get_changes
+from .reports import get_report
+from .search import filter_params, get_filter_fields, get_search_row_ids
+from .grid import GridQuery
+from .row_window import get_row_window
+from .metrics import ROW_LOCK_CONTENTION, EXPORT_BYTES, EXPORT_SECONDS
 from django.contrib import messages
 from django_tables2 import RequestConfig, SingleTableView
 from .tables import DynamicTable, ExportTable
+from .saved_views import SavedViewData
 from django.views.decorators.http import require_POST, require_http_methods
 
+CONVERSION_IN_PROGRESS = 'Идет изменение типа колонки, редактирование таблицы временно недоступно'
+
 
 def save_row_data(table, row, form):
     """Сохраняет данные строки из формы"""
+    old_values = row.cell_values
+    cells = []
     for column in table.columns.all():
-        field_name = f'col_{column.id}'
-        value = form.cleaned_data[field_name]
+        cell = Cell(table=table, row=row, column=column)
+        cell.value = form.cleaned_data[f'col_{column.id}']
+        cells.append(cell)
+    new_values = {cell.column_id: cell.value for cell in cells}
+    with transaction.atomic():
+        # Одна вставка с ON CONFLICT вместо SELECT и UPDATE по id на каждую ячейку:
+        # конфликт ищется по ключу с table_id, то есть только в секции таблицы
+        Cell.objects.bulk_create(
+            cells,
+            update_conflicts=True,
+            unique_fields=['table', 'row', 'column'],
+            update_fields=['text_value', 'integer_value', 'float_value', 'boolean_value', 'date_value'],
+        )
+        cells_updated(row, old_values, new_values)
+    Table.bump_version(table.pk)
+
+
+def grant_default_permissions(table, user):
+    """Права на новую таблицу: создателю и всей администрации"""
+    TablePermission.objects.update_or_create(
+        table=table,
+        user=user,
+        can_view=True
+    )
+
+    administration = filial_members(1910).exclude(id=user.id)
 
-        Cell.objects.update_or_create(
-            row=row,
-            column=column,
-            defaults={'value': value}
+    # Создаем права для всей администрации
+    for admin in administration:
+        TablePermission.objects.update_or_create(
+            table=table,
+            user=admin,
+            can_view=True
         )
+    invalidate_shared_tables([user.id] + [admin.id for admin in administration])
 
 
 @login_required
@@ -50,29 +103,47 @@ def create_table(request):
             table.owner = request.user
             table.created_at = datetime.datetime.now()
             table.save()
+            grant_default_permissions(table, request.user)
 
-            TablePermission.objects.update_or_create(
-                table=table,
-                user=request.user,
-                can_view=True
-            )
+            return redirect('table_detail', pk=table.pk)
+    else:
+        form = TableForm()
+    return render(request, 'tables/create_table.html', {'form': form})
 
-            administration = User.objects.filter(
-                profile__employee__id_filial=1910,
-            ).exclude(id=request.user.id)
 
-            # Создаем права для всей администрации
-            for admin in administration:
-                TablePermission.objects.update_or_create(
-                    table=table,
-                    user=admin,
-                    can_view=True
+@login_required
+def clone_table(request, pk):
+    source = get_object_or_404(Table, pk=pk)
+
+    # Проверка прав
+    if not (source.owner == request.user or source.is_admin(request.user)):
+        return HttpResponseForbidden("Вы не можете копировать эту таблицу")
+
+    if request.method == 'POST':
+        form = CloneTableForm(request.POST)
+        if form.is_valid():
+            if active_conversions(source).exists():
+                messages.error(request, CONVERSION_IN_PROGRESS)
+                return redirect('clone_table', pk=source.pk)
+            with transaction.atomic():
+                table = Table.objects.create(
+                    title=form.cleaned_data['title'],
+                    owner=request.user,
+                    created_at=datetime.datetime.now(),
                 )
+                copy_table(
+                    source, table,
+                    rows=form.cleaned_data['include_rows'],
+                    permissions=form.cleaned_data['include_permissions'],
+                )
+                grant_default_permissions(table, request.user)
+            invalidate_shared_tables(table.permissions.values_list('user_id', flat=True))
 
+            messages.success(request, f'Таблица "{source.title}" скопирована')
             return redirect('table_detail', pk=table.pk)
     else:
-        form = TableForm()
-    return render(request, 'tables/create_table.html', {'form': form})
+        form = CloneTableForm(initial={'title': f'{source.title} (копия)'})
+    return render(request, 'tables/clone_table.html', {'form': form, 'source': source})
 
 
 @login_required
@@ -83,7 +154,9 @@ def delete_table(request, pk):
     if not (table.owner == request.user or table.is_admin(request.user)):
         return HttpResponseForbidden("Вы не можете удалять таблицы")
 
-    table.delete()
+    invalidate_shared_tables(table.permissions.values_list('user_id', flat=True))
+    # Таблица скрывается сразу, строки и ячейки удаляются в фоне
+    soft_delete(table, request.user)
 
     messages.success(request, f'Таблица "{table.title}" успешно удалена')
     return redirect('table_list')
@@ -102,8 +175,10 @@ def add_column(request, pk):
         if form.is_valid():
             column = form.save(commit=False)
             column.table = table
-            column.order = table.columns.count()
-            column.save()
+            with transaction.atomic():
+                column.order = next_order(table, table.columns.all())
+                column.save()
+                Table.bump_version(table.pk)
             messages.success(request, f'Колонка "{column.name}" успешно добавлена')
             return redirect('table_detail', pk=table.pk)
     else:
@@ -148,104 +223,129 @@ def manage_row_permissions(request, table_pk, row_pk):
         return HttpResponseForbidden("Только владелец строки может управлять правами")
 
     if request.method == 'POST':
-        if 'update_submit' in request.POST:
-            # Обработка существующих пользователей
-            for perm in row.permissions.all():
-                user_id = str(perm.user.id)
-                perm.can_edit = f'can_edit_{user_id}' in request.POST
-                perm.can_delete = f'can_delete_{user_id}' in request.POST
-                perm.save()
-
-        # Обработка новых пользователей
-        if 'add_users_submit' in request.POST:
-            new_users = request.POST.getlist('new_users')
-            if new_users:
-                can_edit = 'new_can_edit' in request.POST
-                can_delete = 'new_can_delete' in request.POST
-                for user_id in new_users:
-                    user = get_object_or_404(User, pk=user_id)
-                    RowPermission.objects.update_or_create(
-                        row=row,
-                        user=user,
-                        defaults={
-                            'can_edit': can_edit,
-                            'can_delete': can_delete,
-                        }
-                    )
-
-        if 'update_submit_fil' in request.POST:
-            # Обработка существующих филиалов
-            for f_perm in row.filial_permissions.all():
-                filial_id = str(f_perm.filial.id)
-                f_perm.can_edit = f'filial_can_edit_{filial_id}' in request.POST
-                f_perm.can_delete = f'filial_can_delete_{filial_id}' in request.POST
-
-                users_from_filial = User.objects.filter(
-                    profile__employee__id_filial=filial_id
-                )
-
-                for user in users_from_filial:
-                    # Обработка добавления пользователей для филиалов
-                    RowPermission.objects.update_or_create(
-                        row=row,
-                        user=user,
-                        defaults={
-                            'can_edit': f_perm.can_edit,
-                            'can_delete': f_perm.can_delete,
-                        }
-                    )
-
-                f_perm.save()
-
-        if 'add_filials_submit' in request.POST:
-            new_filials = request.POST.getlist('new_filials')
-            if new_filials:
-                filial_can_edit = 'new_filial_can_edit' in request.POST
-                filial_can_delete = 'new_filial_can_delete' in request.POST
-                for filial_id in new_filials:
-                    filial = get_object_or_404(Filial, pk=filial_id)
-                    RowFilialPermission.objects.update_or_create(
-                        row=row,
-                        filial=filial,
-                        defaults={
-                            'can_edit': filial_can_edit,
-                            'can_delete': filial_can_delete,
-                        }
-                    )
-                    # Применяем права ко всем пользователям филиала
-                    users = User.objects.filter(
-                        profile__employee__id_filial=filial.id
-                    ).exclude(
-                        pk__in=row.permissions.values_list('user__id', flat=True)
-                    )
-
-                    for user in users:
+        affected_users = set()
+        with transaction.atomic():
+            if 'update_submit' in request.POST:
+                # Обработка существующих пользователей
+                for perm in row.permissions.all():
+                    user_id = str(perm.user_id)
+                    perm.can_edit = f'can_edit_{user_id}' in request.POST
+                    perm.can_delete = f'can_delete_{user_id}' in request.POST
+                    perm.save()
+
+            # Обработка новых пользователей
+            if 'add_users_submit' in request.POST:
+                new_users = request.POST.getlist('new_users')
+                if new_users:
+                    can_edit = 'new_can_edit' in request.POST
+                    can_delete = 'new_can_delete' in request.POST
+                    for user_id in new_users:
+                        user = get_object_or_404(User, pk=user_id)
                         RowPermission.objects.update_or_create(
                             row=row,
                             user=user,
+                            defaults={
+                                'can_edit': can_edit,
+                                'can_delete': can_delete,
+                            }
+                        )
+                    grant_row_visibility(row, new_users)
+
+            if 'update_submit_fil' in request.POST:
+                # Обработка существующих филиалов: права пользователей филиала обновляются одним запросом
+                for f_perm in row.filial_permissions.all():
+                    filial_id = str(f_perm.filial_id)
+                    f_perm.can_edit = f'filial_can_edit_{filial_id}' in request.POST
+                    f_perm.can_delete = f'filial_can_delete_{filial_id}' in request.POST
+                    f_perm.save()
+
+                    users = propagate_row_filial_permission(row, f_perm.filial_id, f_perm.can_edit, f_perm.can_delete)
+                    grant_row_visibility(row, users)
+                    affected_users.update(users)
+
+            if 'add_filials_submit' in request.POST:
+                new_filials = request.POST.getlist('new_filials')
+                if new_filials:
+                    filial_can_edit = 'new_filial_can_edit' in request.POST
+                    filial_can_delete = 'new_filial_can_delete' in request.POST
+                    for filial_id in new_filials:
+                        filial = get_object_or_404(Filial, pk=filial_id)
+                        RowFilialPermission.objects.update_or_create(
+                            row=row,
+                            filial=filial,
                             defaults={
                                 'can_edit': filial_can_edit,
                                 'can_delete': filial_can_delete,
                             }
                         )
+                        # Применяем права ко всем пользователям филиала, у которых их еще нет
+                        users = propagate_row_filial_permission(
+                            row, filial.id, filial_can_edit, filial_can_delete, overwrite=False
+                        )
+                        grant_row_visibility(row, users)
+                        affected_users.update(users)
+
+            if 'update_submit_dep' in request.POST:
+                # Права подразделений распространяются на все вложенные подразделения
+                for d_perm in row.department_permissions.all():
+                    department_id = str(d_perm.department_id)
+                    d_perm.can_edit = f'department_can_edit_{department_id}' in request.POST
+                    d_perm.can_delete = f'department_can_delete_{department_id}' in request.POST
+                    d_perm.save()
+
+                    users = propagate_row_department_permission(
+                        row, d_perm.department_id, d_perm.can_edit, d_perm.can_delete
+                    )
+                    grant_row_visibility(row, users)
+                    affected_users.update(users)
+
+            if 'add_departments_submit' in request.POST:
+                new_departments = request.POST.getlist('new_departments')
+                if new_departments:
+                    department_can_edit = 'new_department_can_edit' in request.POST
+                    department_can_delete = 'new_department_can_delete' in request.POST
+                    for department_id in new_departments:
+                        department = get_object_or_404(Department, pk=department_id)
+                        RowDepartmentPermission.objects.update_or_create(
+                            row=row,
+                            department=department,
+                            defaults={
+                                'can_edit': department_can_edit,
+                                'can_delete': department_can_delete,
+                            }
+                        )
+                        # Применяем права ко всем пользователям поддерева, у которых их еще нет
+                        users = propagate_row_department_permission(
+                            row, department.id, department_can_edit, department_can_delete, overwrite=False
+                        )
+                        grant_row_visibility(row, users)
+                        affected_users.update(users)
 
-        messages.success(request, 'Обновление прав успешно!')
+            invalidate_shared_tables(row.permissions.values_list('user_id', flat=True))
+        if affected_users:
+            messages.success(request, f'Обновление прав успешно! Затронуто пользователей филиалов и подразделений: {len(affected_users)}')
+        else:
+            messages.success(request, 'Обновление прав успешно!')
         return redirect('manage_row_permissions', table_pk=table.pk, row_pk=row.pk)
 
     # Получаем текущие разрешения для строки
     permissions = row.permissions.all()
     filial_permissions = row.filial_permissions.all()
+    department_permissions = row.department_permissions.select_related('department')
 
     all_users = User.objects.exclude(pk=table.owner.pk)
     all_filials = Filial.objects.exclude(id=1910)
+    all_departments = Department.objects.filter(end_date__isnull=True).order_by('name')
 
     return render(request, 'tables/manage_permissions.html', {
         'table': table,
         'row': row,
         'permissions': permissions,
         'filial_permissions': filial_permissions,
+        'department_permissions': department_permissions,
         'all_users': all_users,
-        'all_filials': all_filials
+        'all_filials': all_filials,
+        'all_departments': all_departments
     })
 
 
@@ -257,95 +357,112 @@ def manage_table_permissions(request, table_pk):
         return HttpResponseForbidden("Только владелец таблицы может редактировать права на таблицу")
 
     if request.method == 'POST':
-        if 'update_submit' in request.POST:
-            # Обработка существующих пользователей
-            for perm in table.permissions.all():
-                user_id = str(perm.user.id)
-                perm.can_view = f'can_view_{user_id}' in request.POST
-                perm.save()
-
-        # Обработка новых пользователей
-        if 'add_users_submit' in request.POST:
-            new_users = request.POST.getlist('new_users')
-            if new_users:
-                can_view = 'new_can_view' in request.POST
-                for user_id in new_users:
-                    user = get_object_or_404(User, pk=user_id)
-                    TablePermission.objects.update_or_create(
-                        table=table,
-                        user=user,
-                        defaults={
-                            'can_view': can_view,
-                        }
-                    )
-
-        if 'update_submit_fil' in request.POST:
-            # Обработка существующих филиалов
-            for f_perm in table.filial_permissions.all():
-                filial_id = str(f_perm.filial.id)
-                f_perm.can_view = f'filial_can_view_{filial_id}' in request.POST
+        affected_users = set()
+        with transaction.atomic():
+            if 'update_submit' in request.POST:
+                # Обработка существующих пользователей
+                for perm in table.permissions.all():
+                    user_id = str(perm.user_id)
+                    perm.can_view = f'can_view_{user_id}' in request.POST
+                    perm.save()
+
+            # Обработка новых пользователей
+            if 'add_users_submit' in request.POST:
+                new_users = request.POST.getlist('new_users')
+                if new_users:
+                    can_view = 'new_can_view' in request.POST
+                    for user_id in new_users:
+                        user = get_object_or_404(User, pk=user_id)
+                        TablePermission.objects.update_or_create(
+                            table=table,
+                            user=user,
+                            defaults={
+                                'can_view': can_view,
+                            }
+                        )
 
-                users_from_filial = User.objects.filter(
-                    profile__employee__id_filial=filial_id
-                )
+            if 'update_submit_fil' in request.POST:
+                # Обработка существующих филиалов: права пользователей филиала обновляются одним запросом
+                for f_perm in table.filial_permissions.all():
+                    filial_id = str(f_perm.filial_id)
+                    f_perm.can_view = f'filial_can_view_{filial_id}' in request.POST
+                    f_perm.save()
 
-                for user in users_from_filial:
-                    # Обработка добавления пользователей для филиалов
-                    TablePermission.objects.update_or_create(
-                        table=table,
-                        user=user,
-                        defaults={
-                            'can_view': f_perm.can_view,
-                        }
+                    affected_users.update(
+                        propagate_table_filial_permission(table, f_perm.filial_id, f_perm.can_view)
                     )
 
-                f_perm.save()
+            if 'add_filials_submit' in request.POST:
+                new_filials = request.POST.getlist('new_filials')
+                if new_filials:
+                    filial_can_view = 'new_filial_can_view' in request.POST
+                    for filial_id in new_filials:
+                        filial = get_object_or_404(Filial, pk=filial_id)
+                        TableFilialPermission.objects.update_or_create(
+                            table=table,
+                            filial=filial,
+                            defaults={
+                                'can_view': filial_can_view,
+                            }
+                        )
+                        # Применяем права ко всем пользователям филиала, у которых их еще нет
+                        affected_users.update(
+                            propagate_table_filial_permission(table, filial.id, filial_can_view, overwrite=False)
+                        )
+
+            if 'update_submit_dep' in request.POST:
+                # Права подразделений распространяются на все вложенные подразделения
+                for d_perm in table.department_permissions.all():
+                    d_perm.can_view = f'department_can_view_{d_perm.department_id}' in request.POST
+                    d_perm.save()
 
-        if 'add_filials_submit' in request.POST:
-            new_filials = request.POST.getlist('new_filials')
-            if new_filials:
-                filial_can_view = 'new_filial_can_view' in request.POST
-                for filial_id in new_filials:
-                    filial = get_object_or_404(Filial, pk=filial_id)
-                    TableFilialPermission.objects.update_or_create(
-                        table=table,
-                        filial=filial,
-                        defaults={
-                            'can_view': filial_can_view,
-                        }
-                    )
-                    # Применяем права ко всем пользователям филиала
-                    users = User.objects.filter(
-                        profile__employee__id_filial=filial.id
-                    ).exclude(
-                        pk__in=table.permissions.values_list('user__id', flat=True)
+                    affected_users.update(
+                        propagate_table_department_permission(table, d_perm.department_id, d_perm.can_view)
                     )
 
-                    for user in users:
-                        TablePermission.objects.update_or_create(
+            if 'add_departments_submit' in request.POST:
+                new_departments = request.POST.getlist('new_departments')
+                if new_departments:
+                    department_can_view = 'new_department_can_view' in request.POST
+                    for department_id in new_departments:
+                        department = get_object_or_404(Department, pk=department_id)
+                        TableDepartmentPermission.objects.update_or_create(
                             table=table,
-                            user=user,
+                            department=department,
                             defaults={
-                                'can_view': filial_can_view,
+                                'can_view': department_can_view,
                             }
                         )
+                        affected_users.update(
+                            propagate_table_department_permission(
+                                table, department.id, department_can_view, overwrite=False
+                            )
+                        )
 
-        messages.success(request, 'Обновление прав успешно!')
+            invalidate_shared_tables(table.permissions.values_list('user_id', flat=True))
+        if affected_users:
+            messages.success(request, f'Обновление прав успешно! Затронуто пользователей: {len(affected_users)}')
+        else:
+            messages.success(request, 'Обновление прав успешно!')
         return redirect('manage_table_permissions', table_pk=table.pk)
 
     # Получаем текущие разрешения для таблицы
     permissions = table.permissions.all()
     filial_permissions = table.filial_permissions.all()
+    department_permissions = table.department_permissions.select_related('department')
 
     all_users = User.objects.exclude(pk=table.owner.pk)
     all_filials = Filial.objects.exclude(id=1910)
+    all_departments = Department.objects.filter(end_date__isnull=True).order_by('name')
 
     return render(request, 'tables/manage_table_permissions.html', {
         'table': table,
         'permissions': permissions,
         'filial_permissions': filial_permissions,
+        'department_permissions': department_permissions,
         'all_users': all_users,
-        'all_filials': all_filials
+        'all_filials': all_filials,
+        'all_departments': all_departments
     })
 
 
@@ -360,10 +477,6 @@ def revoke_redact_rows(request, share_token):
         # Применяем права ко всем пользователям филиала
         filial_id = request.user.profile.employee.id_filial
         filial = Filial.objects.get(id=filial_id)
-        users = User.objects.filter(
-            profile__employee__id_filial=filial_id
-        )
-
         rows = table.rows.all()
 
         with transaction.atomic():
@@ -385,7 +498,7 @@ def revoke_redact_rows(request, share_token):
                 }
             )
 
-            users_from_filial = User.objects.filter(profile__employee__id_filial=filial_id)
+            users_from_filial = filial_members(filial_id)
 
             # Получаем все существующие разрешения
             existing_permissions = RowPermission.objects.filter(
@@ -400,6 +513,7 @@ def revoke_redact_rows(request, share_token):
 
             RowPermission.objects.bulk_update(existing_permissions, ['can_edit', 'can_delete'])
 
+        invalidate_shared_tables(users_from_filial.values_list('id', flat=True))
         messages.success(request, f'Права редактирования для филиала {filial.name} сняты со всех строк')
         return redirect('shared_table_view', share_token=table.share_token)
 
@@ -417,13 +531,100 @@ def delete_column(request, table_pk, column_pk):
     if not (table.owner == request.user or table.is_admin(request.user)):
         return HttpResponseForbidden("Вы не можете удалять колонки из этой таблицы")
 
-    Cell.objects.filter(column=column).delete()
-    column.delete()
+    # Колонка скрывается сразу, ячейки удаляются в фоне
+    soft_delete(column, request.user)
 
     messages.success(request, f'Колонка "{column.name}" успешно удалена')
     return redirect('table_detail', pk=table.pk)
 
 
+@require_POST
+@login_required
+def toggle_column_aggregates(request, table_pk, column_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+    column = get_object_or_404(Column, pk=column_pk, table=table)
+
+    # Проверка прав
+    if not (table.owner == request.user or table.is_admin(request.user)):
+        return HttpResponseForbidden("Вы не можете менять колонки этой таблицы")
+
+    column.show_aggregates = not column.show_aggregates
+    column.save(update_fields=['show_aggregates'])
+    return redirect('table_detail', pk=table.pk)
+
+
+@login_required
+def convert_column(request, table_pk, column_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+    column = get_object_or_404(Column, pk=column_pk, table=table)
+
+    # Проверка прав
+    if not (table.owner == request.user or table.is_admin(request.user)):
+        return HttpResponseForbidden("Вы не можете менять тип колонок этой таблицы")
+
+    if request.method == 'POST':
+        form = ColumnConvertForm(request.POST, column=column)
+        if form.is_valid():
+            if active_conversions(table).exists():
+                messages.error(request, 'Дождитесь завершения текущего изменения типа колонки')
+            else:
+                start_column_conversion(column, form.cleaned_data['data_type'], request.user)
+                messages.success(request, f'Изменение типа колонки "{column.name}" поставлено в очередь')
+            return redirect('convert_column', table_pk=table.pk, column_pk=column.pk)
+    else:
+        form = ColumnConvertForm(column=column)
+
+    job = table.jobs.filter(kind=CONVERT_COLUMN, params__column_id=column.pk).order_by('-id').first()
+    failures = job.conversion_failures.order_by('id')[:100] if job else []
+    return render(request, 'tables/convert_column/convert_column.html', {
+        'form': form,
+        'table': table,
+        'column': column,
+        'job': job,
+        'failures': failures,
+    })
+
+
+def get_move_target(request, siblings):
+    """Соседи для перемещения из POST: before - поставить перед, after - поставить после"""
+    before_pk, after_pk = request.POST.get('before'), request.POST.get('after')
+    before = get_object_or_404(siblings, pk=before_pk) if before_pk else None
+    after = get_object_or_404(siblings, pk=after_pk) if after_pk else None
+    return before, after
+
+
+@require_POST
+@login_required
+def move_row(request, table_pk, row_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+    row = get_object_or_404(Row, pk=row_pk, table=table)
+
+    # Проверка прав
+    if not (table.owner == request.user or table.is_admin(request.user)):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на изменение порядка строк'}, status=403)
+
+    before, after = get_move_target(request, table.rows.all())
+    if row not in (before, after):
+        move_item(row, table.rows.all(), before=before, after=after)
+    return JsonResponse({'status': 'success', 'order': row.order})
+
+
+@require_POST
+@login_required
+def move_column(request, table_pk, column_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+    column = get_object_or_404(Column, pk=column_pk, table=table)
+
+    # Проверка прав
+    if not (table.owner == request.user or table.is_admin(request.user)):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на изменение порядка колонок'}, status=403)
+
+    before, after = get_move_target(request, table.columns.all())
+    if column not in (before, after):
+        move_item(column, table.columns.all(), before=before, after=after)
+    return JsonResponse({'status': 'success', 'order': column.order})
+
+
 @login_required
 def delete_row(request, table_pk, row_pk):
     table = get_object_or_404(Table, pk=table_pk)
@@ -433,7 +634,10 @@ def delete_row(request, table_pk, row_pk):
     if not row.has_delete_permission(request.user):
         return JsonResponse({'status': 'error', 'message': 'Нет прав на удаление'}, status=403)
 
-    row.delete()
+    with transaction.atomic():
+        row_deleted(row)
+        row.delete()
+    Table.bump_version(table.pk)
     messages.success(request, 'Строка успешно удалена')
 
     if request.user == table.owner:
@@ -442,6 +646,24 @@ def delete_row(request, table_pk, row_pk):
         return redirect('shared_table_view', share_token=table.share_token)
 
 
+@login_required
+def job_status(request, job_pk):
+    """Прогресс фоновой задачи (удаление, изменение типа колонки и т.п.)"""
+    job = get_object_or_404(BackgroundJob, pk=job_pk)
+    if not (job.created_by == request.user or Admin.objects.filter(user=request.user).exists()):
+        return JsonResponse({'status': 'error', 'message': 'Нет доступа к задаче'}, status=403)
+    return JsonResponse({
+        'status': 'success',
+        'job': {
+            'kind': job.kind,
+            'status': job.status,
+            'processed': job.processed,
+            'failed': job.failed,
+            'error': job.error,
+        }
+    })
+
+
 @require_POST
 @login_required
 def unlock_row_api(request, row_pk):
@@ -457,6 +679,8 @@ def edit_row(request, table_pk, row_pk):
     row = get_object_or_404(Row, pk=row_pk, table=table)
     if not row.has_edit_permission(request.user):
         return JsonResponse({'status': 'error', 'message': 'Нет прав на редактирование'}, status=403)
+    if active_conversions(table).exists():
+        return JsonResponse({'status': 'error', 'message': CONVERSION_IN_PROGRESS}, status=423)
 
     if request.method == 'POST':
         form = RowEditForm(request.POST, row=row)
@@ -471,6 +695,7 @@ def edit_row(request, table_pk, row_pk):
 
     lock, lock_user = lock_row(row, request.user)
     if not lock:
+        ROW_LOCK_CONTENTION.inc()
         return JsonResponse({
             'status': 'error',
             'message': f'Строка сейчас редактируется другим пользователем: {lock_user}'
@@ -492,76 +717,85 @@ def add_row(request, pk):
 
     if not table.has_view_permission(request.user) or not table.has_add_permission:
         return HttpResponseForbidden("Вы не можете добавлять строки в эту таблицу")
+    if active_conversions(table).exists():
+        return JsonResponse({'status': 'error', 'message': CONVERSION_IN_PROGRESS}, status=423)
 
     if request.method == 'POST':
         form = AddRowForm(request.POST, table=table)
         if form.is_valid():
 
-            # Создаем новую строку
-            row = Row.objects.create(
-                table=table,
-                order=table.rows.count(),  # Порядковый номер новой строки
-                created_by=request.user
-            )
+            with transaction.atomic():
+                # Создаем новую строку
+                row = Row.objects.create(
+                    table=table,
+                    order=next_order(table, table.rows.all()),  # В конец таблицы
+                    created_by=request.user,
+                    **Row.creator_fields(request.user)
+                )
 
-            RowPermission.objects.create(
-                row=row,
-                user=request.user,
-                can_edit=True,
-                can_delete=True,
-            )
+                RowPermission.objects.create(
+                    row=row,
+                    user=request.user,
+                    can_edit=True,
+                    can_delete=True,
+                )
 
-            user_filial = request.user.profile.employee.id_filial
+                user_filial = row.creator_filial_id
+                index_new_row(row, user_filial)
 
-            if user_filial:
-                if user_filial != 1910:
-                    # Добавляем права для филиала создателя
-                    filial = get_object_or_404(Filial, pk=user_filial)
-                    RowFilialPermission.objects.update_or_create(
-                        row=row,
-                        filial=filial,
-                        defaults={
-                            'can_edit': True,
-                            'can_delete': True,
-                        }
-                    )
+                if user_filial:
+                    if user_filial != 1910:
+                        # Добавляем права для филиала создателя
+                        filial = get_object_or_404(Filial, pk=user_filial)
+                        RowFilialPermission.objects.update_or_create(
+                            row=row,
+                            filial=filial,
+                            defaults={
+                                'can_edit': True,
+                                'can_delete': True,
+                            }
+                        )
+
+                        colleagues = filial_members(user_filial).exclude(id=request.user.id)
 
-                    colleagues = User.objects.filter(
-                        profile__employee__id_filial=user_filial,
-                    ).exclude(id=request.user.id)
+                        # Создаем права для всех коллег
+                        for colleague in colleagues:
+                            RowPermission.objects.update_or_create(
+                                row=row,
+                                user=colleague,
+                                can_edit=True,  # Могут редактировать
+                                can_delete=True  # Могут удалять
+                            )
+                        grant_row_visibility(row, [colleague.id for colleague in colleagues])
 
-                    # Создаем права для всех коллег
-                    for colleague in colleagues:
+                    administration = filial_members(1910).exclude(id=request.user.id)
+
+                    # Создаем права для всей администрации
+                    for admin in administration:
                         RowPermission.objects.update_or_create(
                             row=row,
-                            user=colleague,
-                            can_edit=True,  # Могут редактировать
-                            can_delete=True  # Могут удалять
+                            user=admin,
+                            can_edit=True,
+                            can_delete=True
                         )
+                    grant_row_visibility(row, [admin.id for admin in administration])
+
+                invalidate_shared_tables(row.permissions.values_list('user_id', flat=True))
 
-                administration = User.objects.filter(
-                    profile__employee__id_filial=1910,
-                ).exclude(id=request.user.id)
+                # Заполняем ячейки данными из формы
+                values = {}
+                for column in table.columns.all():
+                    field_name = f'col_{column.id}'
+                    value = form.cleaned_data.get(field_name)
 
-                # Создаем права для всей администрации
-                for admin in administration:
-                    RowPermission.objects.update_or_create(
+                    cell = Cell.objects.create(
+                        table=table,
                         row=row,
-                        user=admin,
-                        can_edit=True,
-                        can_delete=True
+                        column=column,
+                        value=value
                     )
-
-            # Заполняем ячейки данными из формы
-            for column in table.columns.all():
-                field_name = f'col_{column.id}'
-                value = form.cleaned_data.get(field_name)
-
-                Cell.objects.create(
-                    row=row,
-                    column=column,
-                    value=value
-                )
+                    values[column.id] = cell.value
+                row_inserted(row, values)
 
             messages.success(request, 'Новая строка успешно добавлена')
             return JsonResponse({'status': 'success'})
@@ -578,38 +812,32 @@ def add_row(request, pk):
 
 @login_required
 def shared_tables_list(request):
-    # Получаем все таблицы, к которым у пользователя есть доступ
-    shared_tables = Table.get_shared_tables(request.user)
-
-    # Добавляем информацию о правах для каждой таблицы
-    tables_with_access = []
-    for table in shared_tables:
-        if table.owner == request.user:
-            is_owner = True
-        else:
-            is_owner = False
-
-        can_edit = is_owner or RowPermission.objects.filter(
-            row__table=table,
-            user=request.user,
-            can_edit=True
-        ).exists()
-        can_delete = is_owner or RowPermission.objects.filter(
-            row__table=table,
-            user=request.user,
-            can_delete=True
-        ).exists()
-
-        tables_with_access.append({
-            'table': table,
-            'is_owner': is_owner,
-            'can_edit': can_edit,
-            'can_delete': can_delete,
-            'shared_by': table.owner.username
-        })
+    def build():
+        # Все таблицы, к которым у пользователя есть доступ, вместе с правами - одним запросом
+        rights = RowPermission.objects.filter(row__table=OuterRef('pk'), user=request.user)
+        shared_tables = Table.get_shared_tables(request.user).annotate(
+            any_can_edit=Exists(rights.filter(can_edit=True)),
+            any_can_delete=Exists(rights.filter(can_delete=True)),
+        ).order_by('title', 'pk')
+
+        tables_with_access = []
+        for table in shared_tables:
+            is_owner = table.owner_id == request.user.pk
+            tables_with_access.append({
+                'table': table,
+                'is_owner': is_owner,
+                'can_edit': is_owner or table.any_can_edit,
+                'can_delete': is_owner or table.any_can_delete,
+                'shared_by': table.owner.username
+            })
+        return tables_with_access
+
+    tables_with_access = cached_shared_tables(request.user, build)
+    page = Paginator(tables_with_access, settings.SHARED_TABLES_PER_PAGE).get_page(request.GET.get('page'))
 
     return render(request, 'tables/shared_tables_list.html', {
-        'tables': tables_with_access
+        'tables': page.object_list,
+        'page_obj': page
     })
 
 #НУЖНО ПОЛНОСТЬЮ ПЕРЕДЕЛАТЬ
@@ -633,20 +861,10 @@ def table_detail(request, pk):
     if not (table_obj.owner == request.user or table_obj.is_admin(request.user)):
         return HttpResponseForbidden("You don't have permission to access this table.")
 
-    queryset = table_obj.rows.all().prefetch_related('cells', 'cells__column')
-
-    queryset, search_query = filter_func(queryset, request, table_obj)
-
-    # Добавляем аннотации для каждого столбца
-    queryset = sort_func(queryset, table_obj)
-
-    table = DynamicTable(data=queryset, table_obj=table_obj, request=request)
-    RequestConfig(request).configure(table)
     return render(request, 'tables/table_detail.html', {
         'table_obj': table_obj,
-        'table': table,
         'is_admin': table_obj.is_admin(request.user),
-        'search_query': search_query
+        **grid_context(request, table_obj, table_obj.rows.all()),
     })
 
 
@@ -657,25 +875,114 @@ def shared_table_view(request, share_token):
     if not table.has_view_permission(request.user):
         return HttpResponseForbidden("У вас нет прав на просмотр этой таблицы")
 
-    # Получаем строки, которые пользователь может видеть
-    rows = Row.get_visible_rows(request.user, table)
-
-    rows, search_query = filter_func(rows, request, table)
-
-    queryset = sort_func(rows, table)
-    table_view = DynamicTable(data=queryset, table_obj=table, request=request)
-    RequestConfig(request).configure(table_view)
-
     return render(request, 'tables/shared_table.html', {
         'table_obj': table,
-        'table': table_view,
         'is_owner': table.owner == request.user,
         'is_admin': table.is_admin(request.user),
         'is_add_permission': table.has_add_permission(request.user),
-        'search_query': search_query
+        # Получаем строки, которые пользователь может видеть
+        **grid_context(request, table, Row.get_visible_rows(request.user, table)),
     })
 
 
+def grid_context(request, table_obj, rows):
+    """Сетка строк: сохраненное представление (?view=) или поиск, фильтры и сортировка из запроса.
+
+    При ?grid=virtual строки не отрисовываются на сервере - их окнами подгружает virtual_grid.js.
+    """
+    # Колонки читаются один раз: их перебирают поиск, сортировка, сетка и форма представления
+    prefetch_related_objects([table_obj], 'columns')
+    saved_view = None
+    grid_plan = None
+    if request.GET.get('grid') == 'virtual' and not request.GET.get('view'):
+        # Строки запрашивает браузер окнами из table_rows_api, на сервере сетка не строится
+        return {
+            'table': None,
+            'virtual_grid': True,
+            'search_query': request.GET.get('q', ''),
+            'grid_plan': None,
+            **saved_views_context(request, table_obj, saved_view),
+        }
+    if request.GET.get('view'):
+        saved_view = get_object_or_404(SavedView, pk=request.GET['view'], table=table_obj, user=request.user)
+        table = DynamicTable(
+            data=SavedViewData(saved_view, rows, request.user),
+            table_obj=table_obj,
+            request=request,
+            visible_columns=saved_view.columns,
+        )
+        search_query = saved_view.search_query
+    else:
+        plan = GridQuery(table_obj, request.GET)
+        table = DynamicTable(
+            data=plan.apply(Row.prefetch_for_grid(rows, request.user, table_obj)), table_obj=table_obj, request=request
+        )
+        search_query = plan.search_query
+        grid_plan = plan.describe() if settings.DEBUG else None
+    RequestConfig(request).configure(table)
+    return {
+        'table': table,
+        'search_query': search_query,
+        'grid_plan': grid_plan,
+        **saved_views_context(request, table_obj, saved_view),
+    }
+
+
+def saved_views_context(request, table_obj, saved_view):
+    """Фильтры по колонкам, сохраненные представления пользователя и форма сохранения текущих поиска,
+    фильтров и сортировки"""
+    return {
+        'column_filter_fields': get_filter_fields(table_obj.columns.all(), request.GET),
+        'filter_params': filter_params(request.GET),
+        'saved_view': saved_view,
+        'saved_views': table_obj.saved_views.filter(user=request.user),
+        'saved_view_form': SavedViewForm(table=table_obj, initial={
+            'search_query': request.GET.get('q', ''),
+            'sort': request.GET.get('sort', ''),
+        }),
+    }
+
+
+@require_POST
+@login_required
+def save_view(request, table_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return HttpResponseForbidden("У вас нет прав на просмотр этой таблицы")
+
+    saved_view = table.saved_views.filter(user=request.user, name=request.POST.get('name')).first()
+    form = SavedViewForm(request.POST, instance=saved_view, table=table)
+    if form.is_valid():
+        saved_view = form.save(commit=False)
+        saved_view.table = table
+        saved_view.user = request.user
+        saved_view.filters = filter_params(request.POST)
+        saved_view.save()
+        messages.success(request, f'Представление "{saved_view.name}" сохранено')
+        return redirect(f'{table_grid_url(request, table)}?view={saved_view.pk}')
+
+    messages.error(request, 'Не удалось сохранить представление')
+    return redirect(table_grid_url(request, table))
+
+
+@require_POST
+@login_required
+def delete_view(request, table_pk, view_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+    saved_view = get_object_or_404(SavedView, pk=view_pk, table=table, user=request.user)
+    saved_view.delete()
+    messages.success(request, f'Представление "{saved_view.name}" удалено')
+    return redirect(table_grid_url(request, table))
+
+
+def table_grid_url(request, table):
+    """Страница таблицы для пользователя: владельцу и администраторам - редактирование"""
+    if table.owner == request.user or table.is_admin(request.user):
+        return reverse('table_detail', kwargs={'pk': table.pk})
+    return reverse('shared_table_view', kwargs={'share_token': table.share_token})
+
+
 @login_required
 def unlock_filial_table(request, table_pk):
     table = get_object_or_404(Table, pk=table_pk)
@@ -690,7 +997,7 @@ def unlock_filial_table(request, table_pk):
             with transaction.atomic():
                 try:
                     filial = Filial.objects.get(id=filial_id)
-                    users_from_filial = User.objects.filter(profile__employee__id_filial=filial_id)
+                    users_from_filial = filial_members(filial_id)
                     rows = Row.objects.filter(table=table)
 
                     # Получаем все существующие разрешения
@@ -705,6 +1012,7 @@ def unlock_filial_table(request, table_pk):
                         perm.can_delete = can_delete
 
                     RowPermission.objects.bulk_update(existing_permissions, ['can_edit', 'can_delete'])
+                    invalidate_shared_tables(users_from_filial.values_list('id', flat=True))
 
                     TableFilialLock.objects.filter(
                         table=table,
@@ -729,110 +1037,157 @@ def export_table(request, table_pk):
     if not (table_obj.owner == request.user or table_obj.is_admin(request.user)):
         return HttpResponseForbidden("Вы не можете скачать таблицу")
 
-    queryset = table_obj.rows.all().prefetch_related('cells', 'cells__column')
+    queryset = table_obj.rows.all().prefetch_related(
+        Prefetch('cells', queryset=Cell.objects.filter(table=table_obj)), 'cells__column'
+    )
+
+    incremental = None
+    if request.GET.get('incremental'):
+        try:
+            incremental = IncrementalExport(table_obj, request.user, request.GET)
+        except ValueError:
+            return HttpResponse('Неверная метка выгрузки (since или since_time)', status=400)
+        queryset = incremental.rows(queryset)
 
-    table = ExportTable(data=queryset, table_obj=table_obj, request=request)
+    table = ExportTable(data=queryset, table_obj=table_obj, request=request, incremental=incremental is not None)
 
     RequestConfig(request).configure(table)
 
     export_format = request.GET.get("_export", None)
     if TableExport.is_valid_format(export_format):
+        start = time.perf_counter()
         exporter = TableExport(export_format, table)
-        return exporter.response(f"table.{export_format}")
+        response = exporter.response(f"table.{export_format}")
+        EXPORT_SECONDS.labels(format=export_format).observe(time.perf_counter() - start)
+        EXPORT_BYTES.labels(format=export_format).observe(len(response.content))
+        if incremental is not None:
+            incremental.save_watermark()
+            response['X-Export-Watermark'] = incremental.watermark
+        return response
 
     return render(request, "tables/export/export_table.html", {
-        "table": table
+        "table": table,
+        "table_obj": table_obj,
+        "incremental": incremental,
     })
 
 
-def filter_func(queryset, request, table_obj):
-    search_query = request.GET.get('q', '')
-    if search_query:
-        # Создаем условие для поиска по всем колонкам
-        column_conditions = Q()
-        for column in table_obj.columns.all():
-            column_conditions |= Q(cells__column=column, cells__text_value__icontains=search_query)
-            if column.data_type == Column.ColumnType.INTEGER:
-                try:
-                    int_value = int(search_query)
-                    column_conditions |= Q(cells__column=column, cells__integer_value=int_value)
-                except ValueError:
-                    pass
-            elif column.data_type == Column.ColumnType.FLOAT:
-                try:
-                    float_value = float(search_query)
-                    column_conditions |= Q(cells__column=column,
-                                           cells__float_value__gte=float_value - 0.1,
-                                           cells__float_value__lte=float_value + 0.1)
-                except ValueError:
-                    pass
-            elif column.data_type == Column.ColumnType.BOOLEAN:
-                # Поиск по булевым значениям (true/false, да/нет и т.д.)
-                bool_value = None
-                if search_query.lower() in ['true', 'да', 'yes', '1', 'истина']:
-                    bool_value = True
-                elif search_query.lower() in ['false', 'нет', 'no', '0', 'ложь']:
-                    bool_value = False
-
-                if bool_value is not None:
-                    column_conditions |= Q(cells__column=column, cells__boolean_value=bool_value)
-            elif column.data_type == Column.ColumnType.DATE:
-                try:
-                    # Пробуем разные форматы дат
-                    date_formats = ['%Y-%m-%d', '%d.%m.%Y', '%d/%m/%Y', '%m/%d/%Y']
-                    parsed_date = None
-                    for fmt in date_formats:
-                        try:
-                            parsed_date = datetime.datetime.strptime(search_query, fmt).date()
-                            break
-                        except ValueError:
-                            continue
-
-                    if parsed_date:
-                        column_conditions |= Q(cells__column=column, cells__date_value=parsed_date)
-                except ValueError:
-                    pass
-
-        filter_filial_ids = Filial.objects.filter(
-            Q(name__icontains=search_query) |
-            Q(long_name__icontains=search_query) |
-            Q(short_name__icontains=search_query)
-        ).values_list('id', flat=True)
-
-        queryset = queryset.filter(
-            column_conditions |
-            Q(created_by__profile__employee__firstname__icontains=search_query) |
-            Q(created_by__profile__employee__secondname__icontains=search_query) |
-            Q(created_by__profile__employee__lastname__icontains=search_query) |
-            Q(created_by__profile__employee__id_filial__in=filter_filial_ids)
-        ).distinct()
-
-        return queryset, search_query
-    else:
-        return queryset, search_query
-
-
-def sort_func(queryset, table_obj):
-    queryset = queryset.annotate(
-        user_full_name=Concat(
-            F('created_by__profile__employee__secondname'),
-            Value(' '),
-            F('created_by__profile__employee__firstname'),
-            Value(' '),
-            F('created_by__profile__employee__lastname'),
-            output_field=TextField()
-        ),
-    )
+def report_form(request, table):
+    """Форма отчета из GET; без параметров - группировка по филиалам"""
+    data = request.GET if 'group_by' in request.GET else {'group_by': 'filial', 'function': 'sum'}
+    return ReportForm(data, columns=list(table.columns.all()))
 
-    queryset = queryset.annotate(
-        filial_name=Subquery(
-            Filial.objects.filter(
-                id=OuterRef('created_by__profile__employee__id_filial')
-            ).values('name')[:1],
-            output_field=TextField()  # Указываем тип поля явно
-        )
+
+@login_required
+def table_report(request, table_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return HttpResponseForbidden("У вас нет прав на просмотр этой таблицы")
+
+    form = report_form(request, table)
+    report = get_report(table, request.user, **form.get_report_params()) if form.is_valid() else None
+
+    if report is not None and request.GET.get('format') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="report.csv"'
+        # BOM - чтобы Excel открыл файл в UTF-8
+        response.write('\ufeff')
+        writer = csv.writer(response, delimiter=';')
+        writer.writerow(report['headers'])
+        writer.writerows(report['rows'])
+        return response
+
+    return render(request, 'tables/report/report.html', {
+        'table_obj': table,
+        'form': form,
+        'report': report,
+    })
+
+
+@login_required
+def table_report_api(request, table_pk):
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на просмотр таблицы'}, status=403)
+
+    form = report_form(request, table)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    return JsonResponse({
+        'status': 'success',
+        'report': get_report(table, request.user, **form.get_report_params()),
+    })
+
+
+@login_required
+def search_table_api(request, table_pk):
+    """id строк, найденных по q, без отрисовки таблицы"""
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на просмотр таблицы'}, status=403)
+
+    search_query = request.GET.get('q', '').strip()
+    if not search_query:
+        return JsonResponse({'status': 'error', 'message': 'Пустой запрос'}, status=400)
+
+    row_ids = get_search_row_ids(table, request.user, search_query)
+    return JsonResponse({
+        'status': 'success',
+        'query': search_query,
+        'count': len(row_ids),
+        'row_ids': row_ids,
+    })
+
+
+@login_required
+def table_rows_api(request, table_pk):
+    """Окно строк сетки (offset, limit) в колоночном JSON - для виртуальной прокрутки"""
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на просмотр таблицы'}, status=403)
+
+    try:
+        offset = max(int(request.GET.get('offset', 0)), 0)
+        limit = int(request.GET.get('limit', settings.ROW_WINDOW_MAX_ROWS))
+        limit = min(max(limit, 1), settings.ROW_WINDOW_MAX_ROWS)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Неверные offset или limit'}, status=400)
+
+    prefetch_related_objects([table], 'columns')
+    window = get_row_window(
+        table, request.user, Row.get_visible_rows(request.user, table), request.GET, offset, limit
     )
+    return JsonResponse({'status': 'success', **window})
+
 
-    for column in table_obj.columns.all():
-        queryset = Row.annotate_for_sorting(queryset, column.id, column.data_type)
-    return queryset
+@login_required
+def table_changes_api(request, table_pk):
+    """Изменения данных таблицы после since (changes?since=<seq>) - для инкрементальной синхронизации"""
+    table = get_object_or_404(Table, pk=table_pk)
+
+    if not table.has_view_permission(request.user):
+        return JsonResponse({'status': 'error', 'message': 'Нет прав на просмотр таблицы'}, status=403)
+
+    try:
+        since = max(int(request.GET.get('since', 0)), 0)
+        limit = int(request.GET.get('limit', settings.CHANGES_BATCH_SIZE))
+        limit = min(max(limit, 1), settings.CHANGES_BATCH_SIZE)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Неверные since или limit'}, status=400)
+
+    visible_row_ids = None
+    if not (table.owner == request.user or table.is_admin(request.user)):
+        visible_row_ids = Row.get_visible_rows(request.user, table).values('id')
+    changes, last_seq, has_more = get_changes(table, since, limit, visible_row_ids)
+    return JsonResponse({
+        'status': 'success',
+        'since': since,
+        'last_seq': last_seq,
+        'has_more': has_more,
+        'fields': CHANGE_FIELDS,
+        'changes': changes,
+    })
@@ -0,0 +1,70 @@
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import RowVisibility, Table
+
+# Заполнение индекса видимости по данным строк и прав, для всех таблиц или одной (%(table_filter)s)
+REBUILD_USER_SQL = '''
+    INSERT INTO tables_rowvisibility (table_id, row_id, user_id, filial_id)
+    SELECT r.table_id, p.row_id, p.user_id, NULL::integer
+    FROM tables_rowpermission p
+    JOIN tables_row r ON r.id = p.row_id
+    WHERE %(table_filter)s
+    UNION
+    SELECT r.table_id, r.id, r.created_by_id, NULL::integer
+    FROM tables_row r
+    WHERE r.created_by_id IS NOT NULL AND %(table_filter)s
+    ON CONFLICT DO NOTHING
+'''
+
+REBUILD_FILIAL_SQL = '''
+    INSERT INTO tables_rowvisibility (table_id, row_id, user_id, filial_id)
+    SELECT r.table_id, r.id, NULL, e.id_filial
+    FROM tables_row r
+    JOIN tables_profile pr ON pr.user_id = r.created_by_id
+    JOIN tables_employee e ON e.id = pr.employee_id
+    WHERE e.id_filial IS NOT NULL AND %(table_filter)s
+    ON CONFLICT DO NOTHING
+'''
+
+
+def index_new_row(row, filial_id):
+    """Добавляет в индекс видимости создателя новой строки и его филиал"""
+    entries = []
+    if row.created_by_id:
+        entries.append(RowVisibility(table_id=row.table_id, row=row, user_id=row.created_by_id))
+    if filial_id:
+        entries.append(RowVisibility(table_id=row.table_id, row=row, filial_id=filial_id))
+    RowVisibility.objects.bulk_create(entries, ignore_conflicts=True)
+    Table.bump_version(row.table_id)
+
+
+def grant_row_visibility(row, user_ids):
+    """Делает строку видимой пользователям, получившим на неё RowPermission"""
+    RowVisibility.objects.bulk_create(
+        [RowVisibility(table_id=row.table_id, row=row, user_id=user_id) for user_id in user_ids],
+        ignore_conflicts=True
+    )
+    Table.bump_version(row.table_id)
+
+
+def rebuild_row_visibility(table_id=None):
+    """Перестраивает индекс видимости целиком или для одной таблицы"""
+    if table_id is None:
+        table_filter, params = 'TRUE', []
+    else:
+        table_filter, params = 'r.table_id = %s', [table_id]
+
+    with transaction.atomic():
+        visibility = RowVisibility.objects.all()
+        if table_id is not None:
+            visibility = visibility.filter(table_id=table_id)
+        visibility.delete()
+
+        with connection.cursor() as cursor:
+            # table_filter встречается в запросе дважды
+            cursor.execute(REBUILD_USER_SQL % {'table_filter': table_filter}, params * 2)
+            cursor.execute(REBUILD_FILIAL_SQL % {'table_filter': table_filter}, params)
+
+        tables = Table.all_objects.all() if table_id is None else Table.all_objects.filter(pk=table_id)
+        tables.update(version=F('version') + 1)